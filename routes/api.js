@@ -9,8 +9,35 @@ const FeishuBitableService = require('../services/feishuService');
 const fs = require('fs').promises;
 const path = require('path');
 const { spawn } = require('child_process');
+const transcriberWorker = require('../services/transcriberWorker');
 const router = express.Router();
 
+// 视频转文字超时时间（毫秒），可通过环境变量调整
+const TRANSCRIBE_TIMEOUT_MS = parseInt(process.env.VIDEO_TRANSCRIBE_TIMEOUT_MS || String(10 * 60 * 1000), 10);
+const CLOUD_TRANSCRIBE_TIMEOUT_MS = parseInt(process.env.VIDEO_TRANSCRIBE_CLOUD_TIMEOUT_MS || String(5 * 60 * 1000), 10);
+const FALLBACK_TRANSCRIBE_TIMEOUT_MS = parseInt(process.env.VIDEO_TRANSCRIBE_FALLBACK_TIMEOUT_MS || String(8 * 60 * 1000), 10);
+
+/**
+ * 转写脚本的命令行参数：把超时时间换算为Python端的截止时间（预留10%用于返回结果），
+ * Python端据此选择模型、分段和解码参数，保证在超时前完成
+ */
+function localTranscribeArgs(scriptPath, videoUrl, timeoutMs, extraArgs = []) {
+  return [scriptPath, ...extraArgs, '--deadline', String(Math.floor(timeoutMs * 0.9 / 1000)), videoUrl];
+}
+
+/**
+ * 云端脚本的对冲调度中是否已经尝试过本地Whisper，是则失败后不再重复回退到本地处理
+ */
+function cloudTriedLocal(output) {
+  const line = output.trim().split('\n').reverse().find(item => item.trim().startsWith('{'));
+  try {
+    const backends = JSON.parse(line).metrics?.hedge?.backends || [];
+    return backends.includes('local');
+  } catch (e) {
+    return false;
+  }
+}
+
 // 初始化飞书服务
 const feishuService = new FeishuBitableService();
 
@@ -270,8 +297,55 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
     console.log(`百度API密钥状态: ${process.env.BAIDU_API_KEY ? '已配置' : '未配置'}`);
     console.log(`使用${useCloudAPI ? '云端API' : '本地Whisper'}处理视频`);
 
+    // 本地处理优先使用常驻工作进程（或任务队列），模型只加载一次
+    if (!useCloudAPI && (process.env.USE_TRANSCRIBER_WORKER === 'true' || transcriberWorker.useQueue)) {
+      let result;
+      try {
+        result = await transcriberWorker.transcribe(videoUrl, TRANSCRIBE_TIMEOUT_MS, { user: req.user.id });
+      } catch (workerError) {
+        console.error('转写工作进程处理失败:', workerError);
+        // 只有任务超时返回408，工作进程退出、启动失败等返回500
+        if (workerError.code === 'ETIMEDOUT') {
+          return res.status(408).json({
+            success: false,
+            message: `处理超时，请尝试较短的视频或检查网络连接 (${workerError.message})`
+          });
+        }
+        return res.status(500).json({
+          success: false,
+          message: `视频处理失败 (${workerError.message})`
+        });
+      }
+
+      if (!result.success) {
+        // 工作进程返回的失败（下载或识别失败、任务取消、队列已满）带原始错误信息，请求本身无效时返回400
+        return res.status(result.invalid ? 400 : 500).json({
+          success: false,
+          message: result.error || '视频处理失败'
+        });
+      }
+
+      await usageTracker.logAPICall({
+        userId: req.user.id,
+        model: 'video_transcribe',
+        usage: {
+          videoUrl,
+          duration: result.data?.duration || 0,
+          wordCount: result.data?.word_count || 0
+        }
+      });
+
+      console.log('视频转文字完成，字数:', result.data?.word_count || 0);
+      return res.json({
+        success: true,
+        data: result.data,
+        message: '视频转文字完成'
+      });
+    }
+
     return new Promise((resolve, reject) => {
-      const python = spawn(pythonPath, [scriptPath, videoUrl], {
+      const python = spawn(pythonPath, localTranscribeArgs(scriptPath, videoUrl,
+        useCloudAPI ? CLOUD_TRANSCRIBE_TIMEOUT_MS : TRANSCRIBE_TIMEOUT_MS), {
         cwd: path.join(__dirname, '..')
       });
 
@@ -387,13 +461,13 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
           console.error('标准输出:', output);
           console.error('错误输出:', errorOutput);
           
-          // 如果使用云端API失败，自动回退到本地处理
-          if (useCloudAPI && code !== 0) {
+          // 如果使用云端API失败，自动回退到本地处理（云端脚本已对冲过本地Whisper时不再重复）
+          if (useCloudAPI && code !== 0 && !cloudTriedLocal(output)) {
             console.log('云端API处理失败，自动回退到本地Whisper处理');
             
             // 使用本地处理重新尝试
             const localScriptPath = path.join(__dirname, '..', 'video_transcriber.py');
-            const localPython = spawn(pythonPath, [localScriptPath, videoUrl], {
+            const localPython = spawn(pythonPath, localTranscribeArgs(localScriptPath, videoUrl, FALLBACK_TRANSCRIBE_TIMEOUT_MS), {
               cwd: path.join(__dirname, '..')
             });
             
@@ -465,7 +539,7 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
                   message: '本地处理也超时了'
                 });
               }
-            }, 8 * 60 * 1000);
+            }, FALLBACK_TRANSCRIBE_TIMEOUT_MS);
             
             return; // 不继续执行原来的错误处理
           }
@@ -489,7 +563,7 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
       });
 
       // 根据处理方式设置不同的超时时间
-      const timeoutDuration = useCloudAPI ? 5 * 60 * 1000 : 10 * 60 * 1000; // 云端API: 5分钟，本地: 10分钟
+      const timeoutDuration = useCloudAPI ? CLOUD_TRANSCRIBE_TIMEOUT_MS : TRANSCRIBE_TIMEOUT_MS; // 默认云端API: 5分钟，本地: 10分钟
       const timeoutHandle = setTimeout(() => {
         if (isCompleted) return; // 防止重复处理
         isCompleted = true;
@@ -497,7 +571,10 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
         python.kill();
         res.status(408).json({
           success: false,
-          message: `处理超时，请尝试较短的视频或检查网络连接 (${useCloudAPI ? '云端API' : '本地处理'})`
+          // 本地识别已完成的分段保存在分段日志中，重新提交同一视频时从中断处继续
+          message: useCloudAPI ? '处理超时，请尝试较短的视频或检查网络连接 (云端API)' :
+            '处理超时，已完成的部分已保存，重新提交将从中断处继续 (本地处理)',
+          resumable: !useCloudAPI
         });
       }, timeoutDuration);
 
@@ -518,6 +595,122 @@ router.post('/video-transcribe', authMiddleware, checkCreditsMiddleware, [
   }
 });
 
+// 视频转文字服务（流式）- 以NDJSON逐行转发阶段、进度、分段文字和最终结果
+router.post('/video-transcribe/stream', authMiddleware, checkCreditsMiddleware, [
+  body('videoUrl').isURL().withMessage('请提供有效的视频链接')
+], async (req, res) => {
+  const errors = validationResult(req);
+  if (!errors.isEmpty()) {
+    return res.status(400).json({
+      success: false,
+      message: '请求参数错误',
+      errors: errors.array()
+    });
+  }
+
+  const { videoUrl } = req.body;
+  const useCloudAPI = process.env.USE_CLOUD_API === 'true';
+  const scriptPath = useCloudAPI
+    ? path.join(__dirname, '..', 'video_transcriber_cloud.py')
+    : path.join(__dirname, '..', 'video_transcriber.py');
+  const pythonPath = path.join(__dirname, '..', 'video_transcribe_env', 'bin', 'python');
+
+  console.log('收到流式视频转文字请求:', videoUrl);
+
+  const timeoutDuration = useCloudAPI ? CLOUD_TRANSCRIBE_TIMEOUT_MS : TRANSCRIBE_TIMEOUT_MS;
+  const python = spawn(pythonPath, localTranscribeArgs(scriptPath, videoUrl, timeoutDuration, ['--ndjson']), {
+    cwd: path.join(__dirname, '..')
+  });
+
+  res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+  res.setHeader('Cache-Control', 'no-cache');
+  res.flushHeaders();
+
+  let buffer = '';
+  let finalResult = null;
+
+  python.stdout.on('data', (data) => {
+    buffer += data.toString();
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      try {
+        const event = JSON.parse(line);
+        if (event.event === 'result') {
+          finalResult = event;
+        }
+        res.write(line + '\n');
+      } catch (parseError) {
+        console.log('Python输出:', line);
+      }
+    }
+  });
+
+  python.stderr.on('data', (data) => {
+    console.log('Python错误:', data.toString());
+  });
+
+  const timeoutHandle = setTimeout(() => {
+    python.kill();
+  }, timeoutDuration);
+
+  // 客户端断开时停止处理
+  res.on('close', () => {
+    if (python.exitCode === null) {
+      python.kill();
+    }
+  });
+
+  python.on('close', async (code) => {
+    clearTimeout(timeoutHandle);
+
+    if (finalResult && finalResult.success) {
+      await usageTracker.logAPICall({
+        userId: req.user.id,
+        model: 'video_transcribe',
+        usage: {
+          videoUrl,
+          duration: finalResult.data?.duration || 0,
+          wordCount: finalResult.data?.word_count || 0
+        }
+      });
+    } else if (!finalResult) {
+      res.write(JSON.stringify({
+        event: 'result',
+        success: false,
+        error: code === null ? '处理超时，请尝试较短的视频' : '视频处理异常，请稍后重试'
+      }) + '\n');
+    }
+    res.end();
+  });
+});
+
+// 视频转文字任务队列状态：同时运行数、排队任务的位置和预计完成时间（USE_TRANSCRIBER_QUEUE=true）
+router.get('/video-transcribe/queue', authMiddleware, async (req, res) => {
+  if (!transcriberWorker.useQueue) {
+    return res.json({ success: true, data: { enabled: false } });
+  }
+  try {
+    const status = await transcriberWorker.status();
+    res.json({
+      success: true,
+      data: {
+        enabled: true,
+        slots: status.slots,
+        running: status.running,
+        queued: status.queued,
+        cloudFallback: status.cloud_fallback,
+        // 只返回当前用户自己的任务
+        jobs: (status.jobs || []).filter(job => job.user === String(req.user.id))
+      }
+    });
+  } catch (error) {
+    res.status(500).json({ success: false, message: `获取队列状态失败: ${error.message}` });
+  }
+});
+
 // 苹果快捷指令 - 保存笔记到知识库
 router.post('/shortcuts/save', [
   body('url')
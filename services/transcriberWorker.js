@@ -0,0 +1,174 @@
+const path = require('path');
+const readline = require('readline');
+const { spawn } = require('child_process');
+
+// 作为操作结果返回的事件（其余事件为任务进行中的通知）
+const RESPONSE_EVENTS = new Set(['pong', 'status', 'cancelled', 'shutdown']);
+
+/**
+ * 常驻视频转文字工作进程
+ * 复用同一个Python进程和已加载的Whisper模型，避免每次请求重新导入torch/whisper；
+ * 请求按id对应结果，TRANSCRIBER_WORKER_JOBS 大于1时同一进程同时运行多个任务（共用一份模型）。
+ * USE_TRANSCRIBER_QUEUE=true 时改为启动任务队列（transcriber_queue.py），按CPU和内存限制同时运行的任务数，
+ * 在用户之间轮转、短视频优先，过载时转交云端识别；请求和结果格式相同
+ */
+class TranscriberWorker {
+  constructor() {
+    this.useQueue = process.env.USE_TRANSCRIBER_QUEUE === 'true';
+    this.scriptPath = path.join(__dirname, '..', this.useQueue ? 'transcriber_queue.py' : 'video_transcriber.py');
+    this.pythonPath = path.join(__dirname, '..', 'video_transcribe_env', 'bin', 'python');
+    this.modelSize = process.env.WHISPER_MODEL_SIZE || 'tiny';
+    this.process = null;
+    this.ready = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  /**
+   * 启动工作进程（已启动则直接返回）
+   */
+  start() {
+    if (this.ready) {
+      return this.ready;
+    }
+
+    this.ready = new Promise((resolve, reject) => {
+      const args = this.useQueue ? [this.scriptPath] : [this.scriptPath, '--worker', this.modelSize];
+      const worker = spawn(this.pythonPath, args, {
+        cwd: path.join(__dirname, '..')
+      });
+      this.process = worker;
+
+      const lines = readline.createInterface({ input: worker.stdout });
+      lines.on('line', (line) => {
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (error) {
+          console.log('转写工作进程输出:', line);
+          return;
+        }
+
+        if (message.event === 'ready') {
+          console.log(`转写工作进程已就绪，模型: ${message.model}，pid: ${message.pid}` +
+            ((message.slots || message.jobs) ? `，同时运行任务数: ${message.slots || message.jobs}` : ''));
+          resolve();
+          return;
+        }
+
+        const job = this.pending.get(message.id);
+        // 排队位置、进度等事件不结束任务；status/pong等操作的回复本身就是结果
+        if (job && message.event && !RESPONSE_EVENTS.has(message.event)) {
+          if (message.event === 'queued') {
+            console.log(`转写任务 ${message.id} ${message.state === 'offloaded' ? '已转交云端识别' :
+              `排队第${message.position}位，预计${message.eta_seconds}秒后完成`}`);
+          }
+          if (job.onEvent) {
+            job.onEvent(message);
+          }
+          return;
+        }
+        if (job) {
+          this.pending.delete(message.id);
+          clearTimeout(job.timer);
+          job.resolve(message);
+        }
+      });
+
+      worker.stderr.on('data', (data) => {
+        console.log('转写工作进程:', data.toString());
+      });
+
+      worker.on('error', (error) => {
+        console.error('转写工作进程启动失败:', error);
+        reject(error);
+      });
+
+      worker.on('close', (code) => {
+        console.log(`转写工作进程退出，退出码: ${code}`);
+        this.process = null;
+        this.ready = null;
+        reject(new Error('转写工作进程已退出'));
+
+        // 进程退出时所有未完成的任务都失败，下次调用会重新拉起进程
+        for (const job of this.pending.values()) {
+          clearTimeout(job.timer);
+          job.reject(new Error('转写工作进程意外退出'));
+        }
+        this.pending.clear();
+      });
+    });
+
+    return this.ready;
+  }
+
+  /**
+   * 提交一个视频转文字任务
+   * @param {string} url 视频链接
+   * @param {number} timeout 超时时间（毫秒）
+   * @param {object} options 可选：user（用户ID，任务队列按用户轮转）、onEvent（排队位置等事件回调）
+   * @returns {Promise<object>} 与单次脚本输出格式相同的结果 {success, data, error}，请求无效时带 invalid: true；
+   *   超时时以 code 为 'ETIMEDOUT' 的错误拒绝，工作进程退出等其他错误原样拒绝
+   */
+  async transcribe(url, timeout = 10 * 60 * 1000, options = {}) {
+    return this.submit({ url, user: options.user }, timeout, options.onEvent);
+  }
+
+  /**
+   * 提交一个本地文件转文字任务（如爬虫已下载的视频），不经过yt-dlp
+   * @param {string} filePath 本地视频/音频文件路径
+   * @param {number} timeout 超时时间（毫秒）
+   * @returns {Promise<object>} 与transcribe相同格式的结果
+   */
+  async transcribeFile(filePath, timeout = 10 * 60 * 1000, options = {}) {
+    return this.submit({ path: path.resolve(filePath), user: options.user }, timeout, options.onEvent);
+  }
+
+  /**
+   * 查询任务队列状态（仅任务队列模式）
+   * @returns {Promise<object>} 同时运行数、排队任务的位置和预计时间
+   */
+  async status() {
+    return this.submit({ op: 'status' }, 10 * 1000);
+  }
+
+  /**
+   * 向工作进程发送一个任务请求
+   * @param {object} request 任务内容（url或path）
+   * @param {number} timeout 超时时间（毫秒）
+   * @param {Function} onEvent 任务事件回调
+   */
+  async submit(request, timeout, onEvent) {
+    await this.start();
+
+    const id = String(this.nextId++);
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        // 只取消这一个任务（任务在下一个分段前停止并删除工作目录），不影响同一进程中的其他任务
+        this.process?.stdin.write(JSON.stringify({ id, op: 'cancel' }) + '\n');
+        const error = new Error('转写任务超时');
+        error.code = 'ETIMEDOUT';
+        reject(error);
+      }, timeout);
+
+      this.pending.set(id, { resolve, reject, timer, onEvent });
+      // 截止时间预留10%用于返回结果，Python端据此选择识别策略
+      const deadline = Math.floor(timeout * 0.9 / 1000);
+      this.process.stdin.write(JSON.stringify({ id, deadline, ...request }) + '\n');
+    });
+  }
+
+  /**
+   * 停止工作进程
+   */
+  stop() {
+    if (this.process) {
+      this.process.kill();
+      this.process = null;
+      this.ready = null;
+    }
+  }
+}
+
+module.exports = new TranscriberWorker();
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""下载：yt-dlp替换为记录调用的假实现，检查页面只解析一次并直接使用下载文件的准确路径"""
+
+import pytest
+
+yt_dlp = pytest.importorskip('yt_dlp')
+
+import transcriber_download
+
+class FakeYoutubeDL:
+    """记录 extract_info / process_ie_result 调用，返回预先设定的结果"""
+
+    instances = []
+
+    def __init__(self, options):
+        self.options = options
+        self.calls = []
+        FakeYoutubeDL.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def extract_info(self, url, download=True):
+        self.calls.append(('extract_info', url, download))
+        return self.result
+
+    def process_ie_result(self, info, download=True):
+        self.calls.append(('process_ie_result', info.get('id'), download))
+        if self.replay_error:
+            raise yt_dlp.utils.DownloadError('HTTP Error 403: Forbidden')
+        return dict(info, requested_downloads=self.result['requested_downloads'])
+
+    def prepare_filename(self, info):
+        raise AssertionError('应直接使用 requested_downloads 中的路径')
+
+@pytest.fixture
+def fake_ydl(tmp_path, monkeypatch):
+    path = tmp_path / 'audio.m4a'
+    path.write_bytes(b'\x00' * 16)
+    FakeYoutubeDL.instances = []
+    FakeYoutubeDL.result = {
+        'id': 'abc', 'title': '测试视频', 'duration': 42, 'ext': 'm4a', 'format_id': '140',
+        'requested_downloads': [{'filepath': str(path)}],
+    }
+    FakeYoutubeDL.replay_error = False
+    monkeypatch.setattr(transcriber_download.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    return str(path)
+
+def calls():
+    return [call for instance in FakeYoutubeDL.instances for call in instance.calls]
+
+def test_download_extracts_once_and_returns_requested_path(fake_ydl, tmp_path):
+    media = transcriber_download.download_audio('https://example.com/v/abc', str(tmp_path))
+
+    assert calls() == [('extract_info', 'https://example.com/v/abc', True)]
+    assert media['path'] == fake_ydl
+    assert media['title'] == '测试视频' and media['duration'] == 42
+    assert FakeYoutubeDL.instances[0].options['outtmpl'].startswith(str(tmp_path))
+
+def test_download_uses_first_playlist_entry(fake_ydl, tmp_path):
+    FakeYoutubeDL.result = {'entries': [None, FakeYoutubeDL.result]}
+
+    media = transcriber_download.download_audio('https://example.com/list', str(tmp_path))
+
+    assert len(calls()) == 1
+    assert media['path'] == fake_ydl
+
+def test_probed_info_skips_page_resolution(fake_ydl, tmp_path):
+    info = {'id': 'abc', 'title': '测试视频', 'duration': 42}
+
+    media = transcriber_download.download_audio('https://example.com/v/abc', str(tmp_path), info=info)
+
+    assert calls() == [('process_ie_result', 'abc', True)]
+    assert media['path'] == fake_ydl
+
+def test_stale_probed_info_falls_back_to_one_extraction(fake_ydl, tmp_path):
+    FakeYoutubeDL.replay_error = True
+
+    media = transcriber_download.download_audio('https://example.com/v/abc', str(tmp_path), info={'id': 'abc'})
+
+    assert [call[0] for call in calls()] == ['process_ie_result', 'extract_info']
+    assert media['path'] == fake_ydl
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""对冲调度：用假后端检查落后的后端被取消、失败时立即启动下一个，以及统计文件的合并"""
+
+import bisect
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from transcriber_hedge import LATENCY_BUCKETS, HedgeCancelled, HedgedScheduler, LatencyStats
+
+def scheduler(**kwargs):
+    options = dict(stats=LatencyStats(path=''), default_delay=0.0, min_delay=0.1, max_delay=5.0)
+    options.update(kwargs)
+    return HedgedScheduler(**options)
+
+def test_slow_backend_is_hedged_and_cancelled():
+    observed = threading.Event()
+
+    def slow(cancel):
+        if cancel.wait(5):
+            observed.set()
+            raise HedgeCancelled()
+        return 'slow'
+
+    def fast(cancel):
+        return 'fast'
+
+    hedger = scheduler()
+    result, hedge = hedger.run([('slow', slow), ('fast', fast)], audio_seconds=60)
+
+    assert result == 'fast'
+    assert hedge['winner'] == 'fast'
+    assert hedge['launched'] == ['slow', 'fast']
+    assert hedge['delays'] == {'slow': 0.1}
+    # 胜出后共用的取消事件被设置，落后的后端随即停止
+    assert observed.wait(1)
+    stats = hedger.stats.snapshot()
+    assert stats['slow']['cancelled'] == 1 and stats['slow']['successes'] == 0
+    assert stats['fast']['successes'] == 1 and stats['fast']['wins'] == 1
+
+def test_failure_launches_next_backend_without_waiting():
+    def broken(cancel):
+        raise RuntimeError('quota exceeded')
+
+    def backup(cancel):
+        return 'backup'
+
+    hedger = scheduler(default_delay=60.0, min_delay=60.0, max_delay=60.0)
+    start = time.perf_counter()
+    result, hedge = hedger.run([('broken', broken), ('backup', backup)])
+
+    assert result == 'backup'
+    assert time.perf_counter() - start < 5
+    assert hedge['errors'] == {'broken': 'quota exceeded'}
+    stats = hedger.stats.snapshot()
+    assert stats['broken']['errors'] == 1 and stats['broken']['recent'] == [0]
+    # 失败的后端不再记为被取消
+    assert stats['broken']['cancelled'] == 0
+
+def test_all_backends_failing_raises():
+    def broken(cancel):
+        raise RuntimeError('down')
+
+    with pytest.raises(Exception, match='所有识别后端都失败了'):
+        scheduler().run([('a', broken), ('b', broken)])
+
+def bucket(latency, audio_seconds=60):
+    return bisect.bisect_left(LATENCY_BUCKETS, latency / max(1.0, audio_seconds / 60.0))
+
+def test_save_merges_records_from_processes_sharing_the_file(tmp_path):
+    path = str(tmp_path / 'hedge-stats.json')
+    # 两个任务在对方保存之前都已加载统计文件，保存时不能覆盖对方的记录
+    first = LatencyStats(path)
+    second = LatencyStats(path)
+    first.record('baidu', 'success', 30, 60)
+    first.record('baidu', 'win')
+    first.record('openai', 'cancelled', 30, 60)
+    second.record('baidu', 'error', 2, 60)
+    second.record('baidu', 'success', 0.1, 60)
+    first.save()
+    second.save()
+
+    merged = LatencyStats(path).snapshot()
+    baidu = merged['baidu']
+    assert baidu['successes'] == 2 and baidu['errors'] == 1 and baidu['wins'] == 1
+    assert sum(baidu['buckets']) == 2
+    assert baidu['buckets'][bucket(30)] == 1 and baidu['buckets'][bucket(0.1)] == 1
+    assert sorted(baidu['recent']) == [0, 1, 1]
+    assert merged['openai']['cancelled'] == 1 and merged['openai']['buckets'][bucket(30)] == 1
+    # 保存后本进程的统计与文件一致，再次保存不会重复合并
+    assert second.snapshot() == merged
+    second.save()
+    assert LatencyStats(path).snapshot() == merged
+
+def _record_and_save(path, index, count):
+    stats = LatencyStats(path)
+    for i in range(count):
+        stats.record('local', 'success', LATENCY_BUCKETS[(index + i) % len(LATENCY_BUCKETS)] * 0.9, 60)
+    stats.save()
+
+def test_concurrent_saves_keep_every_record(tmp_path):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('需要fork启动的子进程')
+    path = str(tmp_path / 'hedge-stats.json')
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_record_and_save, args=(path, index, 25)) for index in range(6)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    local = LatencyStats(path).snapshot()['local']
+    assert local['successes'] == 150
+    assert sum(local['buckets']) == 150
+    expected = [0] * (len(LATENCY_BUCKETS) + 1)
+    for index in range(6):
+        for i in range(25):
+            expected[(index + i) % len(LATENCY_BUCKETS)] += 1
+    assert local['buckets'] == expected
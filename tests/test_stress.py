@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+同一进程、同一转写实例同时运行多个任务：模型替换为按音频内容返回标记的假识别，
+检查并发任务全部成功、结果与逐个运行相同且按时间顺序、吞吐量随并发提高、取消后工作目录被删除
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip('whisper')
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 5
+JOBS = 6
+JOB_SECONDS = 30
+# 假识别每个分段的耗时（sleep释放GIL，模拟推理期间其他任务可以继续）
+CHUNK_LATENCY = 0.05
+
+def make_audio(job_index, seconds=JOB_SECONDS):
+    """每一秒填充不同的常数，假识别据此还原出该秒的标记"""
+    markers = np.arange(seconds, dtype=np.float32) + job_index * 1000 + 1
+    return np.repeat(markers / 100000.0, SAMPLE_RATE).astype(np.float32)
+
+def fake_transcribe(audio, job=None, cancel=None, audio_path=None, **options):
+    """按秒还原标记作为分段文字，时间戳相对于分段开头"""
+    time.sleep(CHUNK_LATENCY)
+    seconds = len(audio) // SAMPLE_RATE
+    segments = [{'start': float(s), 'end': float(s + 1),
+                 'text': f'[{int(round(audio[s * SAMPLE_RATE] * 100000))}]'} for s in range(seconds)]
+    return {'text': ''.join(segment['text'] for segment in segments), 'segments': segments, 'language': 'zh'}
+
+@pytest.fixture
+def transcriber(tmp_path, monkeypatch):
+    monkeypatch.setenv('TRANSCRIPT_CACHE', 'false')
+    monkeypatch.setenv('TRANSCRIBER_JOURNAL_DB', str(tmp_path / 'journal.sqlite'))
+    monkeypatch.setenv('TRANSCRIBER_WORKSPACE_DIR', str(tmp_path / 'workspaces'))
+    monkeypatch.setenv('TRANSCRIBER_CHUNK_SECONDS', str(CHUNK_SECONDS))
+    monkeypatch.setenv('TRANSCRIBER_CHUNK_OVERLAP', '0')
+    monkeypatch.setenv('TRANSCRIBER_VAD', 'false')
+    monkeypatch.setenv('TRANSCRIBER_STREAM', 'false')
+    monkeypatch.delenv('TRANSCRIBER_DEADLINE', raising=False)
+    from video_transcriber import VideoTranscriber
+
+    instance = VideoTranscriber(model_size='tiny', workers='1')
+    instance.batcher = None
+    monkeypatch.setattr(instance.backend, 'is_loaded', lambda model_size: True)
+    monkeypatch.setattr(instance.backend, 'transcribe', fake_transcribe)
+    yield instance
+    instance.close()
+
+def run(transcriber, job_index, job=None):
+    from transcriber_input import MediaInput
+
+    return transcriber.process_input(MediaInput.from_pcm(make_audio(job_index), title=f'job-{job_index}'), job)
+
+def leftover_workspaces():
+    from transcriber_job import workspace_root
+
+    root = workspace_root()
+    return os.listdir(root) if os.path.isdir(root) else []
+
+def test_concurrent_jobs_match_sequential_and_overlap(transcriber):
+    start = time.perf_counter()
+    sequential = [run(transcriber, i) for i in range(JOBS)]
+    sequential_wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=JOBS) as pool:
+        concurrent = list(pool.map(lambda i: run(transcriber, i), range(JOBS)))
+    concurrent_wall = time.perf_counter() - start
+
+    for i, (first, second) in enumerate(zip(sequential, concurrent)):
+        assert first['success'] and second['success'], (first, second)
+        data = second['data']
+        assert data['title'] == f'job-{i}'
+        assert data['full_text'] == first['data']['full_text']
+        # 每个任务只含自己的标记，且分段按时间顺序排列
+        expected = [f'[{i * 1000 + s + 1}]' for s in range(JOB_SECONDS)]
+        segments = list(data['segments'])
+        assert [segment['text'] for segment in segments] == expected
+        assert [segment['start'] for segment in segments] == [float(s) for s in range(JOB_SECONDS)]
+
+    # 分段串行识别：逐个运行至少需要 JOBS * 分段数 * CHUNK_LATENCY 秒，并发时各任务的等待相互重叠
+    assert sequential_wall >= JOBS * (JOB_SECONDS // CHUNK_SECONDS) * CHUNK_LATENCY
+    assert concurrent_wall < sequential_wall / 2
+    assert leftover_workspaces() == []
+
+def test_cancel_stops_job_and_removes_workspace(transcriber, monkeypatch):
+    job = transcriber.new_job('cancel-test')
+    started = threading.Event()
+    calls = []
+
+    def slow_transcribe(audio, job=None, cancel=None, audio_path=None, **options):
+        calls.append(job.id)
+        started.set()
+        return fake_transcribe(audio, job, cancel, audio_path, **options)
+
+    monkeypatch.setattr(transcriber.backend, 'transcribe', slow_transcribe)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(run, transcriber, 0, job)
+        assert started.wait(5)
+        workspace = job.workspace
+        job.cancel()
+        result = future.result(timeout=5)
+
+    assert result.get('cancelled') is True
+    assert len(calls) < JOB_SECONDS // CHUNK_SECONDS
+    assert workspace is None or not os.path.exists(workspace)
+    assert leftover_workspaces() == []
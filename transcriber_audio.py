@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频解码工具
+把视频/音频文件一次性解码为16kHz单声道float32 PCM，供各转换器按需切片使用
+"""
+
+import os
+import wave
+import subprocess
+import numpy as np
+
+# Whisper使用的采样率
+SAMPLE_RATE = 16000
+
+def decode_audio(source, sample_rate=SAMPLE_RATE, pcm_path=None):
+    """
+    用一次ffmpeg把音频解码为单声道float32 PCM
+
+    Args:
+        source (str|bytes): 视频/音频文件路径，或媒体文件内容（通过stdin传给ffmpeg）
+        sample_rate (int): 目标采样率
+        pcm_path (str): 可选，解码结果写入该文件并以内存映射方式返回，
+                        便于多个进程共享同一份音频而不复制
+
+    Returns:
+        numpy.ndarray: float32音频数组（pcm_path不为空时为只读内存映射）
+    """
+    data = source if isinstance(source, (bytes, bytearray, memoryview)) else None
+    cmd = ['ffmpeg'] + (['-nostdin'] if data is None else []) + [
+           '-threads', '0', '-i', 'pipe:0' if data is not None else source,
+           '-f', 'f32le', '-ac', '1', '-acodec', 'pcm_f32le', '-ar', str(sample_rate)]
+
+    if pcm_path:
+        cmd += ['-y', pcm_path]
+        result = subprocess.run(cmd, input=data, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    else:
+        cmd += ['-']
+        result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', errors='ignore').strip().splitlines()
+        raise RuntimeError(f"音频解码失败: {error[-1] if error else result.returncode}")
+
+    if pcm_path:
+        return open_pcm(pcm_path)
+    # 直接引用ffmpeg输出的字节缓冲区，不额外复制
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def stream_decode_audio(source, chunk_samples, sample_rate=SAMPLE_RATE, headers=None):
+    """
+    边读取边解码：ffmpeg直接读取文件或HTTP地址，每凑满chunk_samples个样本产出一段
+
+    网络传输和解码在ffmpeg进程中进行，调用方可以在后续音频仍在到达时处理已产出的分段。
+
+    Args:
+        source (str): 文件路径或媒体直链
+        chunk_samples (int): 每段样本数（最后一段可能不足）
+        sample_rate (int): 目标采样率
+        headers (dict): 访问直链时附带的HTTP请求头
+
+    Yields:
+        numpy.ndarray: float32音频分段
+    """
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0']
+    if headers:
+        cmd += ['-headers', ''.join(f'{key}: {value}\r\n' for key, value in headers.items())]
+    cmd += ['-i', source, '-f', 'f32le', '-ac', '1', '-acodec', 'pcm_f32le', '-ar', str(sample_rate), '-']
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    chunk_bytes = chunk_samples * 4
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            # 管道读取可能不足一段，继续读满（结尾除外）
+            while len(data) < chunk_bytes:
+                more = process.stdout.read(chunk_bytes - len(data))
+                if not more:
+                    break
+                data += more
+            yield np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            error = stderr.decode('utf-8', errors='ignore').strip().splitlines()
+            raise RuntimeError(f"音频解码失败: {error[-1] if error else process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def open_pcm(pcm_path):
+    """以只读内存映射方式打开decode_audio写出的PCM文件"""
+    if os.path.getsize(pcm_path) == 0:
+        # 空文件无法建立内存映射
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(pcm_path, dtype=np.float32, mode='r')
+
+def write_wav(path, audio, sample_rate=SAMPLE_RATE):
+    """把float32音频写成16位单声道WAV（云端识别接口要求的格式）"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def probe_duration(path):
+    """用ffprobe读取媒体文件的时长（秒），无法读取时返回None"""
+    result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                             '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        return float(result.stdout.decode('utf-8').strip())
+    except ValueError:
+        return None
+
+def audio_duration(audio, sample_rate=SAMPLE_RATE):
+    """根据样本数计算音频时长（秒）"""
+    return len(audio) / float(sample_rate)
+
+# 语音活动检测每次处理的帧数：内存映射的PCM按块读入，临时数组大小与音频时长无关
+VAD_BLOCK_FRAMES = 2048
+
+def _frames(audio, frame_samples):
+    """把音频看作 (帧数, 帧长) 的二维数组（连续数组和内存映射都只是视图，不读入数据）"""
+    num_frames = len(audio) // frame_samples
+    return audio[:num_frames * frame_samples].reshape(num_frames, frame_samples)
+
+def _frame_energy_db(audio, frame_samples, block_frames=VAD_BLOCK_FRAMES):
+    """按块计算每帧的能量（dBFS，float32）"""
+    frames = _frames(audio, frame_samples)
+    energy_db = np.empty(len(frames), dtype=np.float32)
+    for start in range(0, len(frames), block_frames):
+        block = np.asarray(frames[start:start + block_frames], dtype=np.float32)
+        power = np.mean(block * block, axis=1)
+        energy_db[start:start + len(block)] = 10.0 * np.log10(power + 1e-10)
+    return energy_db
+
+def _band_ratio(audio, frame_indices, frame_samples, sample_rate, block_frames=VAD_BLOCK_FRAMES):
+    """按块计算指定帧的语音频带（300-3400Hz）能量占比，每块只读取这些帧"""
+    frames = _frames(audio, frame_samples)
+    freqs = np.fft.rfftfreq(frame_samples, 1.0 / sample_rate)
+    band = (freqs >= 300) & (freqs <= 3400)
+    ratio = np.empty(len(frame_indices), dtype=np.float32)
+    for start in range(0, len(frame_indices), block_frames):
+        block = np.asarray(frames[frame_indices[start:start + block_frames]], dtype=np.float32)
+        spectrum = np.fft.rfft(block, axis=1)
+        power = (spectrum.real * spectrum.real + spectrum.imag * spectrum.imag).astype(np.float32)
+        ratio[start:start + len(block)] = power[:, band].sum(axis=1) / (power.sum(axis=1) + 1e-10)
+    return ratio
+
+def _mask_runs(mask):
+    """返回布尔序列中连续True区间的 (起始帧, 结束帧) 列表"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+def detect_speech_regions(audio, sample_rate=SAMPLE_RATE, frame_ms=30, margin_db=10.0, min_db=-55.0,
+                          min_band_ratio=0.3, min_speech_ms=250, min_silence_ms=500, pad_ms=200):
+    """
+    基于能量的语音活动检测（纯NumPy，无需联网或额外模型）
+
+    先用能量分布的低分位数估计底噪，高出底噪margin_db的帧视为候选；
+    再要求语音频带（300-3400Hz）能量占比不低于min_band_ratio，过滤掉低音/高频为主的纯音乐。
+
+    Args:
+        audio (numpy.ndarray): float32音频
+        sample_rate (int): 采样率
+        frame_ms (int): 分析帧长（毫秒）
+        margin_db (float): 高于底噪多少dB视为有声
+        min_db (float): 绝对能量下限（dBFS）
+        min_band_ratio (float): 语音频带能量占比下限，0表示不检查
+        min_speech_ms (int): 短于该时长的有声片段视为噪声丢弃
+        min_silence_ms (int): 短于该时长的停顿不切分
+        pad_ms (int): 每个语音区间两侧保留的余量
+
+    Returns:
+        list: 语音区间 [(起始样本, 结束样本), ...]
+    """
+    frame_samples = int(sample_rate * frame_ms / 1000)
+    if len(audio) < frame_samples:
+        return []
+
+    energy_db = _frame_energy_db(audio, frame_samples)
+    noise_floor = np.percentile(energy_db, 10)
+    mask = energy_db > max(noise_floor + margin_db, min_db)
+
+    if min_band_ratio > 0 and mask.any():
+        voiced = np.flatnonzero(mask)
+        ratio = _band_ratio(audio, voiced, frame_samples, sample_rate)
+        mask[voiced[ratio < min_band_ratio]] = False
+
+    # 填平短停顿
+    min_silence = max(1, int(min_silence_ms / frame_ms))
+    for start, end in _mask_runs(~mask):
+        if start > 0 and end < len(mask) and end - start < min_silence:
+            mask[start:end] = True
+
+    # 丢弃过短的有声片段并两侧补余量
+    min_speech = max(1, int(min_speech_ms / frame_ms))
+    pad = int(pad_ms / frame_ms)
+    regions = []
+    for start, end in _mask_runs(mask):
+        if end - start < min_speech:
+            continue
+        start = int(max(0, start - pad) * frame_samples)
+        end = int(min(len(audio), (end + pad) * frame_samples))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    return regions
+
+def _split_long_region(audio, start, end, max_samples, sample_rate=SAMPLE_RATE, frame_ms=30):
+    """把超过max_samples的区间在每个窗口后1/4内能量最低处切开"""
+    frame_samples = int(sample_rate * frame_ms / 1000)
+    pieces = []
+    while end - start > max_samples:
+        search_start = start + max_samples * 3 // 4
+        search_end = start + max_samples
+        energy_db = _frame_energy_db(audio[search_start:search_end], frame_samples)
+        cut = search_end
+        if len(energy_db):
+            cut = search_start + int(np.argmin(energy_db)) * frame_samples + frame_samples // 2
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+def pack_speech_regions(audio, regions, max_samples, sample_rate=SAMPLE_RATE):
+    """
+    把语音区间打包成长度接近max_samples的分段，分段之间的静音不再送入模型
+
+    Args:
+        audio (numpy.ndarray): float32音频
+        regions (list): detect_speech_regions返回的语音区间
+        max_samples (int): 每个分段的最大样本数
+
+    Returns:
+        list: 分段列表，每个分段是若干 (起始样本, 结束样本) 片段
+    """
+    chunks = []
+    current = []
+    current_len = 0
+    for start, end in regions:
+        for piece_start, piece_end in _split_long_region(audio, start, end, max_samples, sample_rate):
+            length = piece_end - piece_start
+            if current and current_len + length > max_samples:
+                chunks.append(current)
+                current = []
+                current_len = 0
+            current.append((piece_start, piece_end))
+            current_len += length
+    if current:
+        chunks.append(current)
+    return chunks
+
+def overlap_chunks(chunks, overlap_samples):
+    """
+    给每个分段（第一个除外）前面补上前一个分段末尾的overlap_samples个样本，
+    边界处被切断的字词在后一个分段中是完整的，识别结果由transcriber_stitch合并
+
+    Args:
+        chunks (list): 分段列表（pack_speech_regions或按固定长度切分的结果）
+        overlap_samples (int): 重叠的样本数，0表示不重叠
+
+    Returns:
+        list: 分段列表，重叠部分只取前一个分段自身的片段（不会再延伸到更前面的分段）
+    """
+    if overlap_samples <= 0:
+        return chunks
+    result = chunks[:1]
+    for previous, pieces in zip(chunks, chunks[1:]):
+        tail = []
+        remaining = overlap_samples
+        for start, end in reversed(previous):
+            take = min(remaining, end - start)
+            tail.insert(0, (end - take, end))
+            remaining -= take
+            if remaining <= 0:
+                break
+        if tail[-1][1] == pieces[0][0]:
+            # 与后一个分段首尾相接时合并为一个片段
+            tail[-1] = (tail[-1][0], pieces[0][1])
+            pieces = pieces[1:]
+        result.append(tail + list(pieces))
+    return result
+
+def chunk_audio(audio, pieces):
+    """取出一个分段的音频；只有一个片段时直接返回切片，不复制"""
+    if len(pieces) == 1:
+        start, end = pieces[0]
+        return audio[start:end]
+    return np.concatenate([audio[start:end] for start, end in pieces])
+
+def chunk_time_to_source(pieces, seconds, sample_rate=SAMPLE_RATE):
+    """把分段内的相对时间换算回原音频中的时间（秒）"""
+    offset = int(seconds * sample_rate)
+    for start, end in pieces:
+        length = end - start
+        if offset <= length:
+            return (start + offset) / float(sample_rate)
+        offset -= length
+    return pieces[-1][1] / float(sample_rate)
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+识别后端
+本地版和云端版共用的识别接口：输入16kHz float32音频，返回与 model.transcribe 相同格式的结果
+{"text", "segments": [{"start", "end", "text"}], "language"}，时间相对输入音频的起点（文字未做繁简转换）。
+
+本地版按TRANSCRIBER_BACKEND选择识别引擎：whisper（openai-whisper，支持进程池和批量推理）
+或 faster-whisper（CTranslate2的int8引擎，自带多线程）；
+云端版按TRANSCRIBER_CLOUD_BACKENDS的顺序对冲调用百度、OpenAI和本地进程（见transcriber_hedge）。
+faster-whisper和云端接口的依赖只在使用时导入
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import subprocess
+import contextlib
+import importlib.util
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from transcriber_audio import (SAMPLE_RATE, decode_audio, audio_duration, write_wav,
+                               detect_speech_regions, pack_speech_regions)
+from transcriber_hedge import HedgeCancelled
+from transcriber_upload import pcm16_pieces, RawBody, Base64JSONBody, MultipartFileBody
+
+# 接口地址（可指向本地模拟服务测试）
+BAIDU_TOKEN_URL = os.getenv('BAIDU_TOKEN_URL', 'https://aip.baidubce.com/oauth/2.0/token')
+BAIDU_ASR_URL = os.getenv('BAIDU_ASR_URL', 'https://vop.baidu.com/server_api')
+OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1').rstrip('/')
+OPENAI_TIMEOUT = int(os.getenv('OPENAI_TIMEOUT', '300'))
+
+# 百度短语音识别每次最长60秒，留出余量；窗口并发数
+BAIDU_WINDOW_SECONDS = float(os.getenv('BAIDU_WINDOW_SECONDS', '55'))
+BAIDU_CONCURRENCY = int(os.getenv('BAIDU_CONCURRENCY', '4'))
+# 上传方式：raw 为原始PCM请求体（不经base64），json 为base64编码的JSON请求体（流式编码）
+BAIDU_UPLOAD_MODE = os.getenv('BAIDU_UPLOAD_MODE', 'raw').lower()
+
+# 对冲调度的本地后端：本地版命令行（子进程，被取消时结束进程）
+LOCAL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'video_transcriber.py')
+HEDGE_LOCAL = os.getenv('TRANSCRIBER_HEDGE_LOCAL', 'true').lower() not in ('0', 'false', 'no')
+
+# 百度访问令牌缓存：{(api_key, secret_key): (令牌, 过期时间)}
+_baidu_token_cache = {}
+_baidu_token_lock = threading.Lock()
+
+# openai-whisper的解码参数在faster-whisper中的名称（不在表中的参数不传入）
+FASTER_WHISPER_OPTION_NAMES = {
+    'language': 'language',
+    'task': 'task',
+    'beam_size': 'beam_size',
+    'best_of': 'best_of',
+    'patience': 'patience',
+    'length_penalty': 'length_penalty',
+    'temperature': 'temperature',
+    'compression_ratio_threshold': 'compression_ratio_threshold',
+    'logprob_threshold': 'log_prob_threshold',
+    'no_speech_threshold': 'no_speech_threshold',
+    'condition_on_previous_text': 'condition_on_previous_text',
+    'initial_prompt': 'initial_prompt',
+    'word_timestamps': 'word_timestamps',
+}
+
+class ASRBackend(ABC):
+    """
+    识别后端的基类（子类必须实现transcribe，缺少时在创建实例时就报错）
+
+    name: 配置中使用的名称
+    parallel: 调用方能否用多进程并行识别（自带多线程的引擎为False，调用方只用一个进程）
+    time_ratio: 相对openai-whisper（float32）的大致耗时比例，用于按截止时间选择模型
+    """
+    name = None
+    parallel = False
+    time_ratio = 1.0
+
+    def available(self):
+        """依赖和密钥是否齐全"""
+        return True
+
+    def model_key(self, model_size):
+        """识别结果的模型标识（分段日志按它区分不同引擎的结果）"""
+        return model_size
+
+    def load(self, model_size):
+        """加载模型（云端后端无需加载）"""
+        return None
+
+    def is_loaded(self, model_size):
+        return True
+
+    def preload(self, sizes):
+        for size in sizes:
+            self.load(size)
+
+    @abstractmethod
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, **options):
+        """
+        识别一段音频
+
+        Args:
+            audio (numpy.ndarray|str): 16kHz float32音频；本地引擎也接受文件路径
+            job (JobContext): 任务上下文（本地引擎使用其模型、解码参数、统计和取消标记）
+            cancel (threading.Event): 对冲调度的取消信号，设置后应尽快抛出HedgeCancelled
+            audio_path (str): 同一音频已写出的16kHz WAV，需要上传文件的后端直接使用
+            **options: 覆盖任务解码参数的选项（本地引擎）或后端自己的选项
+
+        Returns:
+            dict: {"text", "segments", "language"}
+        """
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper：模型由ModelRegistry管理，同一模型的推理串行，贪心解码时交给批量推理"""
+    name = 'whisper'
+    parallel = True
+
+    def __init__(self, registry, batcher=None):
+        self.registry = registry
+        self.batcher = batcher
+
+    def available(self):
+        return importlib.util.find_spec('whisper') is not None
+
+    def load(self, model_size):
+        return self.registry.get(model_size)
+
+    def is_loaded(self, model_size):
+        return self.registry.is_loaded(model_size)
+
+    def preload(self, sizes):
+        self.registry.preload()
+
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, **options):
+        """
+        同一模型的推理串行执行（见ModelRegistry.inference_lock），等待时间单独记为 model_wait 阶段；
+        PCM数组且解码参数支持批量时交给批量推理，与其他任务的窗口合批
+        """
+        merged = dict(job.decode_options, **options)
+        if not isinstance(audio, str) and self.batcher is not None and self.batcher.accepts(merged):
+            job.check_cancelled()
+            return self.batcher.submit(job, audio, merged).result()
+        model = self.registry.get(job.model_size)
+        wait_start = time.perf_counter()
+        with self.registry.inference_lock(job.model_size):
+            job.metrics.record('model_wait', time.perf_counter() - wait_start, 0.0)
+            job.check_cancelled()
+            with job.metrics.stage('inference'):
+                return model.transcribe(audio, **merged)
+
+class FasterWhisperBackend(ASRBackend):
+    """
+    faster-whisper（CTranslate2）：int8量化的权重和算子，CPU上通常比openai-whisper快数倍、内存更小。
+    矩阵运算使用多线程，各任务可以同时调用同一个模型（num_workers个并发），不使用进程池
+    """
+    name = 'faster-whisper'
+    parallel = False
+    time_ratio = 0.35
+
+    def __init__(self, compute_type=None, threads=None, num_workers=None):
+        """
+        Args:
+            compute_type (str): CTranslate2计算类型，默认读取FASTER_WHISPER_COMPUTE_TYPE（默认int8）
+            threads (int): 每次识别使用的线程数，默认读取FASTER_WHISPER_THREADS，否则为CPU核数
+            num_workers (int): 同一模型允许的并发识别数，默认与TRANSCRIBER_WORKER_JOBS相同
+        """
+        self.compute_type = compute_type or os.getenv('FASTER_WHISPER_COMPUTE_TYPE', 'int8')
+        self.threads = threads or int(os.getenv('FASTER_WHISPER_THREADS', '0')) or os.cpu_count() or 1
+        self.num_workers = num_workers or max(1, int(os.getenv('TRANSCRIBER_WORKER_JOBS', '1')))
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def available(self):
+        return importlib.util.find_spec('faster_whisper') is not None
+
+    def model_key(self, model_size):
+        return f'{self.name}-{self.compute_type}:{model_size}'
+
+    def load(self, model_size):
+        with self._lock:
+            model = self.models.get(model_size)
+            if model is None:
+                from faster_whisper import WhisperModel
+
+                print(f"正在加载faster-whisper模型: {model_size}（{self.compute_type}）", file=sys.stderr)
+                start = time.perf_counter()
+                model = WhisperModel(model_size, device='cpu', compute_type=self.compute_type,
+                                     cpu_threads=self.threads, num_workers=self.num_workers)
+                self.models[model_size] = model
+                print(f"faster-whisper模型加载完成: {model_size} ({time.perf_counter() - start:.1f}秒)", file=sys.stderr)
+            return model
+
+    def is_loaded(self, model_size):
+        return model_size in self.models
+
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, **options):
+        """解码参数换成faster-whisper的名称；分段是边解码边产生的，每段之间检查取消"""
+        merged = dict(job.decode_options, **options)
+        kwargs = {FASTER_WHISPER_OPTION_NAMES[name]: value for name, value in merged.items()
+                  if name in FASTER_WHISPER_OPTION_NAMES}
+        if isinstance(kwargs.get('temperature'), tuple):
+            kwargs['temperature'] = list(kwargs['temperature'])
+        model = self.load(job.model_size)
+        job.check_cancelled()
+        segments = []
+        with job.metrics.stage('inference'):
+            pieces, info = model.transcribe(audio, **kwargs)
+            for piece in pieces:
+                job.check_cancelled()
+                segments.append({'start': piece.start, 'end': piece.end, 'text': piece.text})
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': info.language
+        }
+
+@contextlib.contextmanager
+def _wav_file(audio, audio_path):
+    """需要上传文件的后端：已有WAV时直接使用，否则写到临时文件，用完删除"""
+    if audio_path:
+        yield audio_path
+        return
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        write_wav(path, audio)
+        yield path
+    finally:
+        os.remove(path)
+
+class BaiduBackend(ASRBackend):
+    """百度短语音识别：按停顿切成不超过60秒的窗口并发识别，窗口即分段"""
+    name = 'baidu'
+
+    def __init__(self, session, concurrency=None, upload_mode=None):
+        """
+        Args:
+            session (requests.Session): 复用连接的HTTP会话
+            concurrency (int): 窗口并发数，默认读取BAIDU_CONCURRENCY
+            upload_mode (str): raw 或 json，默认读取BAIDU_UPLOAD_MODE
+        """
+        self.session = session
+        self.concurrency = max(1, concurrency or BAIDU_CONCURRENCY)
+        self.upload_mode = upload_mode or BAIDU_UPLOAD_MODE
+        self.api_key = os.getenv('BAIDU_API_KEY')
+        self.secret_key = os.getenv('BAIDU_SECRET_KEY')
+
+    def available(self):
+        return bool(self.api_key and self.secret_key)
+
+    def get_access_token(self, refresh=False):
+        """
+        获取百度API访问令牌，令牌在有效期内缓存（同一进程内的任务共用）
+
+        Args:
+            refresh (bool): 忽略缓存重新获取（令牌失效时）
+        """
+        if not self.available():
+            print("百度API密钥未配置", file=sys.stderr)
+            return None
+
+        cache_key = (self.api_key, self.secret_key)
+        with _baidu_token_lock:
+            cached = _baidu_token_cache.get(cache_key)
+            if cached and not refresh and cached[1] > time.time():
+                return cached[0]
+
+            params = {
+                "grant_type": "client_credentials",
+                "client_id": self.api_key,
+                "client_secret": self.secret_key
+            }
+
+            try:
+                print("正在获取百度API访问令牌...", file=sys.stderr)
+                response = self.session.post(BAIDU_TOKEN_URL, params=params, timeout=30)
+                data = response.json()
+                token = data.get("access_token")
+                if token:
+                    # 提前一小时过期，避免任务进行中令牌失效
+                    expires_in = int(data.get("expires_in", 2592000))
+                    _baidu_token_cache[cache_key] = (token, time.time() + max(60, expires_in - 3600))
+                    print("百度API访问令牌获取成功", file=sys.stderr)
+                else:
+                    print(f"百度API访问令牌获取失败: {data}", file=sys.stderr)
+                return token
+            except Exception as e:
+                print(f"获取百度API访问令牌异常: {e}", file=sys.stderr)
+                return None
+
+    def plan_windows(self, audio):
+        """
+        把音频切成不超过百度短语音接口时长限制的窗口，优先在停顿处切分并跳过静音
+
+        Returns:
+            list: 窗口列表，每个窗口是若干 (起始样本, 结束样本) 片段
+        """
+        max_samples = int(BAIDU_WINDOW_SECONDS * SAMPLE_RATE)
+        regions = detect_speech_regions(audio)
+        return pack_speech_regions(audio, regions, max_samples)
+
+    def _recognize_window(self, audio, pieces, cancel=None):
+        """识别一个窗口，返回带原音频时间戳的分段（令牌失效时刷新后重试一次）"""
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled()
+        pcm_length = 2 * sum(end - start for start, end in pieces)
+
+        for attempt in range(2):
+            access_token = self.get_access_token(refresh=attempt > 0)
+            if not access_token:
+                raise Exception("百度API访问令牌获取失败")
+
+            # PCM按块从float32音频转换后直接写入请求体（每次请求重新生成）
+            chunks = pcm16_pieces(audio, pieces)
+            if self.upload_mode == 'json':
+                params = None
+                body = Base64JSONBody({
+                    "format": "pcm",
+                    "rate": SAMPLE_RATE,
+                    "channel": 1,
+                    "len": pcm_length,
+                    "token": access_token,
+                    "cuid": "xiaohongshu_app"
+                }, 'speech', chunks, pcm_length)
+            else:
+                params = {"cuid": "xiaohongshu_app", "token": access_token}
+                body = RawBody(chunks, pcm_length, f'audio/pcm;rate={SAMPLE_RATE}')
+            response = self.session.post(BAIDU_ASR_URL, params=params, data=body,
+                                         headers={'Content-Type': body.content_type}, timeout=60)
+            result = response.json()
+
+            err_no = result.get('err_no')
+            if err_no == 0:
+                text = ''.join(result.get('result') or [])
+                break
+            if err_no == 3301:
+                # 音频质量过差或没有语音，按空结果处理
+                text = ''
+                break
+            if err_no == 3302 and attempt == 0:
+                print("百度API令牌失效，重新获取", file=sys.stderr)
+                continue
+            raise Exception(f"百度API错误 (code: {err_no}): {result.get('err_msg', '未知错误')}")
+
+        return {
+            'start': pieces[0][0] / float(SAMPLE_RATE),
+            'end': pieces[-1][1] / float(SAMPLE_RATE),
+            'text': text
+        }
+
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, **options):
+        """按窗口切分后并发识别，拼回带时间戳的分段（未提供audio时从audio_path解码）"""
+        import requests
+
+        print("使用百度云语音识别...", file=sys.stderr)
+        if audio is None:
+            audio = decode_audio(audio_path)
+        windows = self.plan_windows(audio)
+        print(f"音频时长: {audio_duration(audio):.1f}秒，分{len(windows)}个窗口识别，并发{self.concurrency}", file=sys.stderr)
+
+        if not self.get_access_token():
+            raise Exception("百度API访问令牌获取失败")
+
+        segments = [None] * len(windows)
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(windows))))
+        try:
+            futures = {pool.submit(self._recognize_window, audio, pieces, cancel): i
+                       for i, pieces in enumerate(windows)}
+            for future in as_completed(futures):
+                segments[futures[future]] = future.result()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"网络请求失败: {str(e)}")
+        finally:
+            # 任一窗口失败时整个任务已失败：未开始的窗口不再上传识别，也不等正在进行的请求结束
+            # （对冲调度的取消信号由各后端共用，这里不设置，以免取消其他后端）
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        segments = [segment for segment in segments if segment['text']]
+        if not segments:
+            raise Exception("百度API返回空结果")
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': 'zh'
+        }
+
+class OpenAIBackend(ASRBackend):
+    """OpenAI Whisper API：上传整段WAV，返回接口给出的分段时间戳"""
+    name = 'openai'
+
+    def __init__(self, session):
+        self.session = session
+
+    def available(self):
+        return bool(os.getenv('OPENAI_API_KEY'))
+
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, **options):
+        print("使用OpenAI Whisper API...", file=sys.stderr)
+
+        openai_key = os.getenv('OPENAI_API_KEY')
+        if not openai_key:
+            raise Exception("OpenAI API密钥未配置")
+
+        url = f"{OPENAI_API_BASE}/audio/transcriptions"
+        with _wav_file(audio, audio_path) as path:
+            # 文件按块读取写入multipart请求体，不整体读入内存
+            body = MultipartFileBody({
+                "model": "whisper-1",
+                "language": "zh",
+                "response_format": "verbose_json"
+            }, 'file', path, file_type='audio/wav')
+            headers = {"Authorization": f"Bearer {openai_key}", "Content-Type": body.content_type}
+            response = self.session.post(url, headers=headers, data=body, timeout=OPENAI_TIMEOUT)
+        result = response.json()
+
+        if 'text' not in result:
+            raise Exception(f"OpenAI API错误: {result}")
+
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled()
+        segments = [{'start': segment.get('start', 0), 'end': segment.get('end', 0), 'text': segment.get('text', '')}
+                    for segment in result.get('segments') or []]
+        if not segments:
+            segments = [{'start': 0, 'end': result.get('duration', 0), 'text': result['text']}]
+        return {
+            'text': result['text'],
+            'segments': segments,
+            'language': 'zh'
+        }
+
+class LocalProcessBackend(ASRBackend):
+    """在子进程中运行本地版命令行（其识别引擎由TRANSCRIBER_BACKEND决定），被取消时结束子进程"""
+    name = 'local'
+
+    def available(self):
+        return HEDGE_LOCAL and os.path.exists(LOCAL_SCRIPT)
+
+    def transcribe(self, audio, job=None, cancel=None, audio_path=None, deadline=None, **options):
+        """
+        Args:
+            deadline (float): 剩余的截止时间（秒），本地版据此选择模型和解码参数
+        """
+        print("使用本地Whisper识别...", file=sys.stderr)
+        command = [sys.executable, LOCAL_SCRIPT]
+        if deadline:
+            command += ['--deadline', str(int(max(1, deadline)))]
+
+        with _wav_file(audio, audio_path) as path:
+            process = subprocess.Popen(command + [path], stdout=subprocess.PIPE, text=True, encoding='utf-8',
+                                       cwd=os.path.dirname(LOCAL_SCRIPT))
+            while True:
+                try:
+                    output, _ = process.communicate(timeout=0.5)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        process.kill()
+                        process.communicate()
+                        raise HedgeCancelled()
+
+        # Whisper的verbose输出也在stdout中，结果是最后一行JSON
+        lines = [line for line in output.splitlines() if line.startswith('{')]
+        if not lines:
+            raise Exception(f"本地Whisper没有输出结果 (退出码: {process.returncode})")
+        result = json.loads(lines[-1])
+        if not result.get('success'):
+            raise Exception(result.get('error') or '本地Whisper识别失败')
+
+        data = result['data']
+        return {
+            'text': data.get('full_text', ''),
+            'segments': data.get('segments', []),
+            'language': data.get('language', 'zh')
+        }
+
+# 本地识别引擎
+LOCAL_BACKENDS = ('whisper', 'faster-whisper')
+
+def create_local_backend(registry, batcher=None, name=None):
+    """
+    按配置创建本地识别引擎
+
+    Args:
+        registry (ModelRegistry): openai-whisper的模型管理
+        batcher (BatchedInference): openai-whisper的批量推理
+        name (str): whisper 或 faster-whisper，默认读取TRANSCRIBER_BACKEND（默认whisper）
+
+    Returns:
+        ASRBackend: 选择的引擎；faster-whisper未安装时回退到openai-whisper
+    """
+    name = (name or os.getenv('TRANSCRIBER_BACKEND', 'whisper')).strip().lower()
+    if name not in LOCAL_BACKENDS:
+        print(f"未知的识别引擎 {name}，使用openai-whisper", file=sys.stderr)
+        name = 'whisper'
+    if name == 'faster-whisper':
+        backend = FasterWhisperBackend()
+        if backend.available():
+            return backend
+        print("faster-whisper未安装（pip install faster-whisper），使用openai-whisper", file=sys.stderr)
+    return WhisperBackend(registry, batcher)
+
+def create_cloud_backends(session, names=None):
+    """
+    按配置的顺序创建云端版的识别后端（对冲调度的顺序）
+
+    Args:
+        session (requests.Session): 云端接口共用的HTTP会话
+        names (list): 后端名称，默认读取TRANSCRIBER_CLOUD_BACKENDS（默认 baidu,openai,local）
+
+    Returns:
+        list: ASRBackend列表（包括当前不可用的，调用时再检查）
+    """
+    if names is None:
+        names = [name.strip().lower() for name in os.getenv('TRANSCRIBER_CLOUD_BACKENDS', 'baidu,openai,local').split(',')
+                 if name.strip()]
+    factories = {
+        'baidu': lambda: BaiduBackend(session),
+        'openai': lambda: OpenAIBackend(session),
+        'local': LocalProcessBackend,
+    }
+    backends = []
+    for name in names:
+        if name not in factories:
+            print(f"未知的云端识别后端 {name}，忽略", file=sys.stderr)
+            continue
+        backends.append(factories[name]())
+    return backends
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量转写
+下载在线程池中并发进行，识别在当前线程按下载完成顺序串行执行（共用一个已加载的模型），
+每完成一个链接就输出一行JSON
+"""
+
+import os
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def read_url_list(source):
+    """
+    读取链接列表
+
+    Args:
+        source (str): 文件路径，"-" 表示从stdin读取；内容可以是JSON数组或每行一个链接
+
+    Returns:
+        list: 链接列表（去重，保持原顺序）
+    """
+    if source == '-':
+        content = sys.stdin.read()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+    content = content.strip()
+    if content.startswith('['):
+        urls = [str(item.get('url') if isinstance(item, dict) else item) for item in json.loads(content)]
+    else:
+        urls = [line.strip() for line in content.splitlines()]
+
+    return list(dict.fromkeys(url for url in urls if url and not url.startswith('#')))
+
+def run_batch(urls, prepare, finish, emit, concurrency=None):
+    """
+    执行批量转写
+
+    Args:
+        urls (list): 链接列表
+        prepare (callable): prepare(url) -> 准备好的任务，在下载线程中执行（下载、解码等）
+        finish (callable): finish(url, task) -> 结果字典，在当前线程中执行（识别、格式化、清理）
+        emit (callable): emit(result) 每完成一个链接调用一次
+        concurrency (int): 并发下载数，默认读取TRANSCRIBER_DOWNLOAD_CONCURRENCY
+
+    Returns:
+        dict: 成功/失败计数
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv('TRANSCRIBER_DOWNLOAD_CONCURRENCY', '4'))
+    concurrency = max(1, concurrency)
+
+    # 限制已下载但尚未识别的任务数，避免下载远快于识别时占满磁盘和内存
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def prepare_with_slot(url):
+        slots.acquire()
+        try:
+            return prepare(url)
+        except BaseException:
+            slots.release()
+            raise
+
+    summary = {'total': len(urls), 'success': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(prepare_with_slot, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                task = future.result()
+            except Exception as e:
+                result = {'success': False, 'error': f'处理失败: {str(e)}'}
+            else:
+                try:
+                    result = finish(url, task)
+                except Exception as e:
+                    result = {'success': False, 'error': f'处理失败: {str(e)}'}
+                finally:
+                    slots.release()
+
+            result['url'] = url
+            summary['success' if result.get('success') else 'failed'] += 1
+            emit(result)
+
+    return summary
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量推理
+model.transcribe 每次只把一个30秒窗口送入编码器（批大小为1），CPU上的矩阵乘远没有吃满。
+这里把多个分段的窗口（可以来自同时运行的不同任务）叠成一批：梅尔特征按批一次向量化计算，
+编码器一次前向，贪心解码也按批逐步进行。第一个窗口到达后最多等待TRANSCRIBER_BATCH_WAIT_MS凑批。
+
+每个分段仍按 model.transcribe 的规则逐窗口推进（窗口内最后一句没说完时从最后一个时间戳继续），
+分段、时间戳和静音跳过规则相同，结果与逐段调用 model.transcribe 一致。
+只支持单一温度0、贪心解码且不依赖前文的参数（最快档位），其他参数仍逐段调用 model.transcribe
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import collections
+from concurrent.futures import Future
+
+import numpy as np
+
+from transcriber_job import JobCancelled
+
+# 这些参数需要逐窗口回退、依赖前文或逐词对齐，无法按批解码
+UNBATCHABLE_OPTIONS = ('word_timestamps', 'condition_on_previous_text', 'initial_prompt',
+                       'clip_timestamps', 'hallucination_silence_threshold')
+
+def batchable(options):
+    """解码参数是否可以批量解码：单一温度0、束宽不超过1，且不依赖前文和逐词时间戳"""
+    temperature = options.get('temperature', 0.0)
+    temperatures = list(temperature) if isinstance(temperature, (list, tuple)) else [temperature]
+    if temperatures != [0]:
+        return False
+    if (options.get('beam_size') or 1) > 1:
+        return False
+    return not any(options.get(name) for name in UNBATCHABLE_OPTIONS)
+
+def batched_log_mel(audios, n_mels=80):
+    """
+    一次计算多段音频的对数梅尔特征
+
+    与 whisper.log_mel_spectrogram(audio, padding=N_SAMPLES) 的有效帧相同：每段末尾补零后一起做STFT，
+    再按各自的最大值归一化（补零部分的能量为下限值，不影响最大值）
+
+    Args:
+        audios (list): 16kHz float32音频
+        n_mels (int): 梅尔通道数（模型的 dims.n_mels）
+
+    Returns:
+        list: 每段音频的特征 (n_mels, len(audio) // HOP_LENGTH)
+    """
+    import torch
+    from whisper.audio import N_FFT, HOP_LENGTH, mel_filters
+
+    lengths = [len(audio) for audio in audios]
+    # 最后一个有效帧的窗口延伸到音频之后，补零长度需覆盖它
+    batch = torch.zeros(len(audios), max(lengths) + 2 * N_FFT)
+    for row, audio in zip(batch, audios):
+        row[:len(audio)] = torch.from_numpy(np.asarray(audio, dtype=np.float32))
+    window = torch.hann_window(N_FFT)
+    stft = torch.stft(batch, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    log_spec = torch.clamp(mel_filters(batch.device, n_mels) @ magnitudes, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(1, 2), keepdim=True) - 8.0)
+    log_spec = (log_spec + 4.0) / 4.0
+    return [log_spec[i, :, :length // HOP_LENGTH].clone() for i, length in enumerate(lengths)]
+
+def decoding_options(options):
+    """把 model.transcribe 的参数转换为单个窗口的 DecodingOptions（与transcribe在温度0时传入的相同）"""
+    from dataclasses import fields
+    from whisper.decoding import DecodingOptions
+
+    names = {field.name for field in fields(DecodingOptions)}
+    kwargs = {name: value for name, value in options.items() if name in names and name != 'best_of'}
+    kwargs['temperature'] = 0.0
+    return DecodingOptions(**kwargs)
+
+class _Request:
+    """一个分段的识别请求：按窗口推进，直到分段末尾"""
+
+    def __init__(self, job, model_size, audio, options):
+        self.job = job
+        self.model_size = model_size
+        self.audio = audio
+        self.options = options
+        self.key = (model_size, repr(sorted(options.items())))
+        self.future = Future()
+        self.mel = None
+        self.seek = 0
+        self.segments = []
+        self.tokens = []
+        self.queued = time.perf_counter()
+
+    @property
+    def finished(self):
+        return self.mel is not None and self.seek >= self.mel.shape[-1]
+
+    def window(self):
+        """当前窗口的特征（不足30秒时补零）及其有效帧数"""
+        from whisper.audio import N_FRAMES, pad_or_trim
+
+        segment_size = min(N_FRAMES, self.mel.shape[-1] - self.seek)
+        return pad_or_trim(self.mel[:, self.seek:self.seek + segment_size], N_FRAMES), segment_size
+
+    def consume(self, result, segment_size, tokenizer, time_precision, input_stride):
+        """
+        按 model.transcribe 的规则处理一个窗口的解码结果：跳过静音窗口、按时间戳切分句子，
+        窗口末尾的句子没说完时丢弃它并从最后一个时间戳继续下一个窗口
+        """
+        import torch
+        from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+
+        seek = self.seek
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+        no_speech_threshold = self.options.get('no_speech_threshold')
+        logprob_threshold = self.options.get('logprob_threshold')
+        if no_speech_threshold is not None:
+            should_skip = result.no_speech_prob > no_speech_threshold
+            if logprob_threshold is not None and result.avg_logprob > logprob_threshold:
+                should_skip = False
+            if should_skip:
+                self.seek += segment_size
+                return
+
+        def new_segment(start, end, tokens):
+            tokens = tokens.tolist()
+            text_tokens = [token for token in tokens if token < tokenizer.eot]
+            return {
+                'seek': seek,
+                'start': start,
+                'end': end,
+                'text': tokenizer.decode(text_tokens),
+                'tokens': tokens,
+                'temperature': result.temperature,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob,
+            }
+
+        tokens = torch.tensor(result.tokens)
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+        current_segments = []
+        if len(consecutive) > 0:
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+            last_slice = 0
+            for current_slice in slices:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start_position = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                end_position = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                current_segments.append(new_segment(time_offset + start_position * time_precision,
+                                                    time_offset + end_position * time_precision,
+                                                    sliced_tokens))
+                last_slice = current_slice
+            if single_timestamp_ending:
+                self.seek += segment_size
+            else:
+                self.seek += (tokens[last_slice - 1].item() - tokenizer.timestamp_begin) * input_stride
+        else:
+            duration = segment_duration
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * time_precision
+            current_segments.append(new_segment(time_offset, time_offset + duration, tokens))
+            self.seek += segment_size
+
+        for segment in current_segments:
+            if segment['start'] == segment['end'] or segment['text'].strip() == '':
+                segment['text'] = ''
+                segment['tokens'] = []
+        self.segments.extend(dict(segment, id=i) for i, segment in enumerate(current_segments, len(self.segments)))
+        self.tokens.extend(token for segment in current_segments for token in segment['tokens'])
+
+    def result(self, tokenizer):
+        """与 model.transcribe 相同格式的结果"""
+        return {'text': tokenizer.decode(self.tokens), 'segments': self.segments,
+                'language': self.options.get('language')}
+
+class BatchedInference:
+    def __init__(self, registry, max_batch=None, wait_ms=None):
+        """
+        初始化批量推理
+
+        Args:
+            registry (ModelRegistry): 模型管理，推理时持有对应模型的推理锁
+            max_batch (int): 每批最多的窗口数，默认读取TRANSCRIBER_BATCH_SIZE（默认8），1表示不批量
+            wait_ms (float): 第一个窗口到达后凑批的最长等待（毫秒），默认读取TRANSCRIBER_BATCH_WAIT_MS（默认20）
+        """
+        self.registry = registry
+        self.max_batch = max(1, int(max_batch if max_batch is not None
+                                    else os.getenv('TRANSCRIBER_BATCH_SIZE', '8')))
+        wait_ms = wait_ms if wait_ms is not None else float(os.getenv('TRANSCRIBER_BATCH_WAIT_MS', '20'))
+        self.wait_seconds = max(0.0, wait_ms) / 1000.0
+        # 各批大小的次数，用于观察实际凑批情况
+        self.batch_sizes = collections.Counter()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_batch > 1
+
+    def accepts(self, options):
+        """是否由批量推理处理这组解码参数"""
+        return self.enabled and batchable(options)
+
+    def submit(self, job, audio, options=None):
+        """
+        提交一个分段（不超过30秒时只有一个窗口，更长的分段按窗口推进）
+
+        Args:
+            job (JobContext): 任务上下文，使用其模型；推理耗时按批内窗口数分摊计入任务统计
+            audio (numpy.ndarray): 16kHz float32音频
+            options (dict): 解码参数，默认使用任务的解码参数
+
+        Returns:
+            concurrent.futures.Future: 结果与 model.transcribe 的返回值格式相同
+        """
+        request = _Request(job, job.model_size, audio, dict(job.decode_options if options is None else options))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='batched-inference', daemon=True)
+                self._thread.start()
+        self._queue.put(request)
+        return request.future
+
+    def _run(self):
+        """调度线程：按模型和解码参数凑批，未走完的分段优先进入下一批"""
+        pending = collections.deque()
+        while True:
+            batch = []
+            try:
+                if not pending:
+                    pending.append(self._queue.get())
+                batch = self._collect(pending)
+                if not batch:
+                    continue
+                self._step(batch)
+                for request in reversed(batch):
+                    if not request.future.done():
+                        pending.appendleft(request)
+            except Exception as e:
+                # 调度线程不能退出，否则排队中的请求永远等不到结果：本批以异常结束，继续处理其余请求
+                print(f"批量推理失败: {e}", file=sys.stderr)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _admit(self, request):
+        """请求能否进入本批：已取消的请求直接结束"""
+        if request.future.cancelled():
+            return False
+        if request.job is not None and request.job.cancelled:
+            if not request.future.done():
+                request.future.set_exception(JobCancelled('任务已取消'))
+            return False
+        if request.mel is None and not request.future.set_running_or_notify_cancel():
+            return False
+        return True
+
+    def _collect(self, pending):
+        """取出与最早的请求参数相同的一批，不足时在等待时间内继续接收新请求"""
+        key = pending[0].key
+        batch = []
+        rest = collections.deque()
+        deadline = time.perf_counter() + self.wait_seconds
+        while pending or len(batch) < self.max_batch:
+            if pending:
+                request = pending.popleft()
+            else:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if request.key != key or len(batch) >= self.max_batch:
+                rest.append(request)
+            elif self._admit(request):
+                batch.append(request)
+        pending.extend(rest)
+        return batch
+
+    def _step(self, batch):
+        """批内每个请求推进一个窗口：新请求先一起计算梅尔特征，所有窗口一次编码、一起贪心解码"""
+        import torch
+        from whisper.audio import N_FRAMES, HOP_LENGTH, SAMPLE_RATE
+        from whisper.tokenizer import get_tokenizer
+
+        model_size = batch[0].model_size
+        options = batch[0].options
+        model = self.registry.get(model_size)
+        with self.registry.inference_lock(model_size):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            fresh = [request for request in batch if request.mel is None]
+            if fresh:
+                for request, mel in zip(fresh, batched_log_mel([request.audio for request in fresh],
+                                                               model.dims.n_mels)):
+                    request.mel = mel
+                    request.audio = None
+            # 空音频没有窗口，直接完成
+            active = [request for request in batch if not request.finished]
+            windows = [request.window() for request in active]
+            results = []
+            if active:
+                with torch.no_grad():
+                    results = model.decode(torch.stack([mel for mel, _ in windows]), decoding_options(options))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+        self.batch_sizes[len(active)] += 1
+
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                  language=options.get('language'), task=options.get('task'))
+        input_stride = N_FRAMES // model.dims.n_audio_ctx
+        time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+        for request, result, (_, segment_size) in zip(active, results, windows):
+            request.consume(result, segment_size, tokenizer, time_precision, input_stride)
+        now = time.perf_counter()
+        for request in batch:
+            if request.job is not None:
+                request.job.metrics.record('model_wait', wall_start - request.queued, 0.0)
+                request.job.metrics.record('inference', wall / len(batch), cpu / len(batch))
+            request.queued = now
+            if request.finished:
+                request.future.set_result(request.result(tokenizer))
@@ -0,0 +1,1352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转文字性能测试工具
+在本机离线运行，用本地HTTP服务模拟视频平台，测量端到端耗时
+
+用法:
+    python transcriber_benchmark.py pipeline --input sample.wav [--rate-kbps 512] [--repeat 3]
+    python transcriber_benchmark.py download --input sample.m4a [--rate-kbps 512]
+    python transcriber_benchmark.py opencc [--segments 5000]
+    python transcriber_benchmark.py format [--segments 50000]
+    python transcriber_benchmark.py cloud [--duration 600] [--latency 1.0] [--concurrency 4]
+    python transcriber_benchmark.py hedge [--slow-latency 6] [--fast-latency 0.5]
+    python transcriber_benchmark.py upload [--duration 600]
+    python transcriber_benchmark.py queue [--users 10] [--slots 2]
+    python transcriber_benchmark.py stress [--jobs 4] [--fixtures 10s 2min]
+    python transcriber_benchmark.py resume [--fixture 20min] [--timeout 60]
+    python transcriber_benchmark.py batch [--fixture 20min] [--windows 32] [--batch-sizes 1 2 4 8 16]
+    python transcriber_benchmark.py suite [--seed speech.wav --seed-text speech.txt] [--output results.json]
+    python transcriber_benchmark.py backends [--backends whisper faster-whisper] [--seed speech.wav --seed-text speech.txt]
+    python transcriber_benchmark.py chunking [--windows 60:0 15:0 15:2 10:2] [--seed speech.wav --seed-text speech.txt]
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import unicodedata
+import urllib.request
+import multiprocessing
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+
+import numpy as np
+
+from transcriber_audio import SAMPLE_RATE, decode_audio, write_wav
+
+# 基准测试的固定音频时长：短视频、常见视频、长视频
+FIXTURE_DURATIONS = {'10s': 10, '2min': 120, '20min': 1200}
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    """按固定带宽发送文件的静态文件服务，用来模拟网络下载"""
+    rate_bytes = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        if not self.rate_bytes:
+            return super().copyfile(source, outputfile)
+        block = max(1024, self.rate_bytes // 20)
+        while True:
+            data = source.read(block)
+            if not data:
+                break
+            outputfile.write(data)
+            time.sleep(len(data) / float(self.rate_bytes))
+
+def serve_directory(directory, rate_bytes=None):
+    """
+    在127.0.0.1的随机端口上启动静态文件服务
+
+    Args:
+        directory (str): 根目录
+        rate_bytes (int): 限速（字节/秒），为空表示不限速
+
+    Returns:
+        tuple: (服务器对象, 根地址)
+    """
+    handler = type('Handler', (ThrottledHandler,), {'rate_bytes': rate_bytes})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+def download_file(url, output_path):
+    """顺序流程使用的普通下载"""
+    with urllib.request.urlopen(url) as response, open(output_path, 'wb') as f:
+        shutil.copyfileobj(response, f)
+
+def bench_pipeline(args):
+    """对比先下载后识别与流水线识别的端到端耗时"""
+    from video_transcriber import VideoTranscriber
+
+    rate_bytes = args.rate_kbps * 1024 // 8 if args.rate_kbps else None
+    directory = os.path.dirname(os.path.abspath(args.input))
+    server, base_url = serve_directory(directory, rate_bytes)
+    media_url = f'{base_url}/{os.path.basename(args.input)}'
+
+    transcriber = VideoTranscriber(model_size=args.model, workers=args.workers)
+    transcriber.load_model()
+    runs = {'sequential': [], 'streaming': []}
+
+    try:
+        for i in range(args.repeat):
+            print(f"第{i + 1}/{args.repeat}轮", file=sys.stderr)
+
+            temp_dir = tempfile.mkdtemp()
+            try:
+                start = time.time()
+                local_path = os.path.join(temp_dir, os.path.basename(args.input))
+                download_file(media_url, local_path)
+                downloaded = time.time() - start
+                transcriber.transcribe_audio_chunked(local_path, chunk_duration=args.chunk_duration)
+                runs['sequential'].append({'total': time.time() - start, 'download': downloaded})
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+            start = time.time()
+            result = transcriber.transcribe_stream(media_url, chunk_duration=args.chunk_duration)
+            runs['streaming'].append({'total': time.time() - start,
+                                      'first_chunk': result['first_chunk_seconds']})
+    finally:
+        server.shutdown()
+        transcriber.close()
+
+    report = {
+        'input': args.input,
+        'rate_kbps': args.rate_kbps,
+        'model': args.model,
+        'chunk_duration': args.chunk_duration,
+        'runs': runs,
+        'mean_total': {name: sum(run['total'] for run in items) / len(items)
+                       for name, items in runs.items() if items}
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def bench_download(args):
+    """通过本地HTTP服务测试单次yt-dlp下载 + 一次ffmpeg解码，检查返回的路径和视频信息"""
+    from transcriber_download import download_audio
+
+    rate_bytes = args.rate_kbps * 1024 // 8 if args.rate_kbps else None
+    directory = os.path.dirname(os.path.abspath(args.input))
+    server, base_url = serve_directory(directory, rate_bytes)
+    media_url = f'{base_url}/{os.path.basename(args.input)}'
+
+    runs = []
+    try:
+        for i in range(args.repeat):
+            temp_dir = tempfile.mkdtemp()
+            try:
+                start = time.perf_counter()
+                media = download_audio(media_url, temp_dir)
+                downloaded = time.perf_counter() - start
+                audio = decode_audio(media['path'])
+                runs.append({
+                    'download': round(downloaded, 3),
+                    'decode': round(time.perf_counter() - start - downloaded, 3),
+                    'path_exists': os.path.exists(media['path']),
+                    'bytes': os.path.getsize(media['path']),
+                    'audio_seconds': round(len(audio) / float(SAMPLE_RATE), 1),
+                    'media': {key: value for key, value in media.items() if key != 'path'}
+                })
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+    print(json.dumps({'input': args.input, 'rate_kbps': args.rate_kbps, 'runs': runs},
+                     ensure_ascii=False, indent=2))
+
+class MockBaiduHandler(BaseHTTPRequestHandler):
+    """模拟百度令牌接口和短语音识别接口，按固定延迟返回，记录请求次数和最大并发数"""
+    latency = 0.0
+    fail = False
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stats = self.stats
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.path.startswith('/oauth/2.0/token'):
+            with stats['lock']:
+                stats['token_requests'] += 1
+            return self._reply({'access_token': 'mock-token', 'expires_in': 2592000})
+
+        # 原始PCM上传（Content-Type: audio/pcm;rate=16000）或base64 JSON上传
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('audio/pcm'):
+            audio = body
+            rate = int(content_type.split('rate=')[1])
+        else:
+            payload = json.loads(body)
+            audio = base64.b64decode(payload['speech'])
+            rate = payload['rate']
+            if len(audio) != payload['len']:
+                return self._reply({'err_no': 3300, 'err_msg': 'len mismatch'})
+        with stats['lock']:
+            stats['asr_requests'] += 1
+            stats['received'].append(hashlib.sha256(audio).hexdigest())
+            stats['active'] += 1
+            stats['max_active'] = max(stats['max_active'], stats['active'])
+        try:
+            time.sleep(self.latency)
+            if self.fail:
+                return self._reply({'err_no': 3302, 'err_msg': 'mock failure'})
+            seconds = len(audio) / 2.0 / rate
+            if seconds > 60:
+                return self._reply({'err_no': 3308, 'err_msg': 'speech too long'})
+            return self._reply({'err_no': 0, 'result': [f'窗口{seconds:.1f}秒。']})
+        finally:
+            with stats['lock']:
+                stats['active'] -= 1
+
+class MockOpenAIHandler(MockBaiduHandler):
+    """模拟OpenAI转写接口，返回verbose_json格式的分段"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        # 取出multipart中的文件内容
+        boundary = self.headers.get('Content-Type', '').split('boundary=')[-1].encode('utf-8')
+        data = next((part.split(b'\r\n\r\n', 1)[1][:-2] for part in body.split(b'--' + boundary)
+                     if b'filename=' in part), b'')
+        with self.stats['lock']:
+            self.stats['asr_requests'] += 1
+            self.stats['received'].append(hashlib.sha256(data).hexdigest())
+        time.sleep(self.latency)
+        if self.fail:
+            return self._reply({'error': {'message': 'mock failure'}})
+        return self._reply({'text': '備用接口結果。', 'duration': 10.0,
+                            'segments': [{'start': 0.0, 'end': 10.0, 'text': '備用接口結果。'}]})
+
+def serve_mock_baidu(latency, fail=False, handler_class=MockBaiduHandler):
+    """
+    在127.0.0.1的随机端口上启动模拟百度接口（或用handler_class指定的其他模拟接口）
+
+    Returns:
+        tuple: (服务器对象, 根地址, 请求统计)
+    """
+    stats = {'lock': threading.Lock(), 'token_requests': 0, 'asr_requests': 0, 'active': 0, 'max_active': 0,
+             'received': []}
+    handler = type('Handler', (handler_class,), {'latency': latency, 'fail': fail, 'stats': stats})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}', stats
+
+def bench_cloud(args):
+    """用模拟百度接口测试云端分窗口识别：逐个发送与并发发送的耗时、令牌缓存和时间戳"""
+    server, base_url, stats = serve_mock_baidu(args.latency)
+    os.environ['BAIDU_TOKEN_URL'] = f'{base_url}/oauth/2.0/token'
+    os.environ['BAIDU_ASR_URL'] = f'{base_url}/server_api'
+    os.environ.setdefault('BAIDU_API_KEY', 'mock-key')
+    os.environ.setdefault('BAIDU_SECRET_KEY', 'mock-secret')
+    import requests
+    from transcriber_backends import BaiduBackend
+
+    audio = synthesize_speech_like(args.duration)
+    runs = []
+    try:
+        session = requests.Session()
+        for concurrency in (1, args.concurrency):
+            backend = BaiduBackend(session, concurrency=concurrency)
+            for i in range(args.repeat):
+                with stats['lock']:
+                    stats['asr_requests'] = stats['max_active'] = 0
+                start = time.perf_counter()
+                result = backend.transcribe(audio)
+                segments = result['segments']
+                runs.append({
+                    'concurrency': concurrency,
+                    'seconds': round(time.perf_counter() - start, 3),
+                    'windows': stats['asr_requests'],
+                    'max_active': stats['max_active'],
+                    'segments': len(segments),
+                    'first': segments[0] if segments else None,
+                    'last_end': segments[-1]['end'] if segments else None,
+                    'timestamps_ordered': all(a['end'] <= b['start'] for a, b in zip(segments, segments[1:])),
+                })
+    finally:
+        server.shutdown()
+
+    print(json.dumps({'audio_seconds': args.duration, 'latency': args.latency,
+                      'token_requests': stats['token_requests'], 'runs': runs},
+                     ensure_ascii=False, indent=2))
+
+def bench_hedge(args):
+    """
+    用模拟百度和OpenAI接口对比对冲调度与顺序回退（前一个失败才启动下一个）的延迟
+
+    场景：百度正常、百度变慢（超过历史延迟分位数）、百度故障
+    """
+    os.environ['TRANSCRIBER_HEDGE_LOCAL'] = 'false'
+    os.environ.setdefault('BAIDU_API_KEY', 'mock-key')
+    os.environ.setdefault('BAIDU_SECRET_KEY', 'mock-secret')
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    scenarios = [
+        ('baidu_normal', args.fast_latency, False),
+        ('baidu_slow', args.slow_latency, False),
+        ('baidu_down', args.fast_latency, True),
+    ]
+    audio = synthesize_speech_like(args.duration)
+    temp_dir = tempfile.mkdtemp()
+    audio_path = os.path.join(temp_dir, 'speech-16k.wav')
+    write_wav(audio_path, audio)
+    openai_server, openai_url, _ = serve_mock_baidu(args.fast_latency * 2, handler_class=MockOpenAIHandler)
+    os.environ['OPENAI_API_BASE'] = f'{openai_url}/v1'
+
+    import transcriber_backends
+    import video_transcriber_cloud
+    from transcriber_hedge import LatencyStats, HedgedScheduler
+
+    # 预置百度的历史延迟（正常情况），对冲阈值由其分位数决定
+    history = LatencyStats(path='')
+    for _ in range(20):
+        history.record('baidu', 'success', args.fast_latency * 1.2, args.duration)
+
+    results = []
+    try:
+        for name, latency, fail in scenarios:
+            baidu_server, baidu_url, _ = serve_mock_baidu(latency, fail)
+            transcriber_backends.BAIDU_TOKEN_URL = f'{baidu_url}/oauth/2.0/token'
+            transcriber_backends.BAIDU_ASR_URL = f'{baidu_url}/server_api'
+            transcriber_backends.OPENAI_API_BASE = f'{openai_url}/v1'
+            transcriber_backends._baidu_token_cache.clear()
+            try:
+                for mode in ('sequential', 'hedged'):
+                    transcriber = video_transcriber_cloud.CloudVideoTranscriber()
+                    stats = LatencyStats(path='')
+                    stats.backends = history.snapshot()
+                    if mode == 'sequential':
+                        transcriber.scheduler = HedgedScheduler(stats, min_delay=float('inf'), max_delay=float('inf'))
+                    else:
+                        transcriber.scheduler = HedgedScheduler(stats, min_delay=0.5)
+                    media = {'audio': audio, 'audio_path': audio_path, 'duration': args.duration}
+                    start = time.perf_counter()
+                    result, hedge = transcriber.scheduler.run(transcriber.recognition_backends(transcriber.new_job(), media),
+                                                               args.duration)
+                    results.append({
+                        'scenario': name,
+                        'mode': mode,
+                        'seconds': round(time.perf_counter() - start, 3),
+                        'winner': hedge['winner'],
+                        'launched': hedge['launched'],
+                        'delays': hedge['delays'],
+                        'segments': len(result['segments']),
+                    })
+            finally:
+                baidu_server.shutdown()
+    finally:
+        openai_server.shutdown()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(json.dumps({'audio_seconds': args.duration, 'results': results}, ensure_ascii=False, indent=2))
+
+# 上传方式：原实现（整体读入、base64、JSON/multipart整体生成）与流式上传
+UPLOAD_MODES = ['baidu_legacy', 'baidu_json_stream', 'baidu_raw', 'openai_legacy', 'openai_stream']
+
+def _status_mb(field):
+    """/proc/self/status 中的内存字段（MB），如 VmRSS（当前）和 VmHWM（峰值）"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+def _reset_peak_rss():
+    """把本进程的峰值内存（VmHWM）重置为当前值（Linux 4.0+）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _run_upload(mode, wav_path, pcm_path, base_url, connection):
+    """在独立子进程中按一种方式上传整段音频，报告上传带来的峰值内存增量"""
+    try:
+        import requests
+        from transcriber_upload import pcm16_pieces, RawBody, Base64JSONBody, MultipartFileBody
+
+        # 真实流程中解码后的音频本就在内存中，先读入再记录基线（直接读取PCM，不产生临时数组）
+        audio = np.fromfile(pcm_path, dtype=np.float32)
+        pieces = [(0, len(audio))]
+        pcm_length = 2 * len(audio)
+        session = requests.Session()
+        # ru_maxrss会继承父进程在exec前的峰值，这里用可重置的VmHWM
+        _reset_peak_rss()
+        baseline = _status_mb('VmRSS')
+        start = time.perf_counter()
+
+        if mode == 'baidu_legacy':
+            with open(wav_path, 'rb') as f:
+                audio_data = f.read()
+            payload = {'format': 'wav', 'rate': SAMPLE_RATE, 'channel': 1, 'cuid': 'bench', 'token': 'mock-token',
+                       'speech': base64.b64encode(audio_data).decode('utf-8'), 'len': len(audio_data)}
+            session.post(f'{base_url}/server_api', json=payload, timeout=300)
+            expected = hashlib.sha256(audio_data).hexdigest()
+        elif mode in ('baidu_json_stream', 'baidu_raw'):
+            if mode == 'baidu_raw':
+                body = RawBody(pcm16_pieces(audio, pieces), pcm_length, f'audio/pcm;rate={SAMPLE_RATE}')
+            else:
+                body = Base64JSONBody({'format': 'pcm', 'rate': SAMPLE_RATE, 'channel': 1, 'len': pcm_length,
+                                       'token': 'mock-token', 'cuid': 'bench'},
+                                      'speech', pcm16_pieces(audio, pieces), pcm_length)
+            session.post(f'{base_url}/server_api', data=body, headers={'Content-Type': body.content_type}, timeout=300)
+            digest = hashlib.sha256()
+            for chunk in pcm16_pieces(audio, pieces):
+                digest.update(chunk)
+            expected = digest.hexdigest()
+        else:
+            fields = {'model': 'whisper-1', 'language': 'zh', 'response_format': 'verbose_json'}
+            if mode == 'openai_legacy':
+                with open(wav_path, 'rb') as f:
+                    session.post(f'{base_url}/v1/audio/transcriptions', files={'file': f}, data=fields, timeout=300)
+            else:
+                body = MultipartFileBody(fields, 'file', wav_path, file_type='audio/wav')
+                session.post(f'{base_url}/v1/audio/transcriptions', data=body,
+                             headers={'Content-Type': body.content_type}, timeout=300)
+            digest = hashlib.sha256()
+            with open(wav_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            expected = digest.hexdigest()
+
+        connection.send({
+            'mode': mode,
+            'seconds': round(time.perf_counter() - start, 3),
+            'baseline_rss_mb': round(baseline, 1),
+            'upload_rss_mb': round(_status_mb('VmHWM') - baseline, 1),
+            'expected': expected,
+        })
+    except Exception as e:
+        connection.send({'mode': mode, 'error': str(e)})
+    finally:
+        connection.close()
+
+def bench_upload(args):
+    """对比原实现与流式上传的峰值内存（每种方式一个子进程），并检查模拟接口收到的音频完全一致"""
+    audio = synthesize_speech_like(args.duration)
+    temp_dir = tempfile.mkdtemp()
+    wav_path = os.path.join(temp_dir, 'speech-16k.wav')
+    pcm_path = os.path.join(temp_dir, 'speech-16k.f32')
+    write_wav(wav_path, audio)
+    audio.astype(np.float32).tofile(pcm_path)
+    baidu_server, baidu_url, baidu_stats = serve_mock_baidu(0)
+    openai_server, openai_url, openai_stats = serve_mock_baidu(0, handler_class=MockOpenAIHandler)
+
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    try:
+        for mode in UPLOAD_MODES:
+            stats = openai_stats if mode.startswith('openai') else baidu_stats
+            base_url = openai_url if mode.startswith('openai') else baidu_url
+            parent, child = context.Pipe(duplex=False)
+            process = context.Process(target=_run_upload, args=(mode, wav_path, pcm_path, base_url, child))
+            process.start()
+            child.close()
+            report = parent.recv()
+            process.join()
+            with stats['lock']:
+                received = stats['received'][-1] if stats['received'] else None
+            report['received_ok'] = received == report.pop('expected', None)
+            reports.append(report)
+    finally:
+        baidu_server.shutdown()
+        openai_server.shutdown()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(json.dumps({'audio_seconds': args.duration, 'wav_mb': round(len(audio) * 2 / 1048576.0, 1),
+                      'runs': reports}, ensure_ascii=False, indent=2))
+
+def simulate_queue(jobs, slots, order):
+    """
+    按虚拟时间模拟有限并发的任务执行
+
+    Args:
+        jobs (list): 任务（含 id/user_id/duration/enqueued_at/seconds，seconds为实际耗时）
+        slots (int): 同时运行的任务数
+        order (callable): order(queued, running, now) -> 下一个执行的任务
+
+    Returns:
+        dict: {任务id: 完成时间}
+    """
+    pending = sorted(jobs, key=lambda job: job['enqueued_at'])
+    queued, running, finished = [], [], {}
+    now = 0.0
+    while pending or queued or running:
+        while pending and pending[0]['enqueued_at'] <= now:
+            queued.append(pending.pop(0))
+        while queued and len(running) < slots:
+            job = order(queued, running, now)
+            queued.remove(job)
+            running.append(dict(job, started_at=now))
+        events = [job['started_at'] + job['seconds'] for job in running]
+        if pending:
+            events.append(pending[0]['enqueued_at'])
+        now = min(events)
+        for job in [job for job in running if job['started_at'] + job['seconds'] <= now]:
+            running.remove(job)
+            finished[job['id']] = now
+    return finished
+
+def simulate_shared(jobs, slots):
+    """不限制并发：所有任务平分 slots 份算力（处理器共享），返回 {任务id: 完成时间}"""
+    remaining = {job['id']: job['seconds'] for job in jobs}
+    finished = {}
+    now = 0.0
+    while remaining:
+        rate = min(1.0, slots / float(len(remaining)))
+        step = min(remaining.values()) / rate
+        now += step
+        for job_id in list(remaining):
+            remaining[job_id] -= step * rate
+            if remaining[job_id] <= 1e-9:
+                finished[job_id] = now
+                del remaining[job_id]
+    return finished
+
+def bench_queue(args):
+    """模拟一批用户同时提交任务：不限并发、先到先得队列、用户轮转+短任务优先队列的完成时间"""
+    from transcriber_queue import plan_queue
+
+    rng = np.random.default_rng(args.seed)
+    jobs = []
+    for user in range(args.users):
+        # 大多数是一两分钟的短视频，少数是半小时以上的长视频；个别用户一次提交多个
+        for _ in range(1 + int(rng.random() < 0.3) * 2):
+            duration = float(rng.choice([45, 60, 90, 120, 180, 2400], p=[0.25, 0.25, 0.2, 0.15, 0.1, 0.05]))
+            jobs.append({'id': len(jobs), 'user_id': f'user{user}', 'duration': duration,
+                         'enqueued_at': float(rng.uniform(0, 5)), 'seconds': 10 + duration * args.speed})
+
+    def estimate(duration):
+        return 10 + duration * args.speed
+
+    fifo = simulate_queue(jobs, args.slots, lambda queued, running, now: queued[0])
+    fair = simulate_queue(jobs, args.slots, lambda queued, running, now: plan_queue(
+        queued, running, args.slots, estimate, now=now, aging=args.aging)[0][0])
+    shared = simulate_shared(jobs, args.slots)
+
+    def report(finished):
+        latency = [finished[job['id']] - job['enqueued_at'] for job in jobs]
+        short = [finished[job['id']] - job['enqueued_at'] for job in jobs if job['duration'] <= 180]
+        timeouts = sum(1 for value in latency if value > args.timeout)
+        return {
+            'latency': dict(percentiles(latency), mean=round(sum(latency) / len(latency), 1)),
+            'short_video_latency': dict(percentiles(short), mean=round(sum(short) / len(short), 1)),
+            'timeouts': timeouts,
+        }
+
+    print(json.dumps({
+        'jobs': len(jobs), 'users': args.users, 'slots': args.slots, 'timeout': args.timeout,
+        'unbounded': report(shared),
+        'fifo': report(fifo),
+        'fair_sjf': report(fair),
+    }, ensure_ascii=False, indent=2))
+
+# 繁体测试语句，按随机顺序组合成分段，部分分段重复出现（与真实口播相似）
+TRADITIONAL_PHRASES = [
+    '大家好，歡迎來到我的頻道', '今天給大家分享一個非常實用的方法', '這個產品的質量真的很好',
+    '記得點讚關注加收藏', '我們先來看一下這個資料', '這裡需要注意的是', '然後把它們放進鍋裡',
+    '說實話我一開始也不太相信', '這樣做的話效果會更明顯', '謝謝大家的觀看', '下期再見',
+    '這個問題其實很簡單', '網路上很多人都在討論', '我覺得最重要的是堅持', '對於學生來說價格也還可以',
+]
+
+def bench_opencc(args):
+    """对比逐段转换（原实现）与批量转换+缓存的繁简转换耗时"""
+    from opencc import OpenCC
+    from transcriber_text import BatchConverter
+
+    rng = np.random.default_rng(0)
+    phrases = TRADITIONAL_PHRASES
+    texts = []
+    for _ in range(args.segments):
+        count = int(rng.integers(1, 4))
+        texts.append('，'.join(phrases[int(i)] for i in rng.integers(0, len(phrases), count)))
+
+    def per_segment():
+        cc = OpenCC('t2s')
+        segments = [{'text': text} for text in texts]
+        full_text = cc.convert(''.join(texts))
+        for segment in segments:
+            segment['text'] = cc.convert(segment['text'])
+        return full_text, segments
+
+    def batched():
+        converter = BatchConverter('t2s')
+        segments = [{'text': text} for text in texts]
+        return converter.convert_segments(segments), segments
+
+    report = {'segments': args.segments, 'unique_segments': len(set(texts)),
+              'chars': sum(len(text) for text in texts)}
+    outputs = {}
+    for name, func in (('per_segment', per_segment), ('batched', batched)):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs[name] = func()
+            timings.append(time.perf_counter() - start)
+        report[name] = dict(percentiles(timings), mean=round(sum(timings) / len(timings), 4))
+    report['identical'] = outputs['per_segment'] == outputs['batched']
+    report['speedup'] = round(report['per_segment']['mean'] / report['batched']['mean'], 2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def bench_format(args):
+    """对比字典列表+逐行拼接（原实现）与按列存储的分段格式化耗时和内存"""
+    import tracemalloc
+    from transcriber_segments import SegmentStore, json_default
+
+    rng = np.random.default_rng(0)
+    durations = rng.uniform(1.5, 6.0, args.segments)
+    starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+    whisper_segments = [{'id': i, 'start': float(start), 'end': float(start + duration),
+                         'text': ' ' + TRADITIONAL_PHRASES[i % len(TRADITIONAL_PHRASES)]}
+                        for i, (start, duration) in enumerate(zip(starts, durations))]
+
+    def format_time(seconds):
+        minutes = int(seconds // 60)
+        seconds = int(seconds % 60)
+        return f"{minutes:02d}:{seconds:02d}"
+
+    def dict_based():
+        segments = []
+        for segment in whisper_segments:
+            segments.append({'start': segment.get('start', 0), 'end': segment.get('end', 0),
+                             'text': segment.get('text', '').strip()})
+        timestamped_text = ""
+        for segment in segments:
+            timestamped_text += f"[{format_time(segment['start'])} - {format_time(segment['end'])}] {segment['text']}\n"
+        return segments, timestamped_text
+
+    def columnar():
+        store = SegmentStore.from_segments(whisper_segments)
+        return store.view(), store.render_timestamped()
+
+    report = {'segments': args.segments}
+    outputs = {}
+    for name, func in (('dict_based', dict_based), ('columnar', columnar)):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs[name] = func()
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        kept = func()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        report[name] = dict(percentiles(timings), mean=round(sum(timings) / len(timings), 4),
+                            retained_mb=round(retained / 1024 / 1024, 2))
+    report['identical'] = (outputs['dict_based'][1] == outputs['columnar'][1] and
+                           json.dumps(outputs['dict_based'][0]) ==
+                           json.dumps(outputs['columnar'][0], default=json_default))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def synthesize_speech_like(duration, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    生成确定性的类语音信号（带基频抖动的谐波音节 + 停顿 + 底噪）
+
+    没有真人录音时用它测量速度和内存；内容不是真实语音，因此没有参考文本
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    audio = (rng.standard_normal(total) * 0.003).astype(np.float32)
+    position = 0
+    while position < total:
+        # 一句话由若干约0.25秒的音节组成，句间停顿0.3~1秒
+        for _ in range(int(rng.integers(4, 16))):
+            length = int(sample_rate * rng.uniform(0.15, 0.35))
+            if position + length > total:
+                break
+            t = np.arange(length) / sample_rate
+            f0 = rng.uniform(110, 240) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 6) * t))
+            phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+            syllable = sum(np.sin(k * phase) / k for k in range(1, 8))
+            envelope = np.sin(np.pi * t / t[-1]) ** 2
+            audio[position:position + length] += (0.2 * envelope * syllable).astype(np.float32)
+            position += length
+        position += int(sample_rate * rng.uniform(0.3, 1.0))
+    return np.clip(audio, -1.0, 1.0)
+
+def tile_audio(audio, duration, gap=0.5, sample_rate=SAMPLE_RATE):
+    """把一段真人录音加间隔重复拼接到指定时长，返回(音频, 重复次数)"""
+    total = int(duration * sample_rate)
+    silence = np.zeros(int(gap * sample_rate), dtype=np.float32)
+    unit = np.concatenate([audio.astype(np.float32), silence])
+    repeats = max(1, total // len(unit))
+    return np.tile(unit, repeats)[:max(total, len(audio))], repeats
+
+def build_fixtures(fixture_dir, seed_path=None, seed_text=None, names=None):
+    """
+    生成（或复用已生成的）固定测试音频
+
+    Args:
+        fixture_dir (str): 音频存放目录，同名文件已存在时直接复用
+        seed_path (str): 真人录音，提供时按时长重复拼接，可计算字错率
+        seed_text (str): 录音对应的参考文本
+        names (list): 只生成其中几个时长，默认全部
+
+    Returns:
+        list: [{"name", "path", "duration", "reference"}]，没有录音时 reference 为None
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    seed_audio = decode_audio(seed_path) if seed_path else None
+    fixtures = []
+    for name, duration in FIXTURE_DURATIONS.items():
+        if names and name not in names:
+            continue
+        kind = 'speech' if seed_audio is not None else 'synthetic'
+        path = os.path.join(fixture_dir, f'{kind}-{name}.wav')
+        reference = None
+        if seed_audio is not None:
+            audio, repeats = tile_audio(seed_audio, duration)
+            reference = seed_text * repeats if seed_text else None
+        else:
+            audio = None
+        if not os.path.exists(path) or seed_audio is not None:
+            write_wav(path, audio if audio is not None else synthesize_speech_like(duration))
+        fixtures.append({'name': name, 'path': path, 'duration': duration, 'reference': reference})
+    return fixtures
+
+def normalize_text(text):
+    """计算字错率前去掉空白和标点"""
+    return ''.join(ch for ch in unicodedata.normalize('NFKC', text)
+                   if not ch.isspace() and not unicodedata.category(ch).startswith('P'))
+
+def character_error_rate(hypothesis, reference):
+    """
+    字错率 = 编辑距离 / 参考文本字数
+
+    按行计算编辑距离，行内的插入依赖用累积最小值向量化，20分钟的文本也能很快算完
+    """
+    hyp = np.array([ord(ch) for ch in normalize_text(hypothesis)], dtype=np.int64)
+    ref = np.array([ord(ch) for ch in normalize_text(reference)], dtype=np.int64)
+    if len(ref) == 0:
+        return None
+    if len(hyp) == 0:
+        return 1.0
+    index = np.arange(len(hyp) + 1)
+    previous = index.copy()
+    for i in range(1, len(ref) + 1):
+        # 替换/匹配与删除
+        current = np.empty_like(previous)
+        current[0] = i
+        current[1:] = np.minimum(previous[:-1] + (hyp != ref[i - 1]), previous[1:] + 1)
+        # 插入：current[j] = min(current[j], current[j-1] + 1)
+        current = np.minimum.accumulate(current - index) + index
+        previous = current
+    return round(float(previous[-1]) / len(ref), 4)
+
+def percentiles(values):
+    """耗时的p50/p90/p99"""
+    if not values:
+        return {}
+    data = np.array(values, dtype=np.float64)
+    return {f'p{q}': round(float(np.percentile(data, q)), 3) for q in (50, 90, 99)}
+
+def _fixture_report(fixture, runs, text, model_load):
+    """一个音频的测试结果：延迟分位数、实时率、峰值内存、阶段耗时和字错率"""
+    from transcriber_metrics import peak_rss_mb
+
+    latencies = [run['latency'] for run in runs]
+    return {
+        'name': fixture['name'],
+        'audio_seconds': fixture['duration'],
+        'model_load_seconds': round(model_load, 3),
+        'latency': dict(percentiles(latencies), mean=round(sum(latencies) / len(latencies), 3),
+                        runs=[round(value, 3) for value in latencies]),
+        # 实时率：每秒处理时间对应的音频秒数，越大越快
+        'realtime_factor': round(fixture['duration'] / float(np.median(latencies)), 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': runs[-1]['metrics']['stages'],
+        'cer': character_error_rate(text, fixture['reference']) if fixture['reference'] else None,
+        'output_chars': len(normalize_text(text))
+    }
+
+def _run_fixture(fixture, options, connection):
+    """在独立子进程中测试一个音频，保证峰值内存只属于这一项"""
+    # 识别参数通过环境变量传给 video_transcriber（子进程导入前设置，转换进程池同样继承）
+    if options['beam_size']:
+        os.environ['TRANSCRIBER_BEAM_SIZE'] = str(options['beam_size'])
+    if options.get('backend'):
+        os.environ['TRANSCRIBER_BACKEND'] = options['backend']
+    if options.get('chunk_overlap') is not None:
+        os.environ['TRANSCRIBER_CHUNK_OVERLAP'] = str(options['chunk_overlap'])
+    # 避免Whisper的输出和日志干扰结果
+    sys.stdout = sys.stderr
+    try:
+        from video_transcriber import VideoTranscriber
+
+        transcriber = VideoTranscriber(model_size=options['model'], workers=options['workers'])
+        transcriber.cache.enabled = False
+        load_start = time.perf_counter()
+        transcriber.load_model()
+        model_load = time.perf_counter() - load_start
+
+        runs = []
+        text = ''
+        try:
+            for _ in range(options['repeat']):
+                job = transcriber.new_job()
+                start = time.perf_counter()
+                result = transcriber.transcribe_audio_chunked(fixture['path'],
+                                                              chunk_duration=options['chunk_duration'],
+                                                              vad=options['vad'], job=job)
+                runs.append({'latency': time.perf_counter() - start,
+                             'metrics': job.metrics.summary()})
+                text = result.get('text', '')
+        finally:
+            transcriber.close()
+
+        report = _fixture_report(fixture, runs, text, model_load)
+        report['backend'] = transcriber.backend.name
+        report['first_chunk_seconds'] = runs[-1]['metrics'].get('first_chunk_seconds')
+        connection.send(report)
+    except Exception as e:
+        connection.send({'name': fixture['name'], 'error': str(e)})
+    finally:
+        connection.close()
+
+def _run_cloud_fixture(fixture, options, connection):
+    """在独立子进程中用一个云端识别后端（百度、OpenAI或本地进程）测试一个音频，需要配置对应的密钥"""
+    sys.stdout = sys.stderr
+    try:
+        import requests
+        from transcriber_backends import create_cloud_backends
+        from transcriber_metrics import JobMetrics
+
+        backend = create_cloud_backends(requests.Session(), [options['backend']])[0]
+        if not backend.available():
+            raise Exception(f"识别后端 {backend.name} 未配置密钥或不可用")
+        audio = decode_audio(fixture['path'])
+        runs = []
+        text = ''
+        for _ in range(options['repeat']):
+            metrics = JobMetrics()
+            start = time.perf_counter()
+            with metrics.stage('inference'):
+                result = backend.transcribe(audio, audio_path=fixture['path'])
+            runs.append({'latency': time.perf_counter() - start, 'metrics': metrics.summary()})
+            text = result.get('text', '')
+        report = _fixture_report(fixture, runs, text, 0.0)
+        report['backend'] = backend.name
+        connection.send(report)
+    except Exception as e:
+        connection.send({'name': fixture['name'], 'error': str(e)})
+    finally:
+        connection.close()
+
+def _run_isolated(target, fixture, options):
+    """用spawn方式的子进程运行一项测试（target为_run_fixture等），返回其报告"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=target, args=(fixture, options, sender))
+    process.start()
+    sender.close()
+    try:
+        report = receiver.recv()
+    except EOFError:
+        report = {'name': fixture['name'], 'error': f'子进程异常退出（退出码 {process.exitcode}）'}
+    process.join()
+    return report
+
+def bench_stress(args):
+    """
+    同一进程、同一模型同时运行多个任务（线程）：检查结果与逐个运行相同、
+    中途取消的任务停止并删除工作目录、没有残留的工作目录，并对比总耗时
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from video_transcriber import VideoTranscriber
+    from transcriber_input import MediaInput
+    from transcriber_job import WORKSPACE_PREFIX, workspace_root
+
+    fixtures = build_fixtures(args.fixture_dir, names=args.fixtures)
+    sources = [fixtures[i % len(fixtures)] for i in range(args.jobs)]
+    stdout = sys.stdout
+    # 避免Whisper的输出干扰结果
+    sys.stdout = sys.stderr
+
+    transcriber = VideoTranscriber(model_size=args.model, workers='1')
+    transcriber.cache.enabled = False
+    transcriber.load_model()
+    root = workspace_root()
+    prefix = f'{WORKSPACE_PREFIX}{os.getpid()}-'
+
+    def leftovers():
+        return sorted(entry for entry in os.listdir(root) if entry.startswith(prefix))
+
+    def run(fixture, job=None):
+        start = time.perf_counter()
+        result = transcriber.process_input(MediaInput.from_path(fixture['path']), job)
+        return result, time.perf_counter() - start
+
+    def text(result):
+        return result.get('data', {}).get('full_text') if result.get('success') else None
+
+    try:
+        start = time.perf_counter()
+        sequential = [run(fixture) for fixture in sources]
+        sequential_wall = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            overlapped = [future.result() for future in [pool.submit(run, fixture) for fixture in sources]]
+        overlapped_wall = time.perf_counter() - start
+        leftover_after_jobs = leftovers()
+
+        # 运行中途取消最长的任务
+        job = transcriber.new_job('cancel-test')
+        longest = max(fixtures, key=lambda fixture: fixture['duration'])
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(run, longest, job)
+            time.sleep(args.cancel_after)
+            workspace_during = job.workspace
+            job.cancel()
+            cancelled, cancel_latency = future.result()
+    finally:
+        transcriber.close()
+        sys.stdout = stdout
+
+    mismatched = [sources[i]['name'] for i, (first, second) in enumerate(zip(sequential, overlapped))
+                  if text(first[0]) != text(second[0])]
+    report = {
+        'jobs': args.jobs,
+        'model': args.model,
+        'fixtures': [fixture['name'] for fixture in sources],
+        'sequential_wall_seconds': round(sequential_wall, 3),
+        'overlapped_wall_seconds': round(overlapped_wall, 3),
+        'speedup': round(sequential_wall / overlapped_wall, 2) if overlapped_wall else None,
+        'overlapped_latency': percentiles([latency for _, latency in overlapped]),
+        'model_wait_seconds': round(sum(result.get('metrics', {}).get('stages', {}).get('model_wait', {})
+                                        .get('wall_seconds', 0) for result, _ in overlapped), 3),
+        'failed': sum(1 for result, _ in sequential + overlapped if not result.get('success')),
+        'mismatched': mismatched,
+        'leftover_workspaces': leftover_after_jobs + leftovers(),
+        'cancel': {
+            'fixture': longest['name'],
+            'cancelled': bool(cancelled.get('cancelled')),
+            'seconds_until_stopped': round(cancel_latency - args.cancel_after, 3),
+            'workspace_removed': workspace_during is None or not os.path.exists(workspace_during),
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report['failed'] or mismatched or report['leftover_workspaces'] or not report['cancel']['cancelled']:
+        sys.exit(1)
+
+def _attempts_until_done(path, timeout, max_attempts, env):
+    """像接口超时那样反复运行命令行版本并在超时后结束进程，返回 (尝试次数, 各次耗时, 最终结果)"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'video_transcriber.py')
+    durations = []
+    for attempt in range(1, max_attempts + 1):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, script, path], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True, env=env)
+        try:
+            output, _ = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            durations.append(round(time.perf_counter() - start, 3))
+            continue
+        durations.append(round(time.perf_counter() - start, 3))
+        lines = [line for line in output.splitlines() if line.startswith('{')]
+        return attempt, durations, json.loads(lines[-1]) if lines else None
+    return None, durations, None
+
+def bench_resume(args):
+    """
+    模拟接口超时：每次运行超过timeout秒就结束进程并重新提交，
+    对比开启分段日志（断点续传）与关闭时完成一个长视频所需的尝试次数
+    """
+    fixtures = build_fixtures(args.fixture_dir, names=[args.fixture])
+    fixture = fixtures[0]
+    journal_dir = tempfile.mkdtemp()
+    base_env = dict(os.environ, TRANSCRIPT_CACHE='false', WHISPER_MODEL_SIZE=args.model,
+                    TRANSCRIBER_JOURNAL_DB=os.path.join(journal_dir, 'journal.sqlite'))
+    report = {'fixture': fixture['name'], 'audio_seconds': fixture['duration'], 'timeout': args.timeout,
+              'max_attempts': args.max_attempts}
+    texts = {}
+    try:
+        for name, enabled in (('journal', 'true'), ('no_journal', 'false')):
+            print(f"{name}: 每{args.timeout}秒结束一次进程", file=sys.stderr)
+            attempts, durations, result = _attempts_until_done(
+                fixture['path'], args.timeout, args.max_attempts, dict(base_env, TRANSCRIBER_JOURNAL=enabled))
+            report[name] = {'attempts': attempts, 'durations': durations,
+                            'total_seconds': round(sum(durations), 3),
+                            'resumed_chunks': ((result or {}).get('metrics') or {}).get('resumed_chunks')}
+            texts[name] = ((result or {}).get('data') or {}).get('full_text')
+
+        print("对照：不限时运行一次", file=sys.stderr)
+        _, durations, result = _attempts_until_done(fixture['path'], None, 1,
+                                                    dict(base_env, TRANSCRIBER_JOURNAL='false'))
+        report['uninterrupted_seconds'] = durations[0]
+        reference = ((result or {}).get('data') or {}).get('full_text')
+        report['journal']['matches_uninterrupted'] = texts['journal'] == reference if texts['journal'] else None
+    finally:
+        shutil.rmtree(journal_dir, ignore_errors=True)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def bench_batch(args):
+    """
+    批量推理的吞吐量：把固定音频切成30秒窗口一次全部提交，按不同批大小各识别一遍，
+    输出每秒处理的音频秒数和单独的编码器吞吐量，并检查各批大小的结果与批大小1相同
+    """
+    import torch
+    from transcriber_models import ModelRegistry
+    from transcriber_batching import BatchedInference
+    from transcriber_policy import decode_options
+    from transcriber_job import JobContext
+
+    fixture = build_fixtures(args.fixture_dir, names=[args.fixture])[0]
+    audio = decode_audio(fixture['path'])
+    window = 30 * SAMPLE_RATE
+    windows = [audio[start:start + window] for start in range(0, len(audio), window)][:args.windows]
+    audio_seconds = sum(len(piece) for piece in windows) / SAMPLE_RATE
+
+    registry = ModelRegistry(default_size=args.model, preload=[args.model], quantize=args.quantize or None)
+    model = registry.get(args.model)
+    options = decode_options('fast')
+    report = {'model': args.model, 'quantized': registry.quantize, 'threads': torch.get_num_threads(),
+              'fixture': fixture['name'], 'windows': len(windows), 'audio_seconds': audio_seconds, 'results': []}
+    baseline = None
+    for batch_size in args.batch_sizes:
+        print(f"批大小 {batch_size}", file=sys.stderr)
+        # 编码器单独计时：同样的窗口数按批大小分批前向
+        mel = torch.zeros(batch_size, model.dims.n_mels, 3000)
+        with torch.no_grad():
+            model.encoder(mel)
+            start = time.perf_counter()
+            for _ in range(0, len(windows), batch_size):
+                model.encoder(mel)
+            encoder_seconds = time.perf_counter() - start
+
+        batcher = BatchedInference(registry, max_batch=batch_size, wait_ms=0)
+        job = JobContext(model_size=args.model, decode_options=options)
+        start = time.perf_counter()
+        results = [future.result() for future in [batcher.submit(job, piece) for piece in windows]]
+        wall = time.perf_counter() - start
+        texts = [result['text'] for result in results]
+        baseline = baseline or {'wall': wall, 'encoder': encoder_seconds, 'texts': texts}
+        report['results'].append({
+            'batch_size': batch_size,
+            'wall_seconds': round(wall, 3),
+            # 每秒处理的音频秒数，越大越快
+            'audio_seconds_per_second': round(audio_seconds / wall, 2),
+            'speedup': round(baseline['wall'] / wall, 2),
+            'encoder_windows_per_second': round(len(windows) / encoder_seconds, 2),
+            'encoder_speedup': round(baseline['encoder'] / encoder_seconds, 2),
+            'batches': dict(sorted(batcher.batch_sizes.items())),
+            'matches_batch_size_1': sum(1 for text, expected in zip(texts, baseline['texts']) if text == expected),
+        })
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def git_revision():
+    """当前代码的提交号，便于跨提交对比"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def bench_suite(args):
+    """离线基准测试：固定音频，不经过下载，输出延迟分位数、实时率、峰值内存和字错率"""
+    seed_text = None
+    if args.seed_text:
+        with open(args.seed_text, 'r', encoding='utf-8') as f:
+            seed_text = f.read().strip()
+    fixtures = build_fixtures(args.fixture_dir, args.seed, seed_text, args.fixtures)
+
+    options = {
+        'model': args.model,
+        'workers': args.workers,
+        'chunk_duration': args.chunk_duration,
+        'beam_size': args.beam_size,
+        'vad': args.vad,
+        'repeat': args.repeat
+    }
+    results = []
+    for fixture in fixtures:
+        print(f"测试 {fixture['name']} ({fixture['path']})", file=sys.stderr)
+        results.append(_run_isolated(_run_fixture, fixture, options))
+
+    output = {
+        'revision': git_revision(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'fixture_kind': 'speech' if args.seed else 'synthetic',
+        'options': options,
+        'results': results
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+    print(text)
+
+def bench_backends(args):
+    """
+    在同一组固定音频上对比识别后端：本地引擎（whisper、faster-whisper）走完整的分段识别流程，
+    云端后端（baidu、openai、local）直接识别整段音频；每项一个子进程，输出实时率、峰值内存和字错率
+    """
+    from transcriber_backends import LOCAL_BACKENDS
+
+    seed_text = None
+    if args.seed_text:
+        with open(args.seed_text, 'r', encoding='utf-8') as f:
+            seed_text = f.read().strip()
+    fixtures = build_fixtures(args.fixture_dir, args.seed, seed_text, args.fixtures)
+
+    results = {}
+    for backend in args.backends:
+        options = {
+            'backend': backend,
+            'model': args.model,
+            'workers': args.workers,
+            'chunk_duration': args.chunk_duration,
+            'beam_size': None,
+            'vad': None,
+            'repeat': args.repeat
+        }
+        target = _run_fixture if backend in LOCAL_BACKENDS else _run_cloud_fixture
+        results[backend] = []
+        for fixture in fixtures:
+            print(f"{backend}: 测试 {fixture['name']}", file=sys.stderr)
+            report = _run_isolated(target, fixture, options)
+            if backend in LOCAL_BACKENDS and report.get('backend') not in (None, backend):
+                # 依赖未安装时本地版回退到openai-whisper，这一项不作数
+                report = {'name': fixture['name'], 'error': f"{backend}不可用，实际使用了{report['backend']}"}
+            results[backend].append(report)
+
+    summary = {}
+    for backend, reports in results.items():
+        ok = [report for report in reports if 'error' not in report]
+        cers = [report['cer'] for report in ok if report.get('cer') is not None]
+        summary[backend] = {
+            'fixtures': len(ok),
+            'realtime_factor': {report['name']: report['realtime_factor'] for report in ok},
+            'peak_rss_mb': max((report['peak_rss_mb'] for report in ok), default=None),
+            'mean_cer': round(sum(cers) / len(cers), 4) if cers else None,
+            'errors': {report['name']: report['error'] for report in reports if 'error' in report},
+        }
+    output = {
+        'revision': git_revision(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'fixture_kind': 'speech' if args.seed else 'synthetic',
+        'model': args.model,
+        'summary': summary,
+        'results': results
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+    print(text)
+
+def bench_chunking(args):
+    """
+    分段长度与重叠的取舍：同一组固定音频按不同的 窗口:重叠（秒）分段识别，
+    输出实时率、首段结果耗时、字错率，以及输出字数相对第一种配置的比例（重叠部分去重不干净时偏大）
+    """
+    seed_text = None
+    if args.seed_text:
+        with open(args.seed_text, 'r', encoding='utf-8') as f:
+            seed_text = f.read().strip()
+    fixtures = build_fixtures(args.fixture_dir, args.seed, seed_text, args.fixtures)
+
+    results = {}
+    for config in args.windows:
+        window, _, overlap = config.partition(':')
+        options = {
+            'model': args.model,
+            'workers': args.workers,
+            'chunk_duration': float(window),
+            'chunk_overlap': float(overlap or 0),
+            'beam_size': None,
+            'vad': args.vad,
+            'repeat': args.repeat
+        }
+        results[config] = []
+        for fixture in fixtures:
+            print(f"窗口{window}秒、重叠{overlap or 0}秒: 测试 {fixture['name']}", file=sys.stderr)
+            results[config].append(_run_isolated(_run_fixture, fixture, options))
+
+    baseline = {report['name']: report['output_chars'] for report in results[args.windows[0]] if 'error' not in report}
+    summary = {}
+    for config, reports in results.items():
+        ok = [report for report in reports if 'error' not in report]
+        cers = [report['cer'] for report in ok if report.get('cer') is not None]
+        summary[config] = {
+            'realtime_factor': {report['name']: report['realtime_factor'] for report in ok},
+            'first_chunk_seconds': {report['name']: report['first_chunk_seconds'] for report in ok},
+            'mean_cer': round(sum(cers) / len(cers), 4) if cers else None,
+            'output_chars_ratio': {report['name']: round(report['output_chars'] / baseline[report['name']], 3)
+                                   for report in ok if baseline.get(report['name'])},
+            'errors': {report['name']: report['error'] for report in reports if 'error' in report},
+        }
+    output = {
+        'revision': git_revision(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cpu_count': os.cpu_count(),
+        'fixture_kind': 'speech' if args.seed else 'synthetic',
+        'model': args.model,
+        'workers': args.workers,
+        'summary': summary,
+        'results': results
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+    print(text)
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='视频转文字性能测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pipeline = subparsers.add_parser('pipeline', help='对比顺序处理与流水线处理的端到端耗时')
+    pipeline.add_argument('--input', required=True, help='测试音频文件（建议wav/mp3，本地服务不支持分段请求）')
+    pipeline.add_argument('--rate-kbps', type=int, default=0, help='模拟下载带宽（kbps），0为不限速')
+    pipeline.add_argument('--repeat', type=int, default=3)
+    pipeline.add_argument('--model', default='tiny')
+    pipeline.add_argument('--workers', default='1')
+    pipeline.add_argument('--chunk-duration', type=int, default=60)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    download = subparsers.add_parser('download', help='通过本地HTTP服务测试单次yt-dlp下载和解码')
+    download.add_argument('--input', required=True, help='测试音视频文件')
+    download.add_argument('--rate-kbps', type=int, default=0, help='模拟下载带宽（kbps），0为不限速')
+    download.add_argument('--repeat', type=int, default=3)
+    download.set_defaults(func=bench_download)
+
+    opencc = subparsers.add_parser('opencc', help='对比逐段与批量的繁简转换耗时')
+    opencc.add_argument('--segments', type=int, default=5000)
+    opencc.add_argument('--repeat', type=int, default=5)
+    opencc.set_defaults(func=bench_opencc)
+
+    format_parser = subparsers.add_parser('format', help='对比字典列表与按列存储的分段格式化')
+    format_parser.add_argument('--segments', type=int, default=50000)
+    format_parser.add_argument('--repeat', type=int, default=5)
+    format_parser.set_defaults(func=bench_format)
+
+    cloud = subparsers.add_parser('cloud', help='用本地模拟百度接口测试云端分窗口并发识别')
+    cloud.add_argument('--duration', type=int, default=600, help='合成音频时长（秒）')
+    cloud.add_argument('--latency', type=float, default=1.0, help='模拟接口每个窗口的响应时间（秒）')
+    cloud.add_argument('--concurrency', type=int, default=4)
+    cloud.add_argument('--repeat', type=int, default=2)
+    cloud.set_defaults(func=bench_cloud)
+
+    hedge = subparsers.add_parser('hedge', help='用本地模拟接口对比对冲调度与顺序回退的延迟')
+    hedge.add_argument('--duration', type=int, default=120, help='合成音频时长（秒）')
+    hedge.add_argument('--fast-latency', type=float, default=0.5, help='正常情况下每个请求的响应时间（秒）')
+    hedge.add_argument('--slow-latency', type=float, default=6.0, help='百度变慢时每个请求的响应时间（秒）')
+    hedge.set_defaults(func=bench_hedge)
+
+    upload = subparsers.add_parser('upload', help='对比原实现与流式上传的峰值内存')
+    upload.add_argument('--duration', type=int, default=600, help='合成音频时长（秒）')
+    upload.set_defaults(func=bench_upload)
+
+    queue = subparsers.add_parser('queue', help='模拟多用户同时提交时不同调度方式的完成时间')
+    queue.add_argument('--users', type=int, default=10)
+    queue.add_argument('--slots', type=int, default=2, help='同时运行的任务数')
+    queue.add_argument('--speed', type=float, default=0.3, help='每秒音频的识别耗时（秒）')
+    queue.add_argument('--aging', type=float, default=1.0)
+    queue.add_argument('--timeout', type=float, default=600, help='接口超时时间（秒），统计超时任务数')
+    queue.add_argument('--seed', type=int, default=0)
+    queue.set_defaults(func=bench_queue)
+
+    stress = subparsers.add_parser('stress', help='同一进程同时运行多个任务，检查结果一致、取消和工作目录清理')
+    stress.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'))
+    stress.add_argument('--fixtures', nargs='*', choices=list(FIXTURE_DURATIONS), default=['10s', '2min'])
+    stress.add_argument('--jobs', type=int, default=4, help='同时运行的任务数')
+    stress.add_argument('--model', default='tiny')
+    stress.add_argument('--cancel-after', type=float, default=3.0, help='取消测试中任务开始多少秒后取消')
+    stress.set_defaults(func=bench_stress)
+
+    resume = subparsers.add_parser('resume', help='模拟超时后结束进程再重试，对比断点续传前后完成所需的尝试次数')
+    resume.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'))
+    resume.add_argument('--fixture', choices=list(FIXTURE_DURATIONS), default='20min')
+    resume.add_argument('--timeout', type=float, default=60, help='每次运行多少秒后结束进程')
+    resume.add_argument('--max-attempts', type=int, default=8)
+    resume.add_argument('--model', default='tiny')
+    resume.set_defaults(func=bench_resume)
+
+    batch = subparsers.add_parser('batch', help='不同批大小下批量推理的吞吐量（仅需CPU）')
+    batch.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'))
+    batch.add_argument('--fixture', choices=list(FIXTURE_DURATIONS), default='20min')
+    batch.add_argument('--windows', type=int, default=32, help='参与测试的30秒窗口数')
+    batch.add_argument('--batch-sizes', nargs='*', type=int, default=[1, 2, 4, 8, 16])
+    batch.add_argument('--model', default='tiny')
+    batch.add_argument('--quantize', action='store_true', help='使用int8动态量化的模型')
+    batch.set_defaults(func=bench_batch)
+
+    suite = subparsers.add_parser('suite', help='固定音频的离线基准测试（不联网，仅需CPU）')
+    suite.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'),
+                       help='测试音频存放目录，已生成的合成音频会复用')
+    suite.add_argument('--fixtures', nargs='*', choices=list(FIXTURE_DURATIONS), help='只测试其中几个时长')
+    suite.add_argument('--seed', help='真人录音，按时长重复拼接成测试音频；不提供时使用合成信号')
+    suite.add_argument('--seed-text', help='录音对应的参考文本文件，用于计算字错率')
+    suite.add_argument('--output', help='结果JSON保存路径')
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--model', default='tiny')
+    suite.add_argument('--workers', default='1')
+    suite.add_argument('--chunk-duration', type=int, default=60)
+    suite.add_argument('--beam-size', type=int, default=None)
+    suite.add_argument('--vad', default=None, type=lambda value: value.lower() not in ('0', 'false', 'no'),
+                       help='true/false，默认使用TRANSCRIBER_VAD')
+    suite.set_defaults(func=bench_suite)
+
+    backends = subparsers.add_parser('backends', help='在同一组固定音频上对比识别后端的速度、内存和字错率')
+    backends.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'))
+    backends.add_argument('--fixtures', nargs='*', choices=list(FIXTURE_DURATIONS), default=['10s', '2min'])
+    backends.add_argument('--backends', nargs='*', default=['whisper', 'faster-whisper'],
+                          choices=['whisper', 'faster-whisper', 'baidu', 'openai', 'local'])
+    backends.add_argument('--seed', help='真人录音，按时长重复拼接成测试音频；不提供时使用合成信号')
+    backends.add_argument('--seed-text', help='录音对应的参考文本文件，用于计算字错率')
+    backends.add_argument('--output', help='结果JSON保存路径')
+    backends.add_argument('--repeat', type=int, default=2)
+    backends.add_argument('--model', default='tiny')
+    backends.add_argument('--workers', default='1')
+    backends.add_argument('--chunk-duration', type=int, default=60)
+    backends.set_defaults(func=bench_backends)
+
+    chunking = subparsers.add_parser('chunking', help='对比不同分段长度和重叠时长的速度、首段耗时和字错率')
+    chunking.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-fixtures'))
+    chunking.add_argument('--fixtures', nargs='*', choices=list(FIXTURE_DURATIONS), default=['2min'])
+    chunking.add_argument('--windows', nargs='*', default=['60:0', '30:0', '15:0', '15:2', '10:2'],
+                          help='窗口:重叠（秒），第一项作为输出字数的对比基准')
+    chunking.add_argument('--seed', help='真人录音，按时长重复拼接成测试音频；不提供时使用合成信号')
+    chunking.add_argument('--seed-text', help='录音对应的参考文本文件，用于计算字错率')
+    chunking.add_argument('--output', help='结果JSON保存路径')
+    chunking.add_argument('--repeat', type=int, default=2)
+    chunking.add_argument('--model', default='tiny')
+    chunking.add_argument('--workers', default='1')
+    chunking.add_argument('--vad', default=None, type=lambda value: value.lower() not in ('0', 'false', 'no'),
+                          help='true/false，默认使用TRANSCRIBER_VAD')
+    chunking.set_defaults(func=bench_chunking)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写结果缓存
+按规范化后的视频链接和解码音频的哈希缓存格式化后的文字稿，本地版和云端版共用。
+每个文字稿记录生成它的模型和解码档位：本地版按截止时间本可以用更好的模型/档位时不使用较差的缓存
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from transcriber_segments import json_default
+from transcriber_models import MODEL_SIZES
+from transcriber_policy import DECODE_TIERS
+
+# 已知网站分享链接中与视频内容无关的跟踪参数（按域名匹配，包括子域名）。
+# type、source、from、ts 等通用名称在其他网站上可能决定内容或起始时间，其他网站只去掉 utm_*
+_XIAOHONGSHU_PARAMS = {
+    'xsec_token', 'xsec_source', 'xhsshare', 'share_from_user_hidden', 'share_id', 'shareredid',
+    'apptime', 'appuid', 'author_share', 'app_platform', 'app_version', 'type', 'source',
+}
+_BILIBILI_PARAMS = {
+    'spm_id_from', 'vd_source', 'from_spmid', 'from', 'seid', 'is_story_h5', 'mid', 'plat_id',
+    'timestamp', 'unique_k', 'bbid', 'ts', 'buvid', 'up_id', 'share_source', 'share_medium',
+    'share_plat', 'share_session_id', 'share_tag', 'share_times', 'share_from',
+}
+_DOUYIN_PARAMS = {
+    'previous_page', 'region', 'mid', 'u_code', 'did', 'iid', 'with_sec_did', 'titletype',
+    'share_sign', 'share_version', 'ts', 'from_aid', 'from_ssr', 'from', 'timestamp',
+}
+TRACKING_PARAMS = {
+    'xiaohongshu.com': _XIAOHONGSHU_PARAMS,
+    'xhslink.com': _XIAOHONGSHU_PARAMS,
+    'bilibili.com': _BILIBILI_PARAMS,
+    'b23.tv': _BILIBILI_PARAMS,
+    'douyin.com': _DOUYIN_PARAMS,
+    'iesdouyin.com': _DOUYIN_PARAMS,
+}
+
+def _tracking_params(host):
+    """链接所在网站的跟踪参数，未知网站为空"""
+    for domain, params in TRACKING_PARAMS.items():
+        if host == domain or host.endswith('.' + domain):
+            return params
+    return ()
+
+def canonicalize_url(url):
+    """
+    规范化视频链接：统一协议和域名大小写，去掉 utm_* 和已知网站的跟踪参数、锚点和末尾斜杠
+
+    Args:
+        url (str): 原始链接
+
+    Returns:
+        str: 规范化后的链接
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    tracking = _tracking_params(host.split(':')[0])
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in tracking and not key.lower().startswith('utm_'))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+def audio_fingerprint(audio):
+    """计算解码后PCM音频的SHA-256，转载的同一视频解码后得到相同的键"""
+    digest = hashlib.sha256()
+    digest.update(memoryview(audio).cast('B'))
+    return digest.hexdigest()
+
+# 解码档位从快到好的顺序
+TIER_ORDER = [name for name, _, _ in reversed(DECODE_TIERS)]
+
+def decoder_satisfies(cached, wanted):
+    """
+    缓存的文字稿是否满足本次任务的要求：模型不比要求的小、解码档位不比要求的快
+
+    Args:
+        cached (dict): 缓存条目记录的识别参数 {"model", "tier", "key"}，旧条目和云端识别的条目没有模型/档位
+        wanted (dict): 本次任务按策略会使用的识别参数，为空时不检查
+
+    Returns:
+        bool: 是否可以直接使用缓存
+    """
+    if wanted is None:
+        return True
+    if not cached or cached.get('model') not in MODEL_SIZES or cached.get('tier') not in TIER_ORDER:
+        return False
+    if cached.get('key') and cached.get('key') == wanted.get('key'):
+        return True
+    return (MODEL_SIZES.index(cached['model']) >= MODEL_SIZES.index(wanted['model'])
+            and TIER_ORDER.index(cached['tier']) >= TIER_ORDER.index(wanted['tier']))
+
+class TranscriptCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        初始化转写缓存
+
+        Args:
+            cache_dir (str): 缓存目录，默认读取TRANSCRIPT_CACHE_DIR，否则为 temp/transcript-cache
+            max_bytes (int): 缓存总大小上限（字节），超出后按最近最少使用淘汰，默认读取TRANSCRIPT_CACHE_MAX_MB
+        """
+        default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'transcript-cache')
+        self.cache_dir = cache_dir or os.getenv('TRANSCRIPT_CACHE_DIR', default_dir)
+        if max_bytes is None:
+            max_bytes = int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', '200')) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.enabled = os.getenv('TRANSCRIPT_CACHE', 'true').lower() not in ('0', 'false', 'no')
+        self.stats = {'url_hits': 0, 'url_misses': 0, 'audio_hits': 0, 'audio_misses': 0}
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, kind, key):
+        name = hashlib.sha256(f'{kind}:{key}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{kind}-{name}.json')
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 命中时更新修改时间，作为LRU的访问时间
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def _write(self, path, entry):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, default=json_default)
+        os.replace(tmp_path, path)
+
+    def get_by_url(self, url, accept=None):
+        """
+        下载前按链接查找缓存，命中返回格式化后的文字稿，否则返回None
+
+        Args:
+            url (str): 视频链接
+            accept (callable): accept(识别参数, 文字稿) 返回缓存是否可用（见decoder_satisfies），为空时不检查
+        """
+        if not self.enabled:
+            return None
+        entry = self._read(self._path('url', canonicalize_url(url)))
+        if entry and 'audio_hash' in entry:
+            # 链接条目只记录音频哈希，文字稿存放在音频条目中
+            data = self.get_by_audio_hash(entry['audio_hash'], count=False, accept=accept)
+            if data is not None:
+                self._count('url_hits')
+                return data
+        self._count('url_misses')
+        return None
+
+    def get_by_audio_hash(self, audio_hash, count=True, accept=None):
+        """识别前按音频哈希查找缓存，命中返回格式化后的文字稿，否则返回None（accept同get_by_url）"""
+        if not self.enabled:
+            return None
+        entry = self._read(self._path('audio', audio_hash))
+        if entry and accept is not None and not accept(entry.get('decoder'), entry.get('data') or {}):
+            # 识别参数低于本次任务的要求，按未命中处理，重新识别后覆盖
+            entry = None
+        if count:
+            self._count('audio_hits' if entry else 'audio_misses')
+        return entry.get('data') if entry else None
+
+    def put(self, url, audio_hash, data, decoder=None):
+        """
+        写入缓存
+
+        Args:
+            url (str): 视频链接，可为空
+            audio_hash (str): 音频哈希，可为空（如云端识别未解码音频时）
+            data (dict): format_transcript 的输出
+            decoder (dict): 生成文字稿的识别参数 {"model", "tier", "key"}，云端识别时只有 {"backend"}
+        """
+        if not self.enabled or not (url or audio_hash):
+            return
+        try:
+            key = audio_hash or f'url:{canonicalize_url(url)}'
+            self._write(self._path('audio', key), {'data': data, 'decoder': decoder, 'created_at': time.time()})
+            if url:
+                self.link(url, key)
+            self.evict()
+        except OSError as e:
+            print(f"写入转写缓存失败: {e}", file=sys.stderr)
+
+    def link(self, url, audio_hash):
+        """让链接指向已缓存的音频条目（按音频内容命中转载的视频时），不改动文字稿和识别参数"""
+        if not self.enabled or not url:
+            return
+        try:
+            self._write(self._path('url', canonicalize_url(url)), {'audio_hash': audio_hash, 'url': url})
+        except OSError as e:
+            print(f"写入转写缓存失败: {e}", file=sys.stderr)
+
+    def evict(self):
+        """缓存超过大小上限时，按访问时间从旧到新删除条目"""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        """返回命中/未命中计数"""
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频音频下载
+yt-dlp只解析一次页面：同一次 extract_info 调用完成格式选择和下载，直接返回下载文件的
+准确路径和视频信息；不再使用WAV后处理，下载的原始音频由ffmpeg一次解码为PCM。
+任务队列入队时探测得到的视频信息（probe_media的 'info'）随任务交给工作进程，下载时直接使用，
+不再重复解析页面。本地版和云端版共用
+"""
+
+import os
+import sys
+import yt_dlp
+
+# 只要最低质量的音频流，识别效果足够且数据量最小
+AUDIO_FORMAT = 'worstaudio/worst'
+
+def _ydl_options(output_dir=None, socket_timeout=30):
+    options = {
+        'format': AUDIO_FORMAT,
+        'quiet': True,
+        'no_warnings': True,
+        'no_check_certificate': True,  # 跳过SSL验证加速
+        'socket_timeout': socket_timeout,
+        'noplaylist': True,
+    }
+    if output_dir:
+        options['outtmpl'] = os.path.join(output_dir, 'audio.%(ext)s')
+    return options
+
+# 下载用不到、体积又大的字段，随任务传递视频信息时去掉
+UNUSED_INFO_KEYS = ('automatic_captions', 'subtitles', 'thumbnails', 'heatmap')
+
+def _first_entry(info):
+    """播放列表等情况下取第一个条目"""
+    if info and info.get('entries'):
+        return next(entry for entry in info['entries'] if entry)
+    return info
+
+def _media_info(info):
+    """提取结果中需要的视频信息"""
+    return {
+        'title': info.get('title') or '未知标题',
+        'duration': info.get('duration') or 0,
+        'ext': info.get('ext'),
+        'format_id': info.get('format_id'),
+        'filesize': info.get('filesize') or info.get('filesize_approx'),
+        'extractor': info.get('extractor_key') or info.get('extractor'),
+        'webpage_url': info.get('webpage_url'),
+    }
+
+def download_audio(url, output_dir, socket_timeout=30, info=None):
+    """
+    解析并下载音频流（一次yt-dlp调用）
+
+    Args:
+        url (str): 视频链接，也可以是音视频文件的直链
+        output_dir (str): 下载目录
+        socket_timeout (int): 网络超时（秒）
+        info (dict): 已解析的视频信息（probe_media的 'info'），给出时不再解析页面；
+            其中的媒体直链过期等原因下载失败时重新解析
+
+    Returns:
+        dict: 视频信息（title、duration、ext等），'path' 为下载文件的准确路径
+    """
+    with yt_dlp.YoutubeDL(_ydl_options(output_dir, socket_timeout)) as ydl:
+        result = None
+        if info is not None:
+            try:
+                result = ydl.process_ie_result(dict(info), download=True)
+            except yt_dlp.utils.DownloadError as e:
+                print(f"预先解析的视频信息已失效，重新解析: {e}", file=sys.stderr)
+        if result is None:
+            result = ydl.extract_info(url, download=True)
+        info = _first_entry(result)
+        if info is None:
+            raise Exception("未获取到视频信息")
+
+        downloads = info.get('requested_downloads') or []
+        path = downloads[0].get('filepath') if downloads else None
+        if not path:
+            path = ydl.prepare_filename(info)
+
+    if not os.path.exists(path):
+        raise Exception("未找到下载的音频文件")
+
+    media = _media_info(info)
+    media['path'] = path
+    return media
+
+def probe_media(url, socket_timeout=10):
+    """
+    只解析视频信息（标题、时长等），不下载，供任务队列按时长排序
+
+    Returns:
+        dict: 视频信息，同download_audio（没有 'path'）；'info' 为可JSON序列化的完整解析结果，
+            传给 download_audio / resolve_audio_stream 后不再重复解析页面
+    """
+    with yt_dlp.YoutubeDL(_ydl_options(socket_timeout=socket_timeout)) as ydl:
+        info = _first_entry(ydl.extract_info(url, download=False))
+        if not info:
+            raise Exception("未获取到视频信息")
+        raw = {key: value for key, value in ydl.sanitize_info(info).items() if key not in UNUSED_INFO_KEYS}
+    media = _media_info(info)
+    media['info'] = raw
+    return media
+
+def resolve_audio_stream(url, socket_timeout=30, info=None):
+    """
+    只解析不下载，返回可供ffmpeg直接读取的音频直链（边下载边解码）
+
+    Args:
+        url (str): 视频链接
+        socket_timeout (int): 网络超时（秒）
+        info (dict): 已解析的视频信息（probe_media的 'info'，格式选择相同），给出时直接使用其中的直链
+
+    Returns:
+        dict: 视频信息，'url' 为媒体直链，'headers' 为访问直链需要的HTTP请求头
+    """
+    if info is None or not info.get('url'):
+        with yt_dlp.YoutubeDL(_ydl_options(socket_timeout=socket_timeout)) as ydl:
+            info = _first_entry(ydl.extract_info(url, download=False))
+
+    media_url = info.get('url') if info else None
+    if not media_url:
+        raise Exception("未找到可直接读取的音频流")
+
+    media = _media_info(info)
+    media['url'] = media_url
+    media['headers'] = info.get('http_headers') or {}
+    return media
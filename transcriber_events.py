@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写进度事件
+NDJSON模式下每个事件是stdout上的一行JSON（阶段变化、分段文字、进度百分比、最终结果）；
+文本模式下保持原来的行为，只向stderr打印中文提示
+"""
+
+import sys
+import json
+import threading
+
+from transcriber_segments import json_default
+
+class EventReporter:
+    def __init__(self, stream=None, ndjson=False, job_id=None, lock=None):
+        """
+        初始化事件输出
+
+        Args:
+            stream: NDJSON事件输出流，默认stdout
+            ndjson (bool): 是否输出结构化事件
+            job_id (str): 常驻进程模式下的任务ID，会附加到每个事件上
+            lock (threading.Lock): 写输出流时持有的锁，多个任务共用一个输出流时传入同一个锁，避免行交错
+        """
+        self.stream = stream or sys.stdout
+        self.ndjson = ndjson
+        self.job_id = job_id
+        self._lock = lock or threading.Lock()
+
+    def emit(self, event, **fields):
+        """输出一个事件（仅NDJSON模式）"""
+        if not self.ndjson:
+            return
+        message = {'event': event}
+        if self.job_id is not None:
+            message['id'] = self.job_id
+        message.update(fields)
+        line = json.dumps(message, ensure_ascii=False, default=json_default)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def stage(self, stage, message):
+        """阶段变化，如 download / decode / transcribe / format"""
+        if self.ndjson:
+            self.emit('stage', stage=stage, message=message)
+        else:
+            print(message, file=sys.stderr)
+
+    def progress(self, done, total, elapsed):
+        """分段识别进度"""
+        percent = (done / total) * 100 if total > 0 else 100.0
+        if self.ndjson:
+            self.emit('progress', percent=round(percent, 1), done=done, total=total, elapsed=round(elapsed, 1))
+        else:
+            print(f"分段处理进度: {percent:.1f}%, 已用时: {elapsed:.1f}秒", file=sys.stderr)
+
+    def segments(self, segments):
+        """新识别出的分段文字（时间戳为原音频中的秒数）"""
+        if self.ndjson and segments:
+            self.emit('segments', segments=[
+                {'start': segment.get('start', 0), 'end': segment.get('end', 0),
+                 'text': segment.get('text', '').strip()}
+                for segment in segments
+            ])
+
+    def result(self, result):
+        """最终结果，字段与单次输出的JSON相同，另加 event: result"""
+        if self.ndjson:
+            self.emit('result', **result)
+        else:
+            print(json.dumps(result, ensure_ascii=False, default=json_default))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+识别后端的对冲调度
+按优先级依次启动识别后端（百度、OpenAI、本地Whisper）：当前后端失败时立即启动下一个，
+超过它历史延迟的分位数仍未完成时也提前启动下一个，取最先成功的结果并取消其余后端。
+每个后端的延迟直方图和错误次数保存在文件中（每个任务是一个新进程），用于确定提前启动的时间
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import fcntl
+import bisect
+import threading
+
+# 延迟直方图的桶上限：每分钟音频所需的识别秒数（不足一分钟按一分钟计）
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 3, 5, 8, 12, 18, 27, 40, 60, 90, 135, 200, 300, 450, 600]
+
+# 记录最近多少次结果，用于计算近期错误率
+RECENT_OUTCOMES = 20
+
+class HedgeCancelled(Exception):
+    """后端因其他后端已成功而被取消"""
+
+def _audio_minutes(audio_seconds):
+    return max(1.0, (audio_seconds or 0) / 60.0)
+
+def _new_backend_stats():
+    return {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'successes': 0, 'errors': 0,
+            'cancelled': 0, 'wins': 0, 'recent': []}
+
+class LatencyStats:
+    def __init__(self, path=None):
+        """
+        初始化各后端的延迟统计
+
+        Args:
+            path (str): 统计文件路径，默认读取TRANSCRIBER_HEDGE_STATS，否则为 temp/hedge-stats.json；为空字符串时只在内存中统计
+        """
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'hedge-stats.json')
+        self.path = path if path is not None else os.getenv('TRANSCRIBER_HEDGE_STATS', default_path)
+        self.backends = self._load()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        backends = {}
+        for name, stats in data.get('backends', {}).items():
+            merged = _new_backend_stats()
+            merged.update(stats)
+            if len(merged['buckets']) != len(LATENCY_BUCKETS) + 1:
+                merged['buckets'] = _new_backend_stats()['buckets']
+            backends[name] = merged
+        return backends
+
+    @staticmethod
+    def _apply(backends, name, outcome, value):
+        stats = backends.setdefault(name, _new_backend_stats())
+        if outcome in ('success', 'cancelled'):
+            # 被取消的后端只知道延迟的下限，仍计入直方图，避免分位数被低估
+            stats['buckets'][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        if outcome == 'win':
+            stats['wins'] += 1
+            return
+        key = {'success': 'successes', 'error': 'errors', 'cancelled': 'cancelled'}[outcome]
+        stats[key] += 1
+        if outcome != 'cancelled':
+            stats['recent'] = (stats['recent'] + [0 if outcome == 'error' else 1])[-RECENT_OUTCOMES:]
+
+    def record(self, name, outcome, latency=0.0, audio_seconds=0.0):
+        """
+        记录一次后端结果
+
+        Args:
+            name (str): 后端名称
+            outcome (str): success / error / cancelled / win
+            latency (float): 从启动到结束（或取消）的秒数
+            audio_seconds (float): 音频时长
+        """
+        value = latency / _audio_minutes(audio_seconds)
+        with self._lock:
+            self._apply(self.backends, name, outcome, value)
+            self._pending.append((name, outcome, value))
+
+    def percentile(self, name, q):
+        """
+        每分钟音频延迟的分位数（桶内线性插值）
+
+        Returns:
+            tuple: (分位数, 样本数)，没有样本时分位数为None
+        """
+        with self._lock:
+            buckets = list(self.backends.get(name, _new_backend_stats())['buckets'])
+        total = sum(buckets)
+        if not total:
+            return None, 0
+        target = q * total
+        seen = 0
+        for i, count in enumerate(buckets):
+            if count and seen + count >= target:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+                return lower + (upper - lower) * (target - seen) / count, total
+            seen += count
+        return LATENCY_BUCKETS[-1] * 2, total
+
+    def error_rate(self, name):
+        """近期错误率，没有记录时为0"""
+        with self._lock:
+            recent = self.backends.get(name, {}).get('recent') or []
+        return (len(recent) - sum(recent)) / len(recent) if recent else 0.0
+
+    def snapshot(self):
+        """供结果JSON和日志使用的统计副本"""
+        with self._lock:
+            return json.loads(json.dumps(self.backends))
+
+    def save(self):
+        """把本进程新增的记录合并进统计文件（加文件锁，并发任务不会互相覆盖）"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not self.path or not pending:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(f'{self.path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            backends = self._load()
+            for name, outcome, value in pending:
+                self._apply(backends, name, outcome, value)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'buckets': LATENCY_BUCKETS, 'backends': backends}, f)
+            os.replace(tmp_path, self.path)
+        with self._lock:
+            self.backends = backends
+
+class HedgedScheduler:
+    def __init__(self, stats=None, percentile=None, default_delay=None, min_delay=None, max_delay=None,
+                 min_samples=5):
+        """
+        初始化对冲调度
+
+        Args:
+            stats (LatencyStats): 延迟统计，默认从统计文件加载
+            percentile (float): 超过当前后端该分位数的延迟后启动下一个，默认读取TRANSCRIBER_HEDGE_PERCENTILE（默认0.9）
+            default_delay (float): 样本不足时每分钟音频等待的秒数，默认读取TRANSCRIBER_HEDGE_DELAY（默认15）
+            min_delay (float): 最短等待秒数，默认读取TRANSCRIBER_HEDGE_MIN_DELAY（默认3）
+            max_delay (float): 最长等待秒数，默认读取TRANSCRIBER_HEDGE_MAX_DELAY（默认120）
+            min_samples (int): 使用分位数所需的最少样本数
+        """
+        self.stats = stats if stats is not None else LatencyStats()
+        self.percentile = percentile if percentile is not None else float(os.getenv('TRANSCRIBER_HEDGE_PERCENTILE', '0.9'))
+        self.default_delay = default_delay if default_delay is not None else float(os.getenv('TRANSCRIBER_HEDGE_DELAY', '15'))
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv('TRANSCRIBER_HEDGE_MIN_DELAY', '3'))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv('TRANSCRIBER_HEDGE_MAX_DELAY', '120'))
+        self.min_samples = min_samples
+
+    def hedge_delay(self, name, audio_seconds):
+        """等待后端name多久后启动下一个后端（秒）；近期错误率过半时不等待"""
+        if self.stats.error_rate(name) > 0.5:
+            return 0.0
+        value, samples = self.stats.percentile(name, self.percentile)
+        per_minute = value if samples >= self.min_samples else self.default_delay
+        return min(self.max_delay, max(self.min_delay, per_minute * _audio_minutes(audio_seconds)))
+
+    def run(self, backends, audio_seconds=0.0):
+        """
+        按顺序对冲执行后端，返回最先成功的结果
+
+        Args:
+            backends (list): [(名称, 函数)]，函数接收一个 threading.Event，被取消时应尽快返回或抛出HedgeCancelled
+            audio_seconds (float): 音频时长，用于换算延迟阈值
+
+        Returns:
+            tuple: (结果, 调度信息)，调度信息含 winner/launched/errors/delays
+
+        Raises:
+            Exception: 所有后端都失败
+        """
+        if not backends:
+            raise Exception('没有可用的识别后端')
+        outcomes = queue.Queue()
+        cancel = threading.Event()
+        launched = {}
+        errors = {}
+        delays = {}
+
+        def launch(index):
+            name, func = backends[index]
+            launched[name] = time.perf_counter()
+
+            def target():
+                try:
+                    outcomes.put((name, True, func(cancel)))
+                except Exception as e:
+                    outcomes.put((name, False, e))
+
+            # 守护线程：被取消的后端不阻塞进程退出
+            threading.Thread(target=target, name=f'hedge-{name}', daemon=True).start()
+            print(f"启动识别后端: {name}", file=sys.stderr)
+
+        next_index = 0
+        running = 0
+        hedge_at = None
+        while True:
+            if hedge_at is None and next_index < len(backends):
+                launch(next_index)
+                name = backends[next_index][0]
+                next_index += 1
+                running += 1
+                if next_index < len(backends):
+                    delays[name] = round(self.hedge_delay(name, audio_seconds), 1)
+                    hedge_at = launched[name] + delays[name]
+
+            # 分段等待，阈值很大（如关闭对冲）时也不会超出系统的超时上限
+            timeout = min(60.0, max(0.0, hedge_at - time.perf_counter())) if hedge_at is not None else None
+            try:
+                name, ok, value = outcomes.get(timeout=timeout)
+            except queue.Empty:
+                if time.perf_counter() < hedge_at:
+                    continue
+                print("识别后端超过对冲阈值仍未完成，启动下一个后端", file=sys.stderr)
+                hedge_at = None
+                continue
+
+            running -= 1
+            latency = time.perf_counter() - launched[name]
+            if ok:
+                cancel.set()
+                self.stats.record(name, 'success', latency, audio_seconds)
+                self.stats.record(name, 'win')
+                for other, started in launched.items():
+                    if other != name and other not in errors:
+                        self.stats.record(other, 'cancelled', time.perf_counter() - started, audio_seconds)
+                return value, {
+                    'winner': name,
+                    'launched': list(launched),
+                    'latency_seconds': round(latency, 3),
+                    'delays': delays,
+                    'errors': errors,
+                }
+
+            print(f"识别后端 {name} 失败: {value}", file=sys.stderr)
+            errors[name] = str(value)
+            self.stats.record(name, 'error', latency, audio_seconds)
+            # 失败后立即启动下一个后端
+            hedge_at = None
+            if next_index >= len(backends) and running == 0:
+                raise Exception('所有识别后端都失败了: ' + '; '.join(f'{key}: {value}' for key, value in errors.items()))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写输入
+除视频链接外，转换器也可以直接处理本地文件、字节流（如stdin）和已解码的PCM，
+这些输入不经过yt-dlp，省去解析视频信息和下载复制的开销
+"""
+
+import os
+import sys
+import tempfile
+import numpy as np
+
+from transcriber_audio import SAMPLE_RATE, decode_audio, open_pcm
+
+class MediaInput:
+    def __init__(self, kind, value, title=None, duration=None, info=None):
+        """
+        初始化转写输入，一般通过 from_url / from_path / from_bytes / from_pcm 创建
+
+        Args:
+            kind (str): 'url'、'path'、'bytes' 或 'pcm'
+            value: 链接、文件路径、媒体文件字节或float32音频数组
+            title (str): 标题，默认取文件名
+            duration (float): 时长（秒），未知时解码后再计算
+            info (dict): 链接已解析的yt-dlp视频信息（任务队列入队时探测所得），下载时不再解析页面
+        """
+        self.kind = kind
+        self.value = value
+        self.title = title
+        self.duration = duration
+        self.info = info
+
+    @classmethod
+    def from_url(cls, url, info=None):
+        """视频链接，需要经过yt-dlp下载；info为已解析的视频信息（见transcriber_download.probe_media）"""
+        return cls('url', url, info=info)
+
+    @classmethod
+    def from_path(cls, path, title=None):
+        """本地视频/音频文件"""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+        return cls('path', path, title or os.path.splitext(os.path.basename(path))[0])
+
+    @classmethod
+    def from_bytes(cls, data, title=None):
+        """内存中的媒体文件内容（任意ffmpeg支持的格式），如爬虫已下载的视频或stdin"""
+        if not data:
+            raise ValueError("输入内容为空")
+        return cls('bytes', data, title or '未知标题')
+
+    @classmethod
+    def from_pcm(cls, data, sample_rate=SAMPLE_RATE, sample_format='f32le', title=None):
+        """
+        已解码的单声道PCM
+
+        Args:
+            data (bytes|numpy.ndarray): PCM字节或数组
+            sample_rate (int): 采样率，不是16kHz时线性重采样
+            sample_format (str): 字节输入的样本格式，'f32le' 或 's16le'
+            title (str): 标题
+        """
+        if isinstance(data, np.ndarray):
+            audio = data
+        elif sample_format == 's16le':
+            audio = np.frombuffer(data, dtype='<i2')
+        elif sample_format == 'f32le':
+            audio = np.frombuffer(data[:len(data) - len(data) % 4], dtype='<f4')
+        else:
+            raise ValueError(f"不支持的PCM格式: {sample_format}")
+
+        if audio.dtype.kind == 'i':
+            audio = audio.astype(np.float32) / 32768.0
+        # 切片得到的跨步数组（如立体声的一个声道）复制为连续数组，指纹和写出WAV按连续内存处理
+        audio = np.ascontiguousarray(np.asarray(audio, dtype=np.float32).reshape(-1))
+
+        if sample_rate != SAMPLE_RATE and len(audio):
+            target = int(round(len(audio) * SAMPLE_RATE / float(sample_rate)))
+            positions = np.arange(target) * (sample_rate / float(SAMPLE_RATE))
+            audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+        return cls('pcm', audio, title or '未知标题', round(len(audio) / float(SAMPLE_RATE), 1))
+
+    @classmethod
+    def from_argument(cls, argument, pcm=False):
+        """
+        解析命令行参数：'-' 表示从stdin读取，存在的文件按本地文件处理，其余视为链接
+
+        Args:
+            argument (str): 命令行参数
+            pcm (bool): 输入是否为16kHz float32 PCM（文件或stdin）
+        """
+        if argument == '-':
+            data = sys.stdin.buffer.read()
+            return cls.from_pcm(data) if pcm else cls.from_bytes(data)
+        if pcm:
+            with open(argument, 'rb') as f:
+                return cls.from_pcm(f.read(), title=os.path.basename(argument))
+        if os.path.isfile(argument):
+            return cls.from_path(argument)
+        return cls.from_url(argument)
+
+    @property
+    def is_url(self):
+        return self.kind == 'url'
+
+    @property
+    def label(self):
+        """日志中显示的输入描述"""
+        if self.kind in ('url', 'path'):
+            return self.value
+        return f"<{self.kind}: {self.title}>"
+
+    def decode(self, pcm_path=None):
+        """
+        解码为16kHz单声道float32数组
+
+        Args:
+            pcm_path (str): 可选，结果写入该文件并以内存映射方式返回（供多进程共享）
+
+        Returns:
+            numpy.ndarray: 音频数组
+        """
+        if self.kind == 'url':
+            raise ValueError("视频链接需要先下载")
+        if self.kind == 'path':
+            return decode_audio(self.value, pcm_path=pcm_path)
+        if self.kind == 'bytes':
+            try:
+                return decode_audio(self.value, pcm_path=pcm_path)
+            except RuntimeError:
+                # 部分MP4的索引在文件末尾，无法从管道读取，落盘后再解码
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(pcm_path) if pcm_path else None) as f:
+                    f.write(self.value)
+                    f.flush()
+                    return decode_audio(f.name, pcm_path=pcm_path)
+
+        # 已解码的PCM只有在需要多进程共享时才写文件
+        if pcm_path:
+            self.value.tofile(pcm_path)
+            return open_pcm(pcm_path)
+        return self.value
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写任务上下文
+一个任务的全部可变状态（临时工作目录、进度事件、阶段统计、截止时间、识别策略和解码参数、取消标记）
+放在 JobContext 中，由 VideoTranscriber 的各个步骤显式传递，同一进程可以同时运行多个任务并共用已加载的模型。
+
+工作目录可放在tmpfs（如 /dev/shm）上，下载的音频和解码出的PCM不落盘；任务结束、取消或进程收到终止信号时删除，
+被强制结束（SIGKILL）的进程留下的目录在下次启动时按进程号清理
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import atexit
+import tempfile
+import threading
+
+from transcriber_events import EventReporter
+from transcriber_metrics import JobMetrics
+
+# 工作目录名前缀，后接进程号，用于识别已退出进程留下的目录
+WORKSPACE_PREFIX = 'transcriber-job-'
+
+# 正在使用的工作目录，进程退出或收到终止信号时统一删除
+_live_workspaces = set()
+_live_lock = threading.Lock()
+_cleanup_installed = False
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+def _free_mb(path):
+    try:
+        stat = os.statvfs(path)
+    except OSError:
+        return None
+    return stat.f_bavail * stat.f_frsize // (1024 * 1024)
+
+def workspace_root():
+    """
+    任务工作目录所在的目录
+
+    读取TRANSCRIBER_WORKSPACE_DIR：为空时使用系统临时目录；为 tmpfs 时使用 /dev/shm，
+    可用空间低于TRANSCRIBER_TMPFS_MIN_FREE_MB（默认1024）时回退到系统临时目录（tmpfs占用的是内存）
+    """
+    configured = os.getenv('TRANSCRIBER_WORKSPACE_DIR', '').strip()
+    if not configured:
+        return tempfile.gettempdir()
+    if configured.lower() == 'tmpfs':
+        configured = '/dev/shm'
+        min_free_mb = int(os.getenv('TRANSCRIBER_TMPFS_MIN_FREE_MB', '1024'))
+        free_mb = _free_mb(configured) if os.access(configured, os.W_OK) else None
+        if free_mb is None or free_mb < min_free_mb:
+            print(f"tmpfs可用空间不足（{free_mb}MB），工作目录使用系统临时目录", file=sys.stderr)
+            return tempfile.gettempdir()
+    os.makedirs(configured, exist_ok=True)
+    return configured
+
+def _remove_workspace(path):
+    with _live_lock:
+        _live_workspaces.discard(path)
+    shutil.rmtree(path, ignore_errors=True)
+
+def cleanup_workspaces():
+    """删除本进程所有仍在使用的工作目录"""
+    with _live_lock:
+        paths = list(_live_workspaces)
+    for path in paths:
+        _remove_workspace(path)
+
+def sweep_stale_workspaces(root=None):
+    """删除已退出进程留下的工作目录（进程被SIGKILL时来不及清理）"""
+    root = root or workspace_root()
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return 0
+    removed = 0
+    for entry in entries:
+        if not entry.startswith(WORKSPACE_PREFIX):
+            continue
+        try:
+            pid = int(entry[len(WORKSPACE_PREFIX):].split('-')[0])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"已清理{removed}个残留的任务工作目录", file=sys.stderr)
+    return removed
+
+def install_workspace_cleanup():
+    """
+    保证工作目录被删除：正常退出时由atexit删除，收到SIGTERM/SIGHUP时删除后按原信号退出；
+    同时清理已退出进程留下的目录。只能在主线程中调用，重复调用无副作用
+    """
+    global _cleanup_installed
+    if _cleanup_installed:
+        return
+    _cleanup_installed = True
+    atexit.register(cleanup_workspaces)
+
+    def handle(signum, frame):
+        cleanup_workspaces()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        try:
+            if signal.getsignal(signum) in (signal.SIG_DFL, None):
+                signal.signal(signum, handle)
+        except (ValueError, OSError):
+            pass
+    sweep_stale_workspaces()
+
+class JobContext:
+    def __init__(self, job_id=None, deadline=None, events=None, metrics=None, model_size=None, decode_options=None):
+        """
+        初始化一个任务的上下文
+
+        Args:
+            job_id (str): 任务ID（常驻进程模式下由请求提供）
+            deadline (float): 任务截止时间（秒），为空表示不限
+            events (EventReporter): 进度事件输出，默认只向stderr打印提示
+            metrics (JobMetrics): 阶段统计，默认新建
+            model_size (str): 本任务使用的模型，识别策略可更换
+            decode_options (dict): 本任务的解码参数，识别策略可更换
+        """
+        self.id = job_id
+        self.deadline = deadline
+        self.events = events if events is not None else EventReporter()
+        self.metrics = metrics if metrics is not None else JobMetrics()
+        self.model_size = model_size
+        self.decode_options = dict(decode_options or {})
+        self.policy = None
+        self.started = time.perf_counter()
+        self.workspace = None
+        self._cancelled = threading.Event()
+
+    def open_workspace(self):
+        """创建本任务的工作目录（已创建则直接返回）"""
+        if self.workspace is None:
+            self.workspace = tempfile.mkdtemp(prefix=f'{WORKSPACE_PREFIX}{os.getpid()}-', dir=workspace_root())
+            with _live_lock:
+                _live_workspaces.add(self.workspace)
+        return self.workspace
+
+    def close(self):
+        """删除工作目录"""
+        workspace, self.workspace = self.workspace, None
+        if workspace and os.path.exists(workspace):
+            _remove_workspace(workspace)
+            print("临时文件已清理", file=sys.stderr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def cancel(self):
+        """请求取消任务，正在执行的步骤在下一个检查点停止"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """任务已取消时抛出JobCancelled"""
+        if self._cancelled.is_set():
+            raise JobCancelled('任务已取消')
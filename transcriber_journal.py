@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段识别日志（断点续传）
+长视频超时被结束（接口超时后kill、任务取消、进程重启）时，已完成的分段不再丢失：
+每个分段识别完成后立即写入SQLite日志，按音频哈希、分段范围和识别参数存放；
+同一音频重新提交时沿用上次的分段方案、模型和解码参数，只识别缺少的分段，多次重试后总能完成。
+流式识别开始时还不知道整段音频的哈希，按规范化的视频链接记录（stream_key），
+分段随音频到达逐个确定，日志中记录分段方式（layout），续传时按相同方式切分
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def stream_key(canonical_url):
+    """流式识别的日志键（canonical_url为transcriber_cache.canonicalize_url的结果）"""
+    return f'stream:{canonical_url}'
+
+def decoder_key(model_size, decode_options, quantized=False):
+    """识别参数的键：模型、是否量化和解码参数相同的分段结果才能复用"""
+    options = json.dumps(decode_options, sort_keys=True, default=str)
+    digest = hashlib.sha1(options.encode('utf-8')).hexdigest()[:12]
+    return f"{model_size}{'-int8' if quantized else ''}:{digest}"
+
+class ChunkJournal:
+    def __init__(self, path=None, ttl_hours=None):
+        """
+        初始化分段日志
+
+        Args:
+            path (str): SQLite文件路径，默认读取TRANSCRIBER_JOURNAL_DB，否则为 temp/transcriber-journal.sqlite
+            ttl_hours (float): 未完成的日志保留时长（小时），默认读取TRANSCRIBER_JOURNAL_TTL_HOURS（默认24）
+        """
+        default_path = os.path.join(BASE_DIR, 'temp', 'transcriber-journal.sqlite')
+        self.path = path or os.getenv('TRANSCRIBER_JOURNAL_DB', default_path)
+        self.enabled = os.getenv('TRANSCRIBER_JOURNAL', 'true').lower() not in ('0', 'false', 'no')
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None
+                            else float(os.getenv('TRANSCRIBER_JOURNAL_TTL_HOURS', '24'))) * 3600
+        self.conn = None
+        self._lock = threading.Lock()
+        if not self.enabled:
+            return
+        try:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # 多个工作进程可能同时写同一个日志，等待对方的写事务结束
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            with self._lock:
+                self.conn.execute('PRAGMA journal_mode=WAL')
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS plans (
+                        audio_hash TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        decode_options TEXT NOT NULL,
+                        chunks TEXT NOT NULL,
+                        skipped_seconds REAL NOT NULL,
+                        updated_at REAL NOT NULL,
+                        layout TEXT
+                    )''')
+                # 早期的日志没有layout列
+                columns = [row[1] for row in self.conn.execute('PRAGMA table_info(plans)').fetchall()]
+                if 'layout' not in columns:
+                    self.conn.execute('ALTER TABLE plans ADD COLUMN layout TEXT')
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS chunks (
+                        audio_hash TEXT NOT NULL,
+                        range_start INTEGER NOT NULL,
+                        range_end INTEGER NOT NULL,
+                        decoder TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        PRIMARY KEY (audio_hash, range_start, range_end, decoder)
+                    )''')
+                self._purge()
+        except (OSError, sqlite3.Error) as e:
+            print(f"分段日志不可用，不支持断点续传: {e}", file=sys.stderr)
+            self.conn = None
+
+    @property
+    def available(self):
+        return self.conn is not None
+
+    def _purge(self):
+        """删除超过保留时长的日志（调用方持有_lock）"""
+        cutoff = time.time() - self.ttl_seconds
+        self.conn.execute('DELETE FROM plans WHERE updated_at < ?', (cutoff,))
+        self.conn.execute('DELETE FROM chunks WHERE audio_hash NOT IN (SELECT audio_hash FROM plans)')
+
+    def _execute(self, sql, params=()):
+        if self.conn is None:
+            return None
+        try:
+            with self._lock:
+                return self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"分段日志读写失败: {e}", file=sys.stderr)
+            return None
+
+    def get_plan(self, audio_hash):
+        """
+        上次未完成的分段方案
+
+        Returns:
+            dict: {"model", "decode_options", "chunks", "skipped_seconds", "layout"}，没有时为None
+        """
+        rows = self._execute('SELECT model, decode_options, chunks, skipped_seconds, layout FROM plans '
+                             'WHERE audio_hash = ?', (audio_hash,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            'model': row[0],
+            'decode_options': json.loads(row[1]),
+            'chunks': [[tuple(piece) for piece in pieces] for pieces in json.loads(row[2])],
+            'skipped_seconds': row[3],
+            'layout': json.loads(row[4]) if row[4] else None,
+        }
+
+    def put_plan(self, audio_hash, model_size, decode_options, chunks, skipped_seconds, layout=None):
+        """
+        记录本次的分段方案、模型和解码参数，续传时沿用，保证分段范围一致
+
+        Args:
+            layout (dict): 流式识别的分段方式（分段事先未知，chunks为空），续传时按它切分
+        """
+        self._execute('INSERT OR REPLACE INTO plans (audio_hash, model, decode_options, chunks, skipped_seconds, '
+                      'updated_at, layout) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (audio_hash, model_size, json.dumps(decode_options, default=str),
+                       json.dumps([[[int(start), int(end)] for start, end in pieces] for pieces in chunks]),
+                       skipped_seconds, time.time(), json.dumps(layout) if layout else None))
+
+    def finished_chunks(self, audio_hash, decoder):
+        """
+        已完成的分段
+
+        Returns:
+            dict: {(起始样本, 结束样本): 分段结果}，结果中的时间戳相对分段起点（与Whisper原始结果相同）
+        """
+        rows = self._execute('SELECT range_start, range_end, result FROM chunks WHERE audio_hash = ? AND decoder = ?',
+                             (audio_hash, decoder)) or []
+        return {(start, end): json.loads(result) for start, end, result in rows}
+
+    def put_chunk(self, audio_hash, pieces, decoder, chunk_result):
+        """分段识别完成后立即写入（只保留文字和分段的起止时间）"""
+        result = {
+            'text': chunk_result.get('text', ''),
+            'segments': [{'start': segment.get('start', 0), 'end': segment.get('end', 0),
+                          'text': segment.get('text', '')}
+                         for segment in chunk_result.get('segments') or []]
+        }
+        self._execute('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)',
+                      (audio_hash, int(pieces[0][0]), int(pieces[-1][1]), decoder,
+                       json.dumps(result, ensure_ascii=False), time.time()))
+        self._execute('UPDATE plans SET updated_at = ? WHERE audio_hash = ?', (time.time(), audio_hash))
+
+    def finish(self, audio_hash):
+        """整段识别完成后删除日志（完整结果已写入转写缓存）"""
+        self._execute('DELETE FROM chunks WHERE audio_hash = ?', (audio_hash,))
+        self._execute('DELETE FROM plans WHERE audio_hash = ?', (audio_hash,))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写任务的阶段耗时与资源统计
+记录每个阶段的墙钟时间、CPU时间和峰值内存，计算实时率（音频秒数/处理秒数），
+可写入结果JSON的 metrics 字段，也可写成Prometheus文本格式文件
+"""
+
+import os
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+def cpu_seconds():
+    """当前进程及已结束子进程（如ffmpeg）的CPU时间总和"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def available_memory_mb():
+    """读取系统可用内存（MB），无法获取时返回None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+class JobMetrics:
+    def __init__(self):
+        """初始化一个任务的统计"""
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.audio_seconds = 0.0
+        self.info = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall, cpu=None, rss_mb=None):
+        """
+        记录一次阶段耗时，同名阶段（如逐段识别）累加
+
+        Args:
+            name (str): 阶段名
+            wall (float): 墙钟时间（秒）
+            cpu (float): CPU时间（秒）
+            rss_mb (float): 阶段结束时的峰值内存（MB）
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {
+                'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'max_wall_seconds': 0.0, 'peak_rss_mb': 0.0
+            })
+            stage['count'] += 1
+            stage['wall_seconds'] += wall
+            stage['max_wall_seconds'] = max(stage['max_wall_seconds'], wall)
+            if cpu is not None:
+                stage['cpu_seconds'] += cpu
+            stage['peak_rss_mb'] = max(stage['peak_rss_mb'], rss_mb if rss_mb is not None else peak_rss_mb())
+
+    @contextmanager
+    def stage(self, name):
+        """统计with块内的耗时"""
+        wall_start = time.perf_counter()
+        cpu_start = cpu_seconds()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall_start, cpu_seconds() - cpu_start)
+
+    def summary(self):
+        """返回可直接放进结果JSON的统计"""
+        with self._lock:
+            total_wall = time.perf_counter() - self.started
+            stages = {name: {key: round(value, 3) if isinstance(value, float) else value
+                             for key, value in stage.items()}
+                      for name, stage in self.stages.items()}
+            inference = self.stages.get('inference', {})
+
+        summary = {
+            'stages': stages,
+            'total_wall_seconds': round(total_wall, 3),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'audio_seconds': round(self.audio_seconds, 1),
+            # 实时率：每秒处理时间对应的音频秒数，越大越快
+            'realtime_factor': round(self.audio_seconds / total_wall, 2) if total_wall > 0 else None,
+            'inference_realtime_factor': (round(self.audio_seconds / inference['wall_seconds'], 2)
+                                          if inference.get('wall_seconds') else None)
+        }
+        summary.update(self.info)
+        return summary
+
+def to_prometheus(summary, labels=None):
+    """
+    把summary()的结果转换为Prometheus文本格式
+
+    Args:
+        summary (dict): JobMetrics.summary() 的结果
+        labels (dict): 附加到每个指标上的标签，如 {"backend": "whisper", "model": "tiny"}
+
+    Returns:
+        str: 文本格式指标
+    """
+    def label_text(extra=None):
+        merged = dict(labels or {}, **(extra or {}))
+        if not merged:
+            return ''
+        return '{' + ','.join(f'{key}="{str(value)}"' for key, value in sorted(merged.items())) + '}'
+
+    lines = []
+    stage_metrics = [
+        ('wall_seconds', 'transcriber_stage_wall_seconds', '阶段墙钟时间'),
+        ('cpu_seconds', 'transcriber_stage_cpu_seconds', '阶段CPU时间'),
+        ('peak_rss_mb', 'transcriber_stage_peak_rss_megabytes', '阶段结束时的峰值内存'),
+        ('count', 'transcriber_stage_count', '阶段执行次数'),
+    ]
+    for key, metric, help_text in stage_metrics:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for name, stage in summary.get('stages', {}).items():
+            lines.append(f'{metric}{label_text({"stage": name})} {stage.get(key, 0)}')
+
+    job_metrics = [
+        ('total_wall_seconds', 'transcriber_job_wall_seconds', '任务总耗时'),
+        ('peak_rss_mb', 'transcriber_job_peak_rss_megabytes', '任务峰值内存'),
+        ('audio_seconds', 'transcriber_job_audio_seconds', '音频时长'),
+        ('realtime_factor', 'transcriber_job_realtime_factor', '端到端实时率'),
+        ('inference_realtime_factor', 'transcriber_inference_realtime_factor', '识别阶段实时率'),
+    ]
+    for key, metric, help_text in job_metrics:
+        if summary.get(key) is None:
+            continue
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric}{label_text()} {summary[key]}')
+
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(path, summary, labels=None):
+    """原子写入Prometheus文本格式文件（可配合node_exporter的textfile收集器）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(to_prometheus(summary, labels))
+    os.replace(tmp_path, path)
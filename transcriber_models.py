@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Whisper模型管理
+按配置在进程启动时预加载模型（避免部署后的第一个请求承担加载耗时），
+可选int8动态量化（CPU上内存更小、矩阵乘更快），并提供各模型的速度估计供识别策略选择模型。
+fork方式启动的转换进程直接继承这里已加载的模型，权重以写时复制方式共享，不再各自加载一份。
+torch和whisper在加载模型时才导入，任务队列进程只使用内存和速度估计，不必导入它们
+"""
+
+import os
+import sys
+import time
+import threading
+
+# 从小到大（速度从快到慢，效果从差到好）
+MODEL_SIZES = ['tiny', 'base', 'small', 'medium', 'large']
+
+# 每个模型加载后的大致内存占用（MB），用于限制并行进程数
+MODEL_MEMORY_MB = {
+    'tiny': 500,
+    'base': 700,
+    'small': 1500,
+    'medium': 3500,
+    'large': 7000
+}
+
+# CPU上每秒音频所需的大致识别时间（秒，单进程贪心解码），运行中按实测值修正
+MODEL_SECONDS_PER_AUDIO_SECOND = {
+    'tiny': 0.06,
+    'base': 0.12,
+    'small': 0.35,
+    'medium': 1.0,
+    'large': 2.0
+}
+
+# int8动态量化后的内存和耗时比例（只量化Linear层，卷积和嵌入保持float32）
+QUANTIZED_MEMORY_RATIO = 0.4
+QUANTIZED_TIME_RATIO = 0.7
+
+def _env_list(name):
+    return [item.strip() for item in os.getenv(name, '').split(',') if item.strip()]
+
+def quantize_model(model):
+    """
+    对Whisper模型做int8动态量化
+
+    Whisper自定义的Linear子类（只是按输入类型转换权重）无法被quantize_dynamic识别，
+    float32推理时它与nn.Linear等价，先换回nn.Linear再量化
+    """
+    import torch
+    import whisper
+
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class ModelRegistry:
+    def __init__(self, default_size='tiny', preload=None, quantize=None, choices=None):
+        """
+        初始化模型管理
+
+        Args:
+            default_size (str): 没有截止时间时使用的模型
+            preload (list): 启动时预加载的模型，默认读取TRANSCRIBER_PRELOAD_MODELS（逗号分隔），否则只加载默认模型
+            quantize (bool): 是否使用int8动态量化，默认读取TRANSCRIBER_QUANTIZE
+            choices (list): 按截止时间选择时允许使用的模型，默认读取TRANSCRIBER_MODEL_CHOICES，否则为预加载的模型
+        """
+        self.default_size = default_size
+        self.preload_sizes = preload if preload is not None else (_env_list('TRANSCRIBER_PRELOAD_MODELS') or [default_size])
+        if quantize is None:
+            quantize = os.getenv('TRANSCRIBER_QUANTIZE', 'false').lower() in ('1', 'true', 'yes', 'int8')
+        self.quantize = quantize
+        choices = choices if choices is not None else (_env_list('TRANSCRIBER_MODEL_CHOICES') or self.preload_sizes)
+        self.choices = sorted(set(choices) | {default_size}, key=self._rank)
+        self.speed = {size: value * (QUANTIZED_TIME_RATIO if quantize else 1.0)
+                      for size, value in MODEL_SECONDS_PER_AUDIO_SECOND.items()}
+        self.models = {}
+        self.load_seconds = {}
+        self._lock = threading.Lock()
+        # 每个模型的加载锁，加载时不持有_lock
+        self._loading_locks = {}
+        self._inference_locks = {}
+
+    @staticmethod
+    def _rank(size):
+        base = size.split('.')[0].split('-')[0]
+        return MODEL_SIZES.index(base) if base in MODEL_SIZES else len(MODEL_SIZES)
+
+    def get(self, size=None):
+        """返回已加载的模型，未加载时加载（并按配置量化）"""
+        size = size or self.default_size
+        with self._lock:
+            model = self.models.get(size)
+            if model is not None:
+                return model
+            loading = self._loading_locks.setdefault(size, threading.Lock())
+        # 加载（和量化）耗时数秒，只持有该模型的加载锁：同时请求同一模型的任务等待这一次加载，
+        # 使用其他已加载模型的任务不受影响
+        with loading:
+            model = self.models.get(size)
+            if model is not None:
+                return model
+            print(f"正在加载Whisper模型: {size}{'（int8量化）' if self.quantize else ''}", file=sys.stderr)
+            import whisper
+            start = time.perf_counter()
+            model = whisper.load_model(size, device='cpu')
+            if self.quantize:
+                model = quantize_model(model)
+            model.eval()
+            with self._lock:
+                self.models[size] = model
+                self.load_seconds[size] = time.perf_counter() - start
+            print(f"Whisper模型加载完成: {size} ({self.load_seconds[size]:.1f}秒)", file=sys.stderr)
+            return model
+
+    def preload(self):
+        """加载所有配置的模型（常驻进程启动时调用）"""
+        for size in self.preload_sizes:
+            self.get(size)
+
+    def inference_lock(self, size=None):
+        """
+        同一模型的推理锁
+
+        Whisper解码时在模型上临时安装kv-cache钩子，同一个模型对象不能在多个线程中同时推理；
+        多个任务共用模型时各自持锁推理，下载、解码、语音检测和繁简转换仍然并行
+        """
+        return self._inference_locks.setdefault(size or self.default_size, threading.Lock())
+
+    def is_loaded(self, size):
+        return size in self.models
+
+    def scale_speed(self, ratio):
+        """按识别引擎调整速度估计（如faster-whisper比openai-whisper快），运行中仍按实测值修正"""
+        if ratio != 1.0:
+            with self._lock:
+                self.speed = {size: value * ratio for size, value in self.speed.items()}
+
+    def memory_mb(self, size):
+        """一份模型的大致内存占用（MB）"""
+        memory = MODEL_MEMORY_MB.get(size, MODEL_MEMORY_MB['large'])
+        return int(memory * (QUANTIZED_MEMORY_RATIO if self.quantize else 1.0))
+
+    def estimate_seconds(self, size, audio_seconds, workers=1):
+        """估算识别一段音频所需的时间（秒）"""
+        return audio_seconds * self.speed.get(size, self.speed['large']) / max(1, workers)
+
+    def observe(self, size, audio_seconds, inference_seconds, workers=1, time_factor=1.0):
+        """
+        用实测的识别耗时修正速度估计（指数滑动平均）
+
+        time_factor 为本次解码参数相对贪心解码的耗时倍数，换算回贪心解码的速度后再记录
+        """
+        if audio_seconds < 5 or inference_seconds <= 0:
+            return
+        measured = inference_seconds * max(1, workers) / audio_seconds / time_factor
+        with self._lock:
+            previous = self.speed.get(size, measured)
+            self.speed[size] = previous * 0.7 + measured * 0.3
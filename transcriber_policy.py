@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+识别策略
+根据任务截止时间和音频时长选择模型、分段长度、并行进程数和Whisper解码参数：
+时间充裕的短视频使用更大的模型和束搜索，长视频退回到最快的贪心解码，保证在截止时间内完成
+"""
+
+# 最快的解码参数（贪心解码、不依赖前文），所有策略在此基础上调整
+FAST_DECODE_OPTIONS = {
+    'language': "zh",
+    'task': "transcribe",
+    'verbose': False,  # 减少输出
+    'fp16': False,  # 禁用fp16以提高兼容性
+    'temperature': 0,  # 使用确定性解码，更快
+    'compression_ratio_threshold': 2.4,
+    'logprob_threshold': -1.0,
+    'no_speech_threshold': 0.6,  # 跳过静音部分
+    'beam_size': 1,  # 单束搜索，最快速度
+    'best_of': 1,  # 只生成一个候选
+    'word_timestamps': False,  # 禁用单词时间戳
+    'condition_on_previous_text': False  # 不依赖前文，更快
+}
+
+# 解码档位：(名称, 相对贪心解码的耗时倍数, 参数调整)，从效果最好到最快
+DECODE_TIERS = [
+    ('quality', 3.0, {'beam_size': 5, 'best_of': 5, 'temperature': (0.0, 0.2, 0.4, 0.6),
+                      'condition_on_previous_text': True}),
+    ('balanced', 1.6, {'beam_size': 3, 'condition_on_previous_text': True}),
+    ('fast', 1.0, {}),
+]
+
+# 预留给下载、解码和格式化的时间比例
+SAFETY_MARGIN = 0.2
+
+def decode_options(tier='fast', beam_size=None):
+    """返回某一档位的完整解码参数"""
+    options = dict(FAST_DECODE_OPTIONS)
+    for name, _, overrides in DECODE_TIERS:
+        if name == tier:
+            options.update(overrides)
+    if beam_size:
+        options['beam_size'] = beam_size
+    return options
+
+def plan_chunk_duration(audio_seconds, workers, default=60):
+    """
+    并行时让分段数约为进程数的两倍，便于均衡负载；分段不短于Whisper的30秒窗口。
+    配置了短于30秒的分段（配合分段重叠使用）时按配置切分，分段越多并行度越高
+    """
+    if workers <= 1 or audio_seconds <= default or default < 30:
+        return default
+    return int(max(30, min(120, audio_seconds / (workers * 2))))
+
+def plan_policy(audio_seconds, deadline_seconds, registry, workers=1, elapsed_seconds=0.0,
+                default_chunk_duration=60, beam_size=None):
+    """
+    选择识别策略
+
+    Args:
+        audio_seconds (float): 音频时长（秒）
+        deadline_seconds (float): 任务截止时间（从任务开始算起，秒），为空时使用默认模型和最快参数
+        registry (ModelRegistry): 模型管理，提供可选模型和速度估计
+        workers (int): 可用的并行进程数（已按CPU和内存限制）
+        elapsed_seconds (float): 任务已用时间（下载、解码）
+        default_chunk_duration (int): 没有截止时间时的分段长度
+        beam_size (int): 配置的束搜索宽度（TRANSCRIBER_BEAM_SIZE），只在最快档位生效
+
+    Returns:
+        dict: 策略，含 name/model/decode_options/chunk_duration/workers/time_factor/estimated_seconds/deadline_seconds
+    """
+    policy = {
+        'name': 'fast',
+        'time_factor': 1.0,
+        'model': registry.default_size,
+        'workers': workers,
+        'chunk_duration': default_chunk_duration,
+        'deadline_seconds': deadline_seconds,
+        'budget_seconds': None,
+    }
+    if not deadline_seconds or audio_seconds <= 0:
+        policy['decode_options'] = decode_options('fast', beam_size)
+        policy['estimated_seconds'] = round(registry.estimate_seconds(policy['model'], audio_seconds, workers), 1)
+        return policy
+
+    budget = max(0.0, (deadline_seconds - elapsed_seconds) * (1 - SAFETY_MARGIN))
+    policy['budget_seconds'] = round(budget, 1)
+
+    # 模型从大到小、档位从好到快，取第一个预计能按时完成的组合
+    for model in reversed(registry.choices):
+        for name, factor, _ in DECODE_TIERS:
+            estimate = registry.estimate_seconds(model, audio_seconds, workers) * factor
+            if estimate <= budget:
+                policy.update(name=name, model=model, time_factor=factor, estimated_seconds=round(estimate, 1))
+                break
+        else:
+            continue
+        break
+    else:
+        # 怎样都来不及时使用最快的组合，尽量缩短超时
+        model = registry.choices[0]
+        policy.update(name='fast', model=model, time_factor=1.0,
+                      estimated_seconds=round(registry.estimate_seconds(model, audio_seconds, workers), 1))
+
+    policy['decode_options'] = decode_options(policy['name'], beam_size if policy['name'] == 'fast' else None)
+    policy['chunk_duration'] = plan_chunk_duration(audio_seconds, workers, default_chunk_duration)
+    return policy
+
+def describe_policy(policy):
+    """记录到任务统计中的策略摘要（不含完整解码参数）"""
+    options = policy['decode_options']
+    return {
+        'name': policy['name'],
+        'model': policy['model'],
+        'workers': policy['workers'],
+        'chunk_duration': policy['chunk_duration'],
+        'beam_size': options['beam_size'],
+        'condition_on_previous_text': options['condition_on_previous_text'],
+        'deadline_seconds': policy['deadline_seconds'],
+        'budget_seconds': policy['budget_seconds'],
+        'estimated_seconds': policy['estimated_seconds'],
+    }
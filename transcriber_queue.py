@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写任务队列
+本地转写任务先进入队列（SQLite持久化），由固定数量的常驻工作进程（video_transcriber.py --worker）执行，
+同时运行的任务数按CPU核数和内存计算，避免并发请求各自运行Whisper、互相拖慢直到全部超时。
+调度在用户之间轮转（一个用户的多个任务排在其他用户的任务之后），同一轮内短视频优先，
+等待越久优先级越高（长视频不会一直排不上）；预计无法在截止时间前完成或队列已满时转交云端识别
+
+用法（与 video_transcriber.py --worker 相同的逐行JSON协议）:
+    python transcriber_queue.py
+
+请求格式:
+    {"id": "任务ID", "url": "视频链接", "user": "用户ID", "deadline": 540}
+    {"id": "任务ID", "path": "本地文件路径", "user": "用户ID", "duration": 95}   duration可省略，入队时探测
+    调用方已知时长时应带上duration；否则链接在入队时解析一次，解析结果随任务交给工作进程，下载时不再解析页面
+    {"id": "任务ID", "op": "status"}
+    {"id": "任务ID", "op": "cancel"}
+    {"op": "shutdown"}
+
+响应格式:
+    {"id": "任务ID", "event": "queued", "state": "queued", "position": 3, "wait_seconds": 40, "eta_seconds": 75}
+    {"id": "任务ID", "success": true, "data": {...}, "queue": {"backend": "local", "wait_seconds": 38.2, ...}}
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import sqlite3
+import threading
+import subprocess
+from collections import Counter
+
+from transcriber_audio import probe_duration
+from transcriber_download import probe_media
+from transcriber_metrics import available_memory_mb
+from transcriber_models import ModelRegistry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_SCRIPT = os.path.join(BASE_DIR, 'video_transcriber.py')
+CLOUD_SCRIPT = os.path.join(BASE_DIR, 'video_transcriber_cloud.py')
+
+# 时长未知（探测失败）时按此估计（秒）
+DEFAULT_DURATION = 300
+# 每个任务除识别外的固定耗时（下载、解码、格式化，秒）
+JOB_OVERHEAD_SECONDS = 10
+# 每个工作进程除模型外的内存（解码后的音频、推理中间结果等，MB）
+SLOT_OVERHEAD_MB = 400
+# 已结束任务的保留时间（秒）
+RETENTION_SECONDS = 7 * 24 * 3600
+
+def plan_slots(registry, slots=None):
+    """
+    根据配置、CPU核数和可用内存计算同时运行的任务数
+
+    Args:
+        registry (ModelRegistry): 提供每个工作进程加载的模型和内存占用
+        slots (int|str): 期望的任务数，默认读取TRANSCRIBER_JOB_SLOTS，"auto"表示每两个核一个任务
+    """
+    slots = slots or os.getenv('TRANSCRIBER_JOB_SLOTS', 'auto')
+    cpu_count = os.cpu_count() or 1
+    if str(slots).lower() == 'auto':
+        # Whisper推理的矩阵运算按核并行，每个任务至少两个核
+        slots = cpu_count // 2
+    try:
+        slots = max(1, int(slots))
+    except (TypeError, ValueError):
+        slots = 1
+
+    per_slot_mb = sum(registry.memory_mb(size) for size in registry.preload_sizes) + SLOT_OVERHEAD_MB
+    budget_mb = os.getenv('TRANSCRIBER_MAX_MEMORY_MB')
+    if budget_mb:
+        budget_mb = int(budget_mb)
+    else:
+        available_mb = available_memory_mb()
+        budget_mb = int(available_mb * 0.8) if available_mb else None
+    if budget_mb:
+        slots = max(1, min(slots, budget_mb // per_slot_mb))
+    return slots
+
+def plan_queue(queued, running, slots, estimate, now=None, aging=1.0):
+    """
+    计算排队任务的执行顺序和预计开始、完成时间
+
+    每次从剩余任务中选出：所属用户已运行和已排在前面的任务最少的，其次预计耗时减去
+    已等待时间（乘以aging）最小的，再其次入队最早的
+
+    Args:
+        queued (list): 排队中的任务（含 id/user_id/duration/enqueued_at）
+        running (list): 运行中的任务（含 user_id/duration/started_at）
+        slots (int): 同时运行的任务数
+        estimate (callable): estimate(duration) -> 预计耗时（秒）
+        now (float): 当前时间（time.time()）
+        aging (float): 每等待一秒提前的秒数
+
+    Returns:
+        list: [(任务, 预计开始秒数, 预计完成秒数)]，按执行顺序，时间从现在算起
+    """
+    now = time.time() if now is None else now
+    active = Counter(job['user_id'] for job in running)
+    free_at = sorted(max(0.0, estimate(job['duration']) - (now - job['started_at'])) for job in running)
+    free_at = (free_at + [0.0] * slots)[:max(slots, len(free_at))]
+    heapq.heapify(free_at)
+
+    remaining = list(queued)
+    plan = []
+    while remaining:
+        job = min(remaining, key=lambda job: (active[job['user_id']],
+                                              estimate(job['duration']) - aging * (now - job['enqueued_at']),
+                                              job['enqueued_at'], job['id'] or 0))
+        remaining.remove(job)
+        active[job['user_id']] += 1
+        start = heapq.heappop(free_at)
+        finish = start + estimate(job['duration'])
+        heapq.heappush(free_at, finish)
+        plan.append((job, start, finish))
+    return plan
+
+def probe_request(request):
+    """
+    入队时探测视频时长（在后台线程中调用）
+
+    Returns:
+        tuple: (时长（秒），失败时为None, 链接的yt-dlp解析结果（交给工作进程下载时使用），本地文件为None)
+    """
+    try:
+        if request.get('path'):
+            return probe_duration(request['path']), None
+        if request.get('url'):
+            media = probe_media(request['url'])
+            return media.get('duration') or None, media['info']
+    except Exception as e:
+        print(f"探测视频时长失败: {e}", file=sys.stderr)
+    return None, None
+
+def _last_json_line(output):
+    """子进程输出中的最后一行JSON（结果）"""
+    lines = [line for line in output.splitlines() if line.startswith('{')]
+    return json.loads(lines[-1]) if lines else None
+
+class JobStore:
+    def __init__(self, path=None):
+        """
+        初始化任务存储
+
+        Args:
+            path (str): SQLite文件路径，默认读取TRANSCRIBER_QUEUE_DB，否则为 temp/transcriber-queue.sqlite
+        """
+        default_path = os.path.join(BASE_DIR, 'temp', 'transcriber-queue.sqlite')
+        self.path = path or os.getenv('TRANSCRIBER_QUEUE_DB', default_path)
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    client_id TEXT,
+                    user_id TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    duration REAL,
+                    deadline REAL,
+                    state TEXT NOT NULL,
+                    backend TEXT,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    error TEXT
+                )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)')
+
+    def add(self, client_id, user_id, request, duration, deadline, state='queued', backend=None):
+        """新增任务，返回任务编号"""
+        with self._lock:
+            cursor = self.conn.execute(
+                'INSERT INTO jobs (client_id, user_id, request, duration, deadline, state, backend, enqueued_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (client_id, user_id, json.dumps(request, ensure_ascii=False), duration, deadline, state, backend,
+                 time.time()))
+            return cursor.lastrowid
+
+    def update(self, job_id, **fields):
+        """更新任务字段"""
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self.conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', list(fields.values()) + [job_id])
+
+    def get(self, job_id):
+        with self._lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self, *states):
+        """按状态列出任务（按入队顺序）"""
+        placeholders = ', '.join('?' for _ in states)
+        with self._lock:
+            rows = self.conn.execute(f'SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id', states).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_active(self, client_id):
+        """按调用方的任务ID查找未结束的任务（调用方重启后ID会重复，取最新的）"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE client_id = ? AND state IN ('pending', 'queued', 'running') "
+                                    "ORDER BY id DESC LIMIT 1", (client_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recover(self):
+        """
+        上次退出时未完成的任务按原来的去向恢复：本地任务重新排队，已转交云端的任务保持运行状态，
+        由调度重新提交给云端；调用方已随队列进程断开，不再回复（结果写入转写缓存，重试时直接命中）
+
+        Returns:
+            list: 恢复的任务，已转交云端的任务 backend 为 'cloud'
+        """
+        with self._lock:
+            self.conn.execute("UPDATE jobs SET state = 'queued', client_id = NULL, started_at = NULL "
+                              "WHERE state IN ('pending', 'queued', 'running') AND backend IS NOT 'cloud'")
+            self.conn.execute("UPDATE jobs SET client_id = NULL, started_at = ? "
+                              "WHERE state = 'running' AND backend = 'cloud'", (time.time(),))
+            self.conn.execute("DELETE FROM jobs WHERE state NOT IN ('pending', 'queued', 'running') AND enqueued_at < ?",
+                              (time.time() - RETENTION_SECONDS,))
+            rows = self.conn.execute("SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+class WorkerSlot:
+    """一个常驻工作进程（video_transcriber.py --worker），同一时间只执行一个任务"""
+
+    def __init__(self, index, model_size, threads):
+        self.index = index
+        self.model_size = model_size
+        self.threads = threads
+        self.process = None
+        # 正在执行的任务（发给工作进程的请求ID）
+        self.current = None
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        """启动工作进程并等待模型加载完成（已启动则直接返回）"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        # 每个工作进程只用分到的核，任务之间不互相抢占；并行由队列在任务层面完成
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.threads), TRANSCRIBER_WORKERS='1')
+        self.process = subprocess.Popen([sys.executable, LOCAL_SCRIPT, '--worker', self.model_size],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                        encoding='utf-8', bufsize=1, cwd=BASE_DIR, env=env)
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get('event') == 'ready':
+                print(f"队列工作进程 {self.index} 已就绪 (pid: {message.get('pid')}，"
+                      f"已加载模型: {', '.join(message.get('preloaded') or [])})", file=sys.stderr)
+                return
+        self.process = None
+        raise Exception('工作进程启动失败')
+
+    def run(self, request, on_event=None):
+        """
+        执行一个任务
+
+        Args:
+            request (dict): 发给工作进程的请求（含id）
+            on_event (callable): 工作进程输出的进度事件回调
+
+        Returns:
+            dict: 工作进程返回的结果
+        """
+        try:
+            self.start()
+            self.current = request['id']
+            self.send(request)
+            for line in self.process.stdout:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get('id') != request['id']:
+                    continue
+                if 'event' in message:
+                    if on_event:
+                        on_event(message)
+                    continue
+                return message
+        except (OSError, ValueError) as e:
+            print(f"队列工作进程 {self.index} 通信失败: {e}", file=sys.stderr)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        finally:
+            self.current = None
+        self.process = None
+        return {'success': False, 'error': '工作进程意外退出'}
+
+    def send(self, message):
+        """向工作进程发送一行请求"""
+        with self._write_lock:
+            self.process.stdin.write(json.dumps(message, ensure_ascii=False) + '\n')
+            self.process.stdin.flush()
+
+    def cancel(self, request_id, grace=None):
+        """
+        取消运行中的任务：向工作进程发送取消请求，模型和进程保留给下一个任务；
+        超过grace秒（默认读取TRANSCRIBER_QUEUE_CANCEL_GRACE，默认10）仍未结束时才结束工作进程
+        """
+        grace = grace if grace is not None else float(os.getenv('TRANSCRIBER_QUEUE_CANCEL_GRACE', '10'))
+        try:
+            self.send({'id': request_id, 'op': 'cancel'})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"队列工作进程 {self.index} 发送取消请求失败: {e}", file=sys.stderr)
+            self.kill()
+            return
+
+        def expire():
+            if self.current == request_id:
+                print(f"队列工作进程 {self.index} 取消超时，结束进程", file=sys.stderr)
+                self.kill()
+
+        timer = threading.Timer(grace, expire)
+        timer.daemon = True
+        timer.start()
+
+    def kill(self):
+        """结束工作进程（取消超时时），下一个任务时重新启动"""
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def stop(self):
+        process, self.process = self.process, None
+        if process is not None and process.poll() is None:
+            try:
+                process.stdin.write(json.dumps({'op': 'shutdown'}) + '\n')
+                process.stdin.flush()
+                process.wait(timeout=10)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                process.kill()
+
+class JobScheduler:
+    def __init__(self, store=None, registry=None, slots=None, reply=None, cloud=None, max_queue=None, aging=None):
+        """
+        初始化任务调度
+
+        Args:
+            store (JobStore): 任务存储，默认使用TRANSCRIBER_QUEUE_DB
+            registry (ModelRegistry): 工作进程的模型配置，用于内存和耗时估计
+            slots (int): 同时运行的任务数，默认按CPU和内存计算（见plan_slots）
+            reply (callable): reply(message) 输出响应和事件
+            cloud (bool): 过载时是否转交云端识别，默认读取TRANSCRIBER_QUEUE_CLOUD_FALLBACK且已配置云端密钥
+            max_queue (int): 排队任务数上限，默认读取TRANSCRIBER_QUEUE_MAX（默认为同时运行数的4倍）
+            aging (float): 每等待一秒提前的秒数，默认读取TRANSCRIBER_QUEUE_AGING（默认1）
+        """
+        self.store = store or JobStore()
+        self.registry = registry or ModelRegistry(os.getenv('WHISPER_MODEL_SIZE', 'tiny'))
+        self.slots = plan_slots(self.registry, slots)
+        self.reply = reply or (lambda message: None)
+        if cloud is None:
+            cloud = (os.getenv('TRANSCRIBER_QUEUE_CLOUD_FALLBACK', 'true').lower() not in ('0', 'false', 'no')
+                     and os.path.exists(CLOUD_SCRIPT)
+                     and bool((os.getenv('BAIDU_API_KEY') and os.getenv('BAIDU_SECRET_KEY')) or os.getenv('OPENAI_API_KEY')))
+        self.cloud = cloud
+        self.max_queue = max_queue or int(os.getenv('TRANSCRIBER_QUEUE_MAX', str(self.slots * 4)))
+        self.aging = aging if aging is not None else float(os.getenv('TRANSCRIBER_QUEUE_AGING', '1'))
+        threads = max(1, (os.cpu_count() or 1) // self.slots)
+        self.idle = [WorkerSlot(i, self.registry.default_size, threads) for i in range(self.slots)]
+        self.running = {}
+        # 入队时解析的视频信息（任务编号 -> yt-dlp解析结果），只保存在内存中，任务开始时交给工作进程
+        self.media_info = {}
+        # 实际耗时与估计值之比（指数滑动平均），用于修正排队时间估计
+        self.speed_ratio = 1.0
+        self._lock = threading.RLock()
+        recovered = self.store.recover()
+        self.recovered = len(recovered)
+        for job in recovered:
+            if job['backend'] != 'cloud':
+                continue
+            if self.cloud:
+                # 转交云端的任务仍由云端识别，不占用本地工作进程
+                threading.Thread(target=self._run_cloud, args=(job['id'], None, json.loads(job['request'])),
+                                 daemon=True).start()
+            else:
+                self.store.update(job['id'], state='queued', backend=None, started_at=None)
+
+    def start_workers(self):
+        """
+        并行启动所有工作进程并等待就绪：每个工作进程启动时预加载配置的模型（ModelRegistry.preload），
+        第一个任务不再承担模型加载耗时。启动失败的工作进程在分到任务时重试
+        """
+        def start(slot):
+            try:
+                slot.start()
+            except Exception as e:
+                print(f"队列工作进程 {slot.index} 启动失败，分到任务时重试: {e}", file=sys.stderr)
+
+        with self._lock:
+            slots = list(self.idle)
+        threads = [threading.Thread(target=start, args=(slot,), daemon=True) for slot in slots]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def estimate(self, duration):
+        """预计一个任务的耗时（秒）"""
+        seconds = self.registry.estimate_seconds(self.registry.default_size, duration or DEFAULT_DURATION)
+        return JOB_OVERHEAD_SECONDS + seconds * self.speed_ratio
+
+    def plan(self, queued=None):
+        """当前队列的执行计划（见plan_queue）"""
+        queued = self.store.jobs('queued') if queued is None else queued
+        running = [job for job, _ in self.running.values()]
+        return plan_queue(queued, running, self.slots, self.estimate, aging=self.aging)
+
+    def admit(self, request):
+        """
+        登记任务（状态为pending），在回复调用方之前同步执行，之后同一ID的取消请求都能找到它
+
+        Args:
+            request (dict): 请求，含 id/url|path/user/deadline/duration
+
+        Returns:
+            int: 任务编号
+        """
+        user_id = str(request.get('user') or 'anonymous')
+        job_request = {key: value for key, value in request.items() if key in ('url', 'path', 'deadline', 'events')}
+        return self.store.add(request.get('id'), user_id, job_request, request.get('duration'),
+                              request.get('deadline'), state='pending')
+
+    def submit(self, request, job_id=None):
+        """
+        任务入队（探测时长、排队或转交云端），随后回复排队位置和预计时间
+
+        Args:
+            request (dict): 请求，含 id/url|path/user/deadline/duration
+            job_id (int): admit登记的任务编号，为空时在此登记
+        """
+        if job_id is None:
+            job_id = self.admit(request)
+        client_id = request.get('id')
+        user_id = str(request.get('user') or 'anonymous')
+        duration, info = request.get('duration'), None
+        if not duration:
+            duration, info = probe_request(request)
+        job_request = {key: value for key, value in request.items() if key in ('url', 'path', 'deadline', 'events')}
+
+        with self._lock:
+            current = self.store.get(job_id)
+            if current is None or current['state'] != 'pending':
+                # 探测时长期间已被取消
+                return
+            if info is not None:
+                self.media_info[job_id] = info
+            queued = self.store.jobs('queued')
+            candidate = {'id': None, 'user_id': user_id, 'duration': duration, 'enqueued_at': time.time()}
+            plan = self.plan(queued + [candidate])
+            position, start, finish = next((i + 1, start, finish) for i, (job, start, finish) in enumerate(plan)
+                                           if job is candidate)
+            full = len(queued) >= self.max_queue
+            late = bool(request.get('deadline')) and finish > float(request['deadline'])
+
+            if (full or late) and self.cloud:
+                self.media_info.pop(job_id, None)
+                self.store.update(job_id, duration=duration, state='running', backend='cloud', started_at=time.time())
+                threading.Thread(target=self._run_cloud, args=(job_id, client_id, job_request), daemon=True).start()
+                print(f"队列{'已满' if full else '预计超时'}，任务 {client_id} 转交云端识别", file=sys.stderr)
+                self.reply({'id': client_id, 'event': 'queued', 'state': 'offloaded', 'backend': 'cloud',
+                            'position': 0, 'wait_seconds': 0, 'eta_seconds': None})
+                return
+            if full:
+                self.media_info.pop(job_id, None)
+                self.store.update(job_id, duration=duration, state='failed', finished_at=time.time(),
+                                  error='转写任务过多')
+                self.reply({'id': client_id, 'success': False, 'error': '转写任务过多，请稍后重试'})
+                return
+
+            self.store.update(job_id, duration=duration, state='queued')
+        print(f"任务 {client_id} 入队（用户 {user_id}，时长 {duration or '未知'}秒，第{position}位）", file=sys.stderr)
+        self.reply({'id': client_id, 'event': 'queued', 'state': 'queued', 'backend': 'local', 'position': position,
+                    'wait_seconds': round(start, 1), 'eta_seconds': round(finish, 1), 'slots': self.slots})
+        self.dispatch()
+
+    def dispatch(self):
+        """有空闲工作进程时按计划启动排在最前的任务"""
+        with self._lock:
+            while self.idle:
+                plan = self.plan()
+                if not plan:
+                    return
+                job = plan[0][0]
+                slot = self.idle.pop()
+                job['started_at'] = time.time()
+                self.store.update(job['id'], state='running', backend='local', started_at=job['started_at'])
+                self.running[job['id']] = (job, slot)
+                threading.Thread(target=self._run_local, args=(job, slot), daemon=True).start()
+
+    def _finish(self, job, result, backend):
+        """记录结果并回复调用方（任务已取消或调用方已断开时不回复）"""
+        finished_at = time.time()
+        state = 'done' if result.get('success') else 'failed'
+        current = self.store.get(job['id'])
+        cancelled = current is not None and current['state'] == 'cancelled'
+        if not cancelled:
+            self.store.update(job['id'], state=state, finished_at=finished_at,
+                              error=None if result.get('success') else str(result.get('error')))
+        client_id = job['client_id']
+        if cancelled or client_id is None:
+            return
+        result['id'] = client_id
+        result['queue'] = {
+            'backend': backend,
+            'wait_seconds': round(job['started_at'] - job['enqueued_at'], 1),
+            'run_seconds': round(finished_at - job['started_at'], 1),
+        }
+        self.reply(result)
+
+    def _run_local(self, job, slot):
+        request = dict(json.loads(job['request']), id=str(job['id']))
+        with self._lock:
+            info = self.media_info.pop(job['id'], None)
+        if info is not None:
+            request['info'] = info
+        if request.get('deadline'):
+            # 截止时间从入队时算起，扣除排队等待的时间
+            waited = job['started_at'] - job['enqueued_at']
+            request['deadline'] = max(1.0, float(request['deadline']) - waited)
+
+        def forward(message):
+            # 取消的确认已由队列回复
+            if job['client_id'] is not None and message.get('event') != 'cancelled':
+                self.reply(dict(message, id=job['client_id']))
+
+        result = slot.run(request, forward)
+        with self._lock:
+            self.running.pop(job['id'], None)
+            self.idle.append(slot)
+            if result.get('success') and job['duration']:
+                base = self.registry.estimate_seconds(self.registry.default_size, job['duration'])
+                ratio = (time.time() - job['started_at'] - JOB_OVERHEAD_SECONDS) / max(1.0, base)
+                self.speed_ratio = self.speed_ratio * 0.7 + max(0.1, min(10.0, ratio)) * 0.3
+        self._finish(job, result, 'local')
+        self.dispatch()
+
+    def _run_cloud(self, job_id, client_id, request):
+        command = [sys.executable, CLOUD_SCRIPT]
+        if request.get('deadline'):
+            command += ['--deadline', str(int(float(request['deadline'])))]
+        command.append(request.get('path') or request.get('url'))
+        # 转交云端是为了减轻本机负载，云端脚本不再对冲到本地Whisper
+        env = dict(os.environ, TRANSCRIBER_HEDGE_LOCAL='false')
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, encoding='utf-8',
+                                       cwd=BASE_DIR, env=env)
+            result = _last_json_line(completed.stdout) or {'success': False, 'error': '云端识别没有输出结果'}
+        except (OSError, ValueError) as e:
+            result = {'success': False, 'error': f'云端识别失败: {e}'}
+        self._finish(self.store.get(job_id), result, 'cloud')
+
+    def cancel(self, client_id):
+        """取消任务：排队中的直接移出，运行中的通知其工作进程取消（见WorkerSlot.cancel）"""
+        with self._lock:
+            job = self.store.find_active(client_id)
+            if job is None:
+                return False
+            self.store.update(job['id'], state='cancelled', finished_at=time.time())
+            self.media_info.pop(job['id'], None)
+            running = self.running.get(job['id'])
+            if running is not None:
+                running[1].cancel(str(job['id']))
+        return True
+
+    def status(self):
+        """队列状态：运行数、排队任务的位置和预计时间"""
+        with self._lock:
+            plan = self.plan()
+            running = [job for job, _ in self.running.values()]
+        return {
+            'slots': self.slots,
+            'running': len(running),
+            'queued': len(plan),
+            'pending': len(self.store.jobs('pending')),
+            'cloud_fallback': self.cloud,
+            'jobs': [{'id': job['client_id'], 'user': job['user_id'], 'position': i + 1, 'duration': job['duration'],
+                      'wait_seconds': round(start, 1), 'eta_seconds': round(finish, 1)}
+                     for i, (job, start, finish) in enumerate(plan)],
+        }
+
+    def close(self):
+        with self._lock:
+            slots = self.idle + [slot for _, slot in self.running.values()]
+        for slot in slots:
+            slot.stop()
+
+def serve_queue(scheduler, input_stream=None):
+    """
+    逐行读取请求：转写任务先同步登记，再在后台线程中探测时长并入队，其余操作直接回复
+
+    Args:
+        scheduler (JobScheduler): 任务调度
+        input_stream: 请求输入流，默认stdin
+    """
+    input_stream = input_stream or sys.stdin
+    reply = scheduler.reply
+    # 先启动工作进程并预加载模型，就绪后再接受任务
+    scheduler.start_workers()
+    reply({'event': 'ready', 'model': scheduler.registry.default_size, 'slots': scheduler.slots,
+           'cloud_fallback': scheduler.cloud, 'recovered': scheduler.recovered, 'pid': os.getpid()})
+    print(f"任务队列已就绪 (同时运行{scheduler.slots}个任务，恢复{scheduler.recovered}个未完成任务)", file=sys.stderr)
+    scheduler.dispatch()
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            reply({'success': False, 'error': f'无效的请求: {str(e)}'})
+            continue
+
+        job_id = request.get('id')
+        op = request.get('op', 'transcribe')
+        if op == 'ping':
+            reply({'id': job_id, 'event': 'pong'})
+        elif op == 'status':
+            reply(dict(scheduler.status(), id=job_id, event='status'))
+        elif op == 'cancel':
+            reply({'id': job_id, 'event': 'cancelled', 'cancelled': scheduler.cancel(job_id)})
+        elif op == 'shutdown':
+            reply({'id': job_id, 'event': 'shutdown'})
+            break
+        elif not request.get('url') and not request.get('path'):
+            reply({'id': job_id, 'success': False, 'error': '缺少视频链接', 'invalid': True})
+        else:
+            # 先同步登记，随后的取消请求一定能找到该任务；探测时长和入队在后台线程中进行
+            threading.Thread(target=scheduler.submit, args=(request, scheduler.admit(request)), daemon=True).start()
+
+    print("任务队列退出", file=sys.stderr)
+
+def main():
+    """命令行入口"""
+    lock = threading.Lock()
+
+    def reply(message):
+        with lock:
+            sys.stdout.write(json.dumps(message, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    scheduler = JobScheduler(reply=reply)
+    try:
+        serve_queue(scheduler)
+    finally:
+        scheduler.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段存储
+长视频（如直播回放）有成千上万个分段，逐个保存为字典既占内存又拖慢格式化。
+这里按列存储：起止时间放在 array('d') 中，文字拼接为一个字符串并记录偏移量；
+时间格式化按列批量完成，带时间戳的文本一次拼接生成，输出JSON时才按需生成字典
+"""
+
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+
+class SegmentStore:
+    def __init__(self):
+        """初始化空的分段存储"""
+        self.starts = array('d')
+        self.ends = array('d')
+        self.offsets = array('q', [0])
+        self._parts = []
+        self._buffer = ''
+
+    @classmethod
+    def from_segments(cls, segments):
+        """由Whisper结果中的分段（字典列表）或另一个SegmentStore创建"""
+        if isinstance(segments, SegmentStore):
+            return segments
+        store = cls()
+        store.extend(segments)
+        return store
+
+    def append(self, start, end, text):
+        """追加一个分段（文字去掉首尾空白）"""
+        text = text.strip()
+        self.starts.append(start)
+        self.ends.append(end)
+        self.offsets.append(self.offsets[-1] + len(text))
+        self._parts.append(text)
+
+    def extend(self, segments):
+        """追加多个分段字典，只保留起止时间和文字"""
+        for segment in segments:
+            self.append(segment.get('start', 0), segment.get('end', 0), segment.get('text', ''))
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def buffer(self):
+        """所有分段文字拼接成的字符串（追加后首次访问时合并）"""
+        if self._parts:
+            self._buffer = self._buffer + ''.join(self._parts)
+            self._parts = []
+        return self._buffer
+
+    def text(self, index):
+        """第index个分段的文字"""
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def texts(self):
+        """按顺序返回所有分段文字"""
+        buffer = self.buffer
+        offsets = self.offsets
+        return [buffer[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    def format_times(self, seconds):
+        """
+        批量格式化时间为 MM:SS（分钟超过99时位数随之增加，与逐个格式化的结果相同）
+
+        Args:
+            seconds (array): 秒数
+
+        Returns:
+            list: 格式化后的字符串
+        """
+        values = np.maximum(np.frombuffer(seconds, dtype=np.float64) if len(seconds) else np.zeros(0), 0)
+        minutes = (values // 60).astype(np.int64)
+        secs = (values % 60).astype(np.int64)
+        # 两位数查表，避免逐个调用格式化
+        table = [f'{i:02d}' for i in range(max(60, int(minutes.max()) + 1 if len(minutes) else 0))]
+        return [f'{table[m]}:{table[s]}' for m, s in zip(minutes.tolist(), secs.tolist())]
+
+    def render_timestamped(self, skip_empty=False):
+        """
+        生成带时间戳的文本，每行 "[MM:SS - MM:SS] 文字\\n"，一次拼接完成
+
+        Args:
+            skip_empty (bool): 是否跳过没有文字的分段
+        """
+        starts = self.format_times(self.starts)
+        ends = self.format_times(self.ends)
+        return ''.join(f'[{start} - {end}] {text}\n'
+                       for start, end, text in zip(starts, ends, self.texts())
+                       if text or not skip_empty)
+
+    def view(self):
+        """供JSON输出的只读分段列表视图"""
+        return SegmentView(self)
+
+class SegmentView(Sequence):
+    """按需生成 {'start', 'end', 'text'} 字典的只读序列，不预先创建所有字典"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        store = self.store
+        return {'start': store.starts[index], 'end': store.ends[index], 'text': store.text(index)}
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (list, SegmentView)) else NotImplemented
+
+def json_default(value):
+    """json.dumps的default参数：把分段视图序列化为列表"""
+    if isinstance(value, SegmentView):
+        return list(value)
+    if isinstance(value, SegmentStore):
+        return list(value.view())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重叠分段拼接
+相邻分段共用一段重叠音频：一侧分段边缘被截断的字词，在另一侧分段中位于中间，识别是完整的。
+拼接时对齐重叠区内两侧的文字（difflib），在离重叠区中点最近的公共片段中间切开：
+前一段保留切点之前、后一段保留切点之后的文字，重叠部分的重复文字只保留一份；
+两侧文字对不上（重叠区是静音，或识别结果差异太大）时按时间切在重叠区中点，
+各取中心点在切点同侧的分段
+"""
+
+import difflib
+
+from transcriber_audio import SAMPLE_RATE
+
+# 公共片段少于该字数时不认为是同一段话
+MIN_MATCH_CHARS = 3
+
+def _chars(segments):
+    """重叠区内各分段的有效字符（去掉空白和标点）拼成的字符串，以及每个字符所在的 (分段序号, 文字位置)"""
+    text = []
+    positions = []
+    for i, segment in enumerate(segments):
+        for j, ch in enumerate(segment.get('text', '')):
+            if ch.isalnum():
+                text.append(ch)
+                positions.append((i, j))
+    return ''.join(text), positions
+
+def _char_time(segment, index):
+    """按字数在分段起止时间之间插值，估计第index个字的时间"""
+    text = segment.get('text', '')
+    if not text:
+        return segment['start']
+    return segment['start'] + (segment['end'] - segment['start']) * index / len(text)
+
+def _split(segment, index, keep_head):
+    """在第index个字处切开分段，保留前半（keep_head）或后半，切点时间按字数插值"""
+    cut = _char_time(segment, index)
+    if keep_head:
+        return dict(segment, text=segment['text'][:index], end=cut)
+    return dict(segment, text=segment['text'][index:], start=cut)
+
+def stitch_overlap(tail, head, overlap_start, overlap_end):
+    """
+    合并前一个分段在重叠区内的分段（tail）与后一个分段在重叠区内的分段（head）
+
+    Args:
+        tail (list): 前一个分段中结束于重叠区开始之后的分段（原音频时间）
+        head (list): 后一个分段中开始于重叠区结束之前的分段（原音频时间）
+        overlap_start (float): 重叠区开始（秒），即后一个分段的起点
+        overlap_end (float): 重叠区结束（秒），即前一个分段的终点
+
+    Returns:
+        list: 合并后的分段，重叠部分的文字只出现一次
+    """
+    if not tail or not head:
+        return tail + head
+    middle = (overlap_start + overlap_end) / 2
+
+    tail_text, tail_positions = _chars(tail)
+    head_text, head_positions = _chars(head)
+    matcher = difflib.SequenceMatcher(None, tail_text, head_text, autojunk=False)
+    best = None
+    for block in matcher.get_matching_blocks():
+        if block.size < MIN_MATCH_CHARS:
+            continue
+        # 公共片段的中间字，取时间上离重叠区中点最近的一个
+        offset = block.size // 2
+        i, j = tail_positions[block.a + offset]
+        distance = abs(_char_time(tail[i], j) - middle)
+        if best is None or distance < best[0]:
+            best = (distance, block.a + offset, block.b + offset)
+
+    if best is None:
+        # 文字对不上：按时间在重叠区中点切开，切点附近的分段离两侧分段的边缘都最远
+        left = [segment for segment in tail if (segment['start'] + segment['end']) / 2 < middle]
+        right = [segment for segment in head if (segment['start'] + segment['end']) / 2 >= middle]
+        return left + right
+
+    _, tail_index, head_index = best
+    i, j = tail_positions[tail_index]
+    k, m = head_positions[head_index]
+    left = tail[:i] + ([_split(tail[i], j, True)] if j > 0 else [])
+    right = [_split(head[k], m, False)] + head[k + 1:]
+    return left + right
+
+class SegmentStitcher:
+    def __init__(self, chunks=(), sample_rate=SAMPLE_RATE):
+        """
+        按分段方案逐段拼接识别结果
+
+        分段必须按顺序传入（包括识别失败的分段）；前一个分段落在重叠区内的分段暂不输出，
+        等后一个分段到达、合并后再输出，不重叠的分段方案下与直接拼接相同
+
+        Args:
+            chunks (list): 分段方案，每个分段是若干 (起始样本, 结束样本) 片段（见overlap_chunks）；
+                流式识别时为空，分段确定后用add逐个追加
+            sample_rate (int): 采样率
+        """
+        self.sample_rate = sample_rate
+        # 第k个分段与第k+1个分段的重叠区（秒），不重叠时为None
+        self.overlaps = []
+        self.last = None
+        self.index = 0
+        self.pending = []
+        for pieces in chunks:
+            self.add(pieces)
+
+    def add(self, pieces):
+        """
+        追加下一个分段的方案；一个分段的结果push之前，它的下一个分段须已追加（或已确定没有下一个分段），
+        否则落在重叠区内的分段不会等待合并
+        """
+        if self.last is not None:
+            start, end = pieces[0][0] / float(self.sample_rate), self.last[-1][1] / float(self.sample_rate)
+            self.overlaps.append((start, end) if start < end else None)
+        self.last = pieces
+
+    def push(self, segments):
+        """
+        传入下一个分段的识别结果（原音频时间，识别失败时为None），返回可以输出的分段
+
+        Returns:
+            list: 已确定的分段，按时间顺序
+        """
+        segments = list(segments or [])
+        if self.index > 0:
+            overlap = self.overlaps[self.index - 1]
+            if overlap is not None:
+                start, end = overlap
+                split = next((n for n, segment in enumerate(segments) if segment['start'] >= end), len(segments))
+                segments = stitch_overlap(self.pending, segments[:split], start, end) + segments[split:]
+            else:
+                segments = self.pending + segments
+        self.pending = []
+
+        if self.index < len(self.overlaps) and self.overlaps[self.index] is not None:
+            # 结束于下一个重叠区开始之后的分段，等下一个分段到达后再合并
+            start = self.overlaps[self.index][0]
+            split = next((n for n, segment in enumerate(segments) if segment['end'] > start), len(segments))
+            segments, self.pending = segments[:split], segments[split:]
+        self.index += 1
+        return segments
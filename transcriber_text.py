@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+繁简转换
+所有分段文字拼接后一次性转换再拆回，完整文本由转换后的分段拼出，不再重复转换；
+重复出现的分段（如口头禅、片尾语）通过有界缓存直接复用结果。本地版和云端版共用
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from opencc import OpenCC
+
+# 拼接分隔符：OpenCC把空白视为句子分隔符，词组不会跨过它匹配，转换前后保持不变
+SENTINEL = '\n'
+
+class BatchConverter:
+    def __init__(self, conversion='t2s', cache_size=None):
+        """
+        初始化批量转换器
+
+        Args:
+            conversion (str): OpenCC转换配置，默认繁体转简体
+            cache_size (int): 缓存的分段数上限，默认读取TRANSCRIBER_OPENCC_CACHE（默认4096，0为不缓存）
+        """
+        self.cc = OpenCC(conversion)
+        if cache_size is None:
+            cache_size = int(os.getenv('TRANSCRIBER_OPENCC_CACHE', '4096'))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def convert(self, text):
+        """转换单段文字（与OpenCC.convert相同）"""
+        return self.convert_many([text])[0]
+
+    def convert_many(self, texts):
+        """
+        批量转换
+
+        Args:
+            texts (list): 文字列表
+
+        Returns:
+            list: 转换后的文字，顺序与输入相同
+        """
+        results = [None] * len(texts)
+        missing = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                if not text:
+                    results[i] = text
+                    continue
+                cached = self._cache.get(text)
+                if cached is not None:
+                    self._cache.move_to_end(text)
+                    self.stats['hits'] += 1
+                    results[i] = cached
+                else:
+                    self.stats['misses'] += 1
+                    missing.setdefault(text, []).append(i)
+
+        if not missing:
+            return results
+
+        sources = list(missing)
+        converted = None
+        if not any(SENTINEL in text for text in sources):
+            converted = self.cc.convert(SENTINEL.join(sources)).split(SENTINEL)
+        if converted is None or len(converted) != len(sources):
+            # 文字本身含分隔符时逐段转换
+            converted = [self.cc.convert(text) for text in sources]
+
+        with self._lock:
+            for source, target in zip(sources, converted):
+                for i in missing[source]:
+                    results[i] = target
+                if self.cache_size > 0:
+                    self._cache[source] = target
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return results
+
+    def convert_segments(self, segments):
+        """
+        原地转换Whisper分段的文字，返回由转换后的分段拼出的完整文本
+
+        Args:
+            segments (list): Whisper结果中的分段（含 'text' 键的字典）
+
+        Returns:
+            str: 完整文本（与Whisper的 text 字段相同，为各分段文字直接拼接）
+        """
+        texts = self.convert_many([segment.get('text', '') for segment in segments])
+        for segment, text in zip(segments, texts):
+            if 'text' in segment:
+                segment['text'] = text
+        return ''.join(texts)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+云端识别的流式上传
+请求体按块生成后直接写入连接，不在内存中拼出完整的base64字符串、JSON或multipart请求体；
+请求体长度预先算出，以Content-Length发送（部分接口不接受分块传输编码）
+"""
+
+import os
+import json
+import base64
+import binascii
+import uuid
+
+import numpy as np
+
+# 每次编码/读取的块大小，base64按3字节对齐
+CHUNK_BYTES = 3 * 64 * 1024
+
+def pcm16_pieces(audio, pieces, block_samples=CHUNK_BYTES // 2):
+    """
+    逐块把float32音频片段转换为16位小端PCM字节，不生成整段的浮点或整数副本
+
+    Args:
+        audio (numpy.ndarray): 16kHz float32音频
+        pieces (list): (起始样本, 结束样本) 片段列表
+        block_samples (int): 每块的样本数
+
+    Yields:
+        bytes: PCM数据块
+    """
+    for start, end in pieces:
+        for offset in range(start, end, block_samples):
+            block = audio[offset:min(end, offset + block_samples)]
+            yield (np.clip(block, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+class RawBody:
+    """原始字节请求体（如百度的 audio/pcm 上传方式），由数据块迭代器生成"""
+
+    def __init__(self, chunks, length, content_type):
+        self.chunks = chunks
+        self.length = length
+        self.content_type = content_type
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+class Base64JSONBody:
+    """
+    一个字段为base64数据的JSON请求体：其余字段先序列化，base64部分按块编码后写入
+
+    要求数据块（最后一块除外）长度为3的倍数，这样各块的编码结果可以直接拼接
+    """
+
+    def __init__(self, fields, key, chunks, data_length):
+        """
+        Args:
+            fields (dict): 其他JSON字段
+            key (str): base64数据所在的字段名
+            chunks (iterable): 原始数据块
+            data_length (int): 原始数据总字节数
+        """
+        head = json.dumps(fields, ensure_ascii=False)[:-1]
+        self.prefix = (head + (', ' if fields else '') + json.dumps(key) + ': "').encode('utf-8')
+        self.suffix = b'"}'
+        self.chunks = chunks
+        self.length = len(self.prefix) + 4 * ((data_length + 2) // 3) + len(self.suffix)
+        self.content_type = 'application/json'
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.prefix
+        pending = b''
+        for chunk in self.chunks:
+            if pending:
+                chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % 3
+            pending = chunk[usable:]
+            if usable:
+                yield binascii.b2a_base64(chunk[:usable], newline=False)
+        if pending:
+            yield base64.b64encode(pending)
+        yield self.suffix
+
+class MultipartFileBody:
+    """只含普通字段和一个文件的multipart/form-data请求体，文件按块读取"""
+
+    def __init__(self, fields, file_field, path, filename=None, file_type='application/octet-stream'):
+        """
+        Args:
+            fields (dict): 普通表单字段
+            file_field (str): 文件字段名
+            path (str): 文件路径
+            filename (str): 上传的文件名，默认为路径中的文件名
+            file_type (str): 文件的Content-Type
+        """
+        boundary = uuid.uuid4().hex
+        parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                 for name, value in fields.items()]
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                     f'filename="{filename or os.path.basename(path)}"\r\nContent-Type: {file_type}\r\n\r\n')
+        self.prefix = ''.join(parts).encode('utf-8')
+        self.suffix = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.path = path
+        self.length = len(self.prefix) + os.path.getsize(path) + len(self.suffix)
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.prefix
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.suffix
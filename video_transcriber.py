@@ -8,13 +8,43 @@
 import os
 import sys
 import json
-import tempfile
-import shutil
-from pathlib import Path
+import time
+
+# 统计重量级依赖（torch/whisper/yt_dlp）的导入耗时
+_import_wall_start = time.perf_counter()
+_import_cpu_start = time.process_time()
+
+import threading
+import contextlib
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import yt_dlp
 import whisper
 import logging
-from opencc import OpenCC
+from transcriber_audio import (
+    SAMPLE_RATE, decode_audio, stream_decode_audio, open_pcm, audio_duration,
+    detect_speech_regions, pack_speech_regions, overlap_chunks, chunk_audio, chunk_time_to_source
+)
+from transcriber_cache import TranscriptCache, audio_fingerprint, decoder_satisfies, canonicalize_url
+from transcriber_batch import read_url_list, run_batch
+from transcriber_events import EventReporter
+from transcriber_input import MediaInput
+from transcriber_download import download_audio, resolve_audio_stream
+from transcriber_models import ModelRegistry, quantize_model
+from transcriber_policy import decode_options, plan_policy, describe_policy
+from transcriber_metrics import JobMetrics, peak_rss_mb, available_memory_mb, write_prometheus
+from transcriber_text import BatchConverter
+from transcriber_segments import SegmentStore, json_default
+from transcriber_job import JobContext, JobCancelled, install_workspace_cleanup
+from transcriber_journal import ChunkJournal, decoder_key, stream_key
+from transcriber_batching import BatchedInference
+from transcriber_backends import create_local_backend
+from transcriber_stitch import SegmentStitcher
+
+IMPORT_WALL_SECONDS = time.perf_counter() - _import_wall_start
+IMPORT_CPU_SECONDS = time.process_time() - _import_cpu_start
 
 # 设置日志 - 只在开发时输出到stderr，生产时静默
 import warnings
@@ -28,265 +58,599 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 没有截止时间时使用的解码参数 - 极致优化速度（见transcriber_policy）
+BEAM_SIZE = int(os.getenv('TRANSCRIBER_BEAM_SIZE', '1'))
+CHUNK_TRANSCRIBE_OPTIONS = decode_options('fast', BEAM_SIZE)
+
+
+# 转换子进程中常驻的模型（每个子进程一份）
+_worker_model = None
+
+# fork方式启动转换进程前由主进程设置，子进程直接继承已加载的模型（写时复制共享权重）
+_inherited_models = {}
+
+def _init_chunk_worker(model_size, num_threads, quantize=False):
+    """进程池初始化：限制线程数，优先使用从主进程继承的模型，否则自行加载"""
+    global _worker_model
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_model = _inherited_models.get(model_size)
+    if _worker_model is None:
+        _worker_model = whisper.load_model(model_size, device='cpu')
+        if quantize:
+            _worker_model = quantize_model(_worker_model)
+
+def _warm_worker():
+    """空任务，用于在创建进程池时立即启动全部子进程"""
+    return os.getpid()
+
+def _transcribe_in_worker(audio, decode_wall=0.0, options=None):
+    """在子进程中识别并附带本进程的耗时统计（'_metrics'），由主进程汇总"""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = _worker_model.transcribe(audio, **(options or CHUNK_TRANSCRIBE_OPTIONS))
+    result['_metrics'] = {
+        'chunk_decode_wall': decode_wall,
+        'inference_wall': time.perf_counter() - wall_start,
+        'inference_cpu': time.process_time() - cpu_start,
+        'rss_mb': peak_rss_mb()
+    }
+    return result
+
+def _transcribe_chunk_worker(pcm_path, pieces, options=None):
+    """在子进程中转换一个分段，音频通过内存映射读取，返回Whisper原始结果（时间戳相对分段起点）"""
+    decode_start = time.perf_counter()
+    audio = chunk_audio(open_pcm(pcm_path), pieces)
+    return _transcribe_in_worker(audio, time.perf_counter() - decode_start, options)
+
+def _transcribe_array_worker(audio, options=None):
+    """在子进程中转换一段已经取出的音频（流式处理时使用）"""
+    return _transcribe_in_worker(audio, options=options)
+
 class VideoTranscriber:
-    def __init__(self, model_size="tiny"):  # 默认使用最小模型提高速度
+    def __init__(self, model_size=None, workers=None):
         """
         初始化视频转文字工具
         
         Args:
-            model_size (str): Whisper模型大小 (tiny, base, small, medium, large)
+            model_size (str): 默认的Whisper模型大小 (tiny, base, small, medium, large)，
+                              默认读取WHISPER_MODEL_SIZE，否则使用最小模型提高速度
+            workers (int|str): 分段并行转换的进程数，"auto"按CPU核数，默认读取TRANSCRIBER_WORKERS
         """
-        self.model_size = model_size
-        self.model = None
-        self.temp_dir = None
+        self.model_size = model_size or os.getenv('WHISPER_MODEL_SIZE', 'tiny')
+        # 模型管理：预加载、量化和模型速度估计；模型在所有任务间共用
+        self.models = ModelRegistry(default_size=self.model_size)
+        # 识别引擎（TRANSCRIBER_BACKEND）：openai-whisper 或 faster-whisper，模型速度估计按引擎调整
+        self.backend = create_local_backend(self.models, BatchedInference(self.models))
+        self.models.scale_speed(self.backend.time_ratio)
+        # 批量推理（仅openai-whisper）：多个分段（包括同时运行的不同任务）的窗口合成一批编码和解码
+        self.batcher = getattr(self.backend, 'batcher', None)
+        # 默认的任务截止时间（秒）：据此选择模型、分段和解码参数，单个任务可覆盖（见new_job）
+        deadline = os.getenv('TRANSCRIBER_DEADLINE')
+        self.deadline = float(deadline) if deadline else None
+        # 转换进程以fork方式启动，共享主进程已加载的模型权重
+        self.share_weights = (os.getenv('TRANSCRIBER_SHARE_WEIGHTS', 'true').lower() not in ('0', 'false', 'no')
+                              and 'fork' in multiprocessing.get_all_start_methods())
+        self.workers = workers if workers is not None else os.getenv('TRANSCRIBER_WORKERS', '1')
+        # 是否以流水线方式边下载边识别
+        self.stream = os.getenv('TRANSCRIBER_STREAM', 'false').lower() in ('1', 'true', 'yes')
+        # 是否在送入模型前用语音活动检测跳过静音/纯音乐
+        self.vad = os.getenv('TRANSCRIBER_VAD', 'true').lower() not in ('0', 'false', 'no')
+        # 分段时长和相邻分段的重叠时长（秒）：有重叠时边界处的识别结果按文字对齐合并，可以使用10~15秒的短分段
+        self.chunk_duration = float(os.getenv('TRANSCRIBER_CHUNK_SECONDS', '60'))
+        self.chunk_overlap = float(os.getenv('TRANSCRIBER_CHUNK_OVERLAP', '0'))
+        # 进程池在任务间共用，_pool_users为正在使用它的任务数
+        self._pool = None
+        self._pool_size = 0
+        self._pool_model = None
+        self._pool_users = 0
+        self._pool_lock = threading.Lock()
+        # 转写结果缓存（与云端版共用同一目录）
+        self.cache = TranscriptCache()
+        # 分段识别日志：任务被中断后重新提交时只识别缺少的分段
+        self.journal = ChunkJournal()
+        # 启动阶段的统计（依赖导入、不属于任何任务的模型加载），归入第一个任务
+        self.startup_metrics = JobMetrics()
+        self.startup_metrics.record('import', IMPORT_WALL_SECONDS, IMPORT_CPU_SECONDS)
+        self._import_reported = False
+        self._job_lock = threading.Lock()
+        self.metrics_file = os.getenv('TRANSCRIBER_METRICS_FILE')
         # 初始化繁简转换器
-        self.cc = OpenCC('t2s')  # 繁体转简体
+        self.cc = BatchConverter('t2s')  # 繁体转简体（批量转换并缓存重复分段）
+        
+    def new_job(self, job_id=None, deadline=None, events=None):
+        """
+        创建一个任务上下文，任务的工作目录、事件、统计和识别参数都放在其中
         
-    def load_model(self):
-        """加载Whisper模型"""
-        if self.model is None:
-            print(f"正在加载Whisper模型: {self.model_size}", file=sys.stderr)
-            self.model = whisper.load_model(self.model_size)
-            print("Whisper模型加载完成", file=sys.stderr)
+        Args:
+            job_id (str): 任务ID
+            deadline (float): 本任务的截止时间（秒），默认使用初始化时的配置
+            events (EventReporter): 进度事件输出，默认只向stderr打印提示
+            
+        Returns:
+            JobContext: 任务上下文
+        """
+        metrics = None
+        with self._job_lock:
+            if not self._import_reported:
+                # 构造时记录的导入/模型加载耗时归入第一个任务
+                self._import_reported = True
+                metrics = self.startup_metrics
+        return JobContext(job_id, deadline if deadline is not None else self.deadline, events, metrics,
+                          self.model_size, CHUNK_TRANSCRIBE_OPTIONS)
+    
+    def load_model(self, job=None):
+        """加载默认的Whisper模型（同时预加载配置的其他模型），耗时计入任务或启动阶段的统计"""
+        if self.backend.is_loaded(self.model_size):
+            return
+        metrics = job.metrics if job is not None else self.startup_metrics
+        with metrics.stage('model_load'):
+            self.backend.preload(self.models.preload_sizes)
+            self.backend.load(self.model_size)
     
-    def download_video(self, url, output_path):
+    def use_model(self, job, model_size):
+        """切换任务使用的模型，未加载时加载（不影响其他任务）"""
+        job.model_size = model_size
+        if not self.backend.is_loaded(model_size):
+            with job.metrics.stage('model_load'):
+                self.backend.load(model_size)
+    
+    def infer(self, job, audio, **options):
+        """
+        在当前进程中用任务的模型识别一段音频（文件路径或PCM数组），由配置的识别引擎执行（见transcriber_backends）
         """
-        下载视频
+        return self.backend.transcribe(audio, job, **options)
+    
+    def apply_policy(self, job, audio_seconds, workers=1, chunk_duration=60):
+        """
+        按截止时间和音频时长选择本任务的模型、分段长度和解码参数，并记录到任务统计
         
         Args:
-            url (str): 视频链接
-            output_path (str): 输出路径
+            job (JobContext): 任务上下文
+            audio_seconds (float): 音频时长（秒）
+            workers (int): 可用的并行进程数
+            chunk_duration (int): 没有截止时间时的分段长度
             
         Returns:
-            str: 下载的视频文件路径
-        """
-        # #logger.info(f"开始下载视频: {url}")  # 静默模式
-        
-        # 配置yt-dlp选项 - 极致优化为最快速度和最小文件
-        ydl_opts = {
-            'format': 'worstaudio/worst',  # 只要最低质量音频
-            'outtmpl': os.path.join(output_path, 'video.%(ext)s'),
-            'extractaudio': True,   # 只提取音频，更快
-            'audioformat': 'wav',   # 使用wav格式
-            'quiet': True,
-            'no_warnings': True,
-            'no_check_certificate': True,  # 跳过SSL验证加速
-            'socket_timeout': 30,   # 设置超时
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-                'preferredquality': '64',  # 64kbps，大幅减少数据量
-            }],
+            dict: 策略（见transcriber_policy.plan_policy）
+        """
+        policy = plan_policy(audio_seconds, job.deadline, self.models, workers=workers,
+                             elapsed_seconds=time.perf_counter() - job.started,
+                             default_chunk_duration=chunk_duration, beam_size=BEAM_SIZE)
+        if job.deadline:
+            print(f"识别策略: {policy['name']}，模型{policy['model']}，预计{policy['estimated_seconds']}秒"
+                  f"（音频{audio_seconds:.0f}秒，截止时间{job.deadline:.0f}秒）", file=sys.stderr)
+        job.metrics.info['policy'] = describe_policy(policy)
+        job.policy = policy
+        job.decode_options = policy['decode_options']
+        self.use_model(job, policy['model'])
+        return policy
+    
+    def job_decoder(self, job):
+        """任务实际使用的模型、解码档位和识别参数键，随文字稿写入缓存"""
+        return {
+            'model': job.model_size,
+            # 沿用分段日志中的参数时没有策略，按最快档位记录（只会让缓存更少被使用）
+            'tier': job.policy['name'] if job.policy else 'fast',
+            'key': decoder_key(self.backend.model_key(job.model_size), job.decode_options, self.models.quantize)
         }
+    
+    def cache_accept(self, job):
+        """
+        缓存查找的检查函数：按缓存文字稿的音频时长和任务的截止时间计算本任务会选择的模型和档位，
+        缓存的识别参数不低于它时才直接使用（见transcriber_cache.decoder_satisfies）
+        """
+        def accept(decoder, data):
+            audio_seconds = data.get('duration') or 0
+            workers = self.plan_workers(os.cpu_count() or 1, None, job.model_size)
+            policy = plan_policy(audio_seconds, job.deadline, self.models, workers=workers,
+                                 elapsed_seconds=time.perf_counter() - job.started,
+                                 default_chunk_duration=self.chunk_duration, beam_size=BEAM_SIZE)
+            wanted = {'model': policy['model'], 'tier': policy['name'],
+                      'key': decoder_key(self.backend.model_key(policy['model']), policy['decode_options'],
+                                         self.models.quantize)}
+            return decoder_satisfies(decoder, wanted)
+        return accept
+    
+    def finish_job_metrics(self, job, result):
+        """把统计写入结果的 metrics 字段，并按配置写出Prometheus文本文件"""
+        summary = job.metrics.summary()
+        summary['model'] = job.model_size
+        summary['backend'] = self.backend.name
+        result['metrics'] = summary
+        if self.metrics_file:
+            try:
+                write_prometheus(self.metrics_file, summary, {'backend': self.backend.name, 'model': job.model_size})
+            except OSError as e:
+                print(f"写入指标文件失败: {e}", file=sys.stderr)
+        return result
+    
+    def download_video(self, job, url, output_path, info=None):
+        """
+        下载视频音频（yt-dlp只解析一次，下载原始音频流，不转换为WAV）
         
+        Args:
+            job (JobContext): 任务上下文
+            url (str): 视频链接
+            output_path (str): 输出路径
+            info (dict): 任务队列已解析的视频信息，给出时不再解析页面
+            
+        Returns:
+            tuple: (下载的文件路径, 标题, 时长)
+        """
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # 获取视频信息
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown')
-                duration = info.get('duration', 0)
-                
-                #logger.info(f"视频标题: {title}")
-                #logger.info(f"视频时长: {duration}秒")
-                
-                # 下载视频
-                ydl.download([url])
-                
-                # 查找下载的文件
-                for file in os.listdir(output_path):
-                    if file.startswith('video.'):
-                        video_path = os.path.join(output_path, file)
-                        #logger.info(f"视频下载完成: {video_path}")
-                        return video_path, title, duration
-                        
+            with job.metrics.stage('download'):
+                media = download_audio(url, output_path, info=info)
         except Exception as e:
             logger.error(f"下载视频失败: {str(e)}")
             raise
         
-        raise Exception("未找到下载的视频文件")
+        job.metrics.info['media'] = {key: media[key] for key in ('ext', 'format_id', 'filesize', 'extractor')}
+        return media['path'], media['title'], media['duration']
     
-    def transcribe_audio(self, video_path):
+    def resolve_stream(self, job, url, info=None):
+        """
+        只解析视频信息，不下载，返回可供ffmpeg直接读取的音频直链
+        
+        Args:
+            job (JobContext): 任务上下文
+            url (str): 视频链接
+            info (dict): 任务队列已解析的视频信息，给出时不再解析页面
+            
+        Returns:
+            tuple: (媒体直链, HTTP请求头, 标题, 时长)
+        """
+        with job.metrics.stage('metadata'):
+            media = resolve_audio_stream(url, info=info)
+        return media['url'], media['headers'], media['title'], media['duration']
+    
+    def transcribe_audio(self, video_path, job=None):
         """
         转换音频为文字
         
         Args:
             video_path (str): 视频文件路径
+            job (JobContext): 任务上下文，默认新建
             
         Returns:
             dict: 转换结果
         """
         #logger.info("开始转换语音为文字...")
+        job = job or self.new_job()
         
         try:
             # 加载模型
-            self.load_model()
+            self.use_model(job, job.model_size)
             
-            # 添加进度回调函数
-            import time
             start_time = time.time()
-            last_progress_time = start_time
-            
-            def progress_callback(chunk_idx, total_chunks):
-                nonlocal last_progress_time
-                current_time = time.time()
-                if current_time - last_progress_time >= 10:  # 每10秒输出一次进度
-                    elapsed = current_time - start_time
-                    progress = (chunk_idx / total_chunks) * 100 if total_chunks > 0 else 0
-                    print(f"语音识别进度: {progress:.1f}% ({chunk_idx}/{total_chunks}), 已用时: {elapsed:.1f}秒", file=sys.stderr)
-                    last_progress_time = current_time
-            
-            print(f"开始Whisper转换，预计处理帧数: 约{27483}帧", file=sys.stderr)
-            
-            # 转换 - 极致优化参数提高速度
-            result = self.model.transcribe(
-                video_path,
-                language="zh",  # 中文
-                task="transcribe",
-                verbose=True,  # 开启详细输出以便调试
-                fp16=False,  # 禁用fp16以提高兼容性
-                temperature=0,  # 使用确定性解码，更快
-                compression_ratio_threshold=2.4,  # 降低阈值
-                logprob_threshold=-1.0,  # 降低阈值
-                no_speech_threshold=0.6,  # 提高阈值，跳过静音部分
-                beam_size=1,  # 单束搜索，最快速度
-                best_of=1,  # 只生成一个候选
-                word_timestamps=False,  # 禁用单词时间戳
-                condition_on_previous_text=False  # 不依赖前文，更快
-            )
+            
+            if not isinstance(video_path, str):
+                job.metrics.audio_seconds = audio_duration(video_path)
+                print(f"开始Whisper转换，音频时长: {job.metrics.audio_seconds:.1f}秒", file=sys.stderr)
+            else:
+                print("开始Whisper转换", file=sys.stderr)
+            
+            # 转换 - 使用当前策略的解码参数，开启详细输出以便调试
+            result = self.infer(job, video_path, verbose=True)
             
             end_time = time.time()
             total_time = end_time - start_time
             print(f"Whisper处理完成，总用时: {total_time:.1f}秒", file=sys.stderr)
             
-            # 将繁体转换为简体
-            if 'text' in result:
-                result['text'] = self.cc.convert(result['text'])
-            
+            # 将繁体转换为简体：分段一次性批量转换，完整文本由分段拼出
+            with job.metrics.stage('opencc'):
+                if result.get('segments'):
+                    result['text'] = self.cc.convert_segments(result['segments'])
+                elif 'text' in result:
+                    result['text'] = self.cc.convert(result['text'])
             if 'segments' in result:
-                for segment in result['segments']:
-                    if 'text' in segment:
-                        segment['text'] = self.cc.convert(segment['text'])
+                job.events.segments(result['segments'])
             
             #logger.info("语音转换完成")
             return result
             
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"语音转换失败: {str(e)}")
             raise
     
-    def transcribe_audio_chunked(self, video_path, chunk_duration=60):
+    def plan_workers(self, num_chunks, workers=None, model_size=None):
+        """
+        根据配置、CPU核数和可用内存计算并行进程数
+        
+        Args:
+            num_chunks (int): 分段数量
+            workers (int|str): 期望的进程数，"auto"表示按CPU核数
+            model_size (str): 使用的模型，默认为初始化时的模型
+            
+        Returns:
+            int: 实际使用的进程数（1表示串行）
+        """
+        # 自带多线程的引擎（faster-whisper）不使用进程池
+        if not self.backend.parallel:
+            return 1
+        workers = self.workers if workers is None else workers
+        cpu_count = os.cpu_count() or 1
+        if str(workers).lower() == 'auto':
+            workers = cpu_count
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            workers = 1
+        
+        workers = max(1, min(workers, cpu_count, num_chunks))
+        
+        # 每个进程持有一份模型，按内存预算限制进程数；fork共享权重时只计算推理时的额外内存
+        per_worker_mb = self.models.memory_mb(model_size or self.model_size)
+        if self.share_weights:
+            per_worker_mb = max(1, per_worker_mb // 4)
+        budget_mb = os.getenv('TRANSCRIBER_MAX_MEMORY_MB')
+        if budget_mb:
+            budget_mb = int(budget_mb)
+        else:
+            available_mb = available_memory_mb()
+            budget_mb = int(available_mb * 0.8) if available_mb else None
+        if budget_mb:
+            workers = max(1, min(workers, budget_mb // per_worker_mb))
+        
+        return workers
+    
+    @contextlib.contextmanager
+    def lease_pool(self, job, workers):
+        """
+        借用分段转换进程池，进程池在多次任务间复用（进程数或模型变化时重建）
+        
+        其他任务正在使用的进程池不会被重建：模型相同时直接共用，模型不同时返回None，
+        由调用方在当前进程中逐段识别
+        
+        Yields:
+            ProcessPoolExecutor: 进程池，或None
+        """
+        with self._pool_lock:
+            stale = self._pool is not None and (self._pool_size != workers or self._pool_model != job.model_size)
+            if stale and self._pool_users:
+                pool = self._pool if self._pool_model == job.model_size else None
+            else:
+                if stale:
+                    self._shutdown_pool()
+                if self._pool is None:
+                    self._start_pool(job, workers)
+                pool = self._pool
+            if pool is not None:
+                self._pool_users += 1
+        try:
+            yield pool
+        finally:
+            if pool is not None:
+                with self._pool_lock:
+                    self._pool_users -= 1
+    
+    def _start_pool(self, job, workers):
+        """创建进程池（调用方持有_pool_lock）"""
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        if self.share_weights:
+            # fork出的子进程继承已加载的模型，权重页在只读访问时不会被复制
+            self.use_model(job, job.model_size)
+            _inherited_models.clear()
+            _inherited_models[job.model_size] = self.models.get(job.model_size)
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context('spawn')
+        print(f"启动{workers}个转换进程，每个进程{num_threads}个线程"
+              f"（{'共享主进程模型' if self.share_weights else '各自加载模型'}）", file=sys.stderr)
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_chunk_worker,
+            initargs=(job.model_size, num_threads, self.models.quantize)
+        )
+        self._pool_size = workers
+        self._pool_model = job.model_size
+        if self.share_weights:
+            # fork方式在第一次提交任务时一次性启动全部子进程，趁主进程空闲时完成
+            self._pool.submit(_warm_worker).result()
+    
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            self._pool_size = 0
+            self._pool_model = None
+    
+    def close(self):
+        """关闭进程池，释放子进程中的模型"""
+        with self._pool_lock:
+            self._shutdown_pool()
+    
+    def plan_chunks(self, job, audio, chunk_duration, vad):
+        """
+        规划分段
+        
+        Args:
+            job (JobContext): 任务上下文
+            audio (numpy.ndarray): 解码后的音频
+            chunk_duration (int): 每段的最大时长（秒），含与前一段重叠的部分
+            vad (bool): 是否按语音活动检测切分并跳过非语音部分
+            
+        Returns:
+            tuple: (分段列表, 跳过的秒数)，每个分段是若干 (起始样本, 结束样本) 片段
+        """
+        # 重叠不超过分段的一半，每个分段至少有一半是新的音频
+        overlap_samples = int(min(self.chunk_overlap, chunk_duration / 2) * SAMPLE_RATE)
+        chunk_samples = int(chunk_duration * SAMPLE_RATE) - overlap_samples
+        
+        if not vad:
+            chunks = [[(start, min(start + chunk_samples, len(audio)))]
+                      for start in range(0, len(audio), chunk_samples)]
+            return overlap_chunks(chunks, overlap_samples), 0.0
+        
+        with job.metrics.stage('vad'):
+            regions = detect_speech_regions(audio)
+        speech_samples = sum(end - start for start, end in regions)
+        skipped_seconds = (len(audio) - speech_samples) / SAMPLE_RATE
+        return overlap_chunks(pack_speech_regions(audio, regions, chunk_samples), overlap_samples), skipped_seconds
+    
+    def load_audio(self, job, source, workers=None, pcm_dir=None):
+        """
+        一次性解码音频
+        
+        Args:
+            job (JobContext): 任务上下文
+            source (str|MediaInput): 视频文件路径，或本地文件/字节流/PCM输入
+            workers (int|str): 并行进程数，多进程时解码到内存映射文件供子进程共享
+            pcm_dir (str): 内存映射文件所在目录，默认与视频文件相同
+            
+        Returns:
+            tuple: (音频数组, PCM文件路径或None)
+        """
+        if not isinstance(source, MediaInput):
+            pcm_dir = pcm_dir or os.path.dirname(source)
+            source = MediaInput('path', source)
+        # 解码前还不知道分段数，先按CPU核数估算是否会用到多进程
+        workers = self.plan_workers(os.cpu_count() or 1, workers, job.model_size)
+        pcm_path = os.path.join(pcm_dir, 'audio.f32') if workers > 1 and pcm_dir else None
+        with job.metrics.stage('decode'):
+            audio = source.decode(pcm_path=pcm_path)
+        return audio, pcm_path
+    
+    def transcribe_audio_chunked(self, video_path, chunk_duration=None, workers=None, vad=None,
+                                 audio=None, pcm_path=None, job=None, audio_hash=None):
         """
         分段处理音频以提高速度和稳定性
         
+        音频只解码一次，各分段直接是PCM数组的切片，不再逐段调用ffmpeg写临时文件。
+        开启语音活动检测时在停顿处切分，静音和纯音乐片段不送入模型。
+        配置了分段重叠（TRANSCRIBER_CHUNK_OVERLAP）时相邻分段共用一段音频，
+        边界两侧的结果按时间戳和文字对齐合并，去掉重复的文字（见transcriber_stitch）。
+        每个分段完成后写入分段日志（见transcriber_journal）：同一音频上次被中断时，
+        沿用上次的分段方案、模型和解码参数，只识别缺少的分段。
+        
         Args:
-            video_path (str): 视频文件路径
-            chunk_duration (int): 每段的时长（秒）
+            video_path (str): 视频文件路径，直接传入audio时可为空
+            chunk_duration (int): 每段的时长（秒），默认使用初始化时的配置
+            workers (int|str): 并行进程数，默认使用初始化时的配置
+            vad (bool): 是否启用语音活动检测，默认使用初始化时的配置
+            audio (numpy.ndarray): 已解码的音频（load_audio的结果），为空时在此解码
+            pcm_path (str): 已解码音频对应的内存映射文件，多进程转换时需要
+            job (JobContext): 任务上下文，默认新建
+            audio_hash (str): 音频哈希（audio_fingerprint），为空时在此计算
             
         Returns:
-            dict: 转换结果
+            dict: 转换结果；有分段识别失败时 partial 为True，failed_chunks 为失败的分段数
         """
-        import time
-        import subprocess
-        import os
         
         start_time = time.time()
+        job = job or self.new_job()
         
         try:
-            # 加载模型
-            self.load_model()
+            # 一次性解码音频；多进程时写入内存映射文件，供子进程零拷贝读取
+            if audio is None:
+                try:
+                    audio, pcm_path = self.load_audio(job, video_path, workers)
+                except Exception as decode_error:
+                    # 如果解码失败，回退到原始方法
+                    print(f"音频解码失败: {decode_error}，使用原始处理方法", file=sys.stderr)
+                    return self.transcribe_audio(video_path, job)
+            total_duration = audio_duration(audio)
+            job.metrics.audio_seconds = total_duration
             
-            # 获取音频总时长
-            try:
-                cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', 
-                       '-of', 'csv=p=0', video_path]
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                total_duration = float(result.stdout.strip()) if result.stdout.strip() else 0
-            except:
-                # 如果ffprobe失败，回退到原始方法
-                print("无法获取音频时长，使用原始处理方法", file=sys.stderr)
-                return self.transcribe_audio(video_path)
-            
-            print(f"音频总时长: {total_duration:.1f}秒，将分{int(total_duration/chunk_duration)+1}段处理", file=sys.stderr)
-            
-            # 如果视频很短，直接使用原始方法
-            if total_duration <= chunk_duration:
-                print("视频较短，使用原始方法处理", file=sys.stderr)
-                return self.transcribe_audio(video_path)
-            
-            # 计算分段数量
-            num_chunks = int(total_duration / chunk_duration) + 1
-            
-            all_segments = []
-            full_text_parts = []
+            # 只有解码到内存映射文件时子进程才能共享音频
+            workers = self.plan_workers(os.cpu_count() or 1, workers, job.model_size) if pcm_path else 1
             
-            for i in range(num_chunks):
-                chunk_start = i * chunk_duration
-                chunk_end = min((i + 1) * chunk_duration, total_duration)
-                
-                if chunk_start >= total_duration:
-                    break
-                    
-                print(f"处理分段 {i+1}/{num_chunks} ({chunk_start:.1f}s - {chunk_end:.1f}s)", file=sys.stderr)
+            vad = self.vad if vad is None else vad
+            chunk_duration = chunk_duration or self.chunk_duration
+            
+            if self.journal.available and audio_hash is None:
+                audio_hash = audio_fingerprint(audio)
+            plan = self.journal.get_plan(audio_hash) if audio_hash else None
+            if plan is not None:
+                # 上次被中断：沿用当时的分段方案、模型和解码参数，分段范围与已完成的结果一一对应
+                chunks, skipped_seconds = plan['chunks'], plan['skipped_seconds']
+                job.decode_options = plan['decode_options']
+                self.use_model(job, plan['model'])
+            else:
+                # 如果视频很短，直接使用原始方法
+                # 按截止时间选择模型、分段长度和解码参数
+                chunk_duration = self.apply_policy(job, total_duration, workers, chunk_duration)['chunk_duration']
                 
-                # 提取音频片段
-                chunk_path = os.path.join(os.path.dirname(video_path), f'chunk_{i}.wav')
-                cmd = ['ffmpeg', '-y', '-i', video_path, '-ss', str(chunk_start), 
-                       '-t', str(chunk_duration), '-acodec', 'pcm_s16le', '-ar', '16000', chunk_path]
-                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                if not vad and total_duration <= chunk_duration:
+                    print("视频较短，使用原始方法处理", file=sys.stderr)
+                    return self.transcribe_audio(audio, job)
                 
-                try:
-                    # 转换当前分段
-                    chunk_result = self.model.transcribe(
-                        chunk_path,
-                        language="zh",
-                        task="transcribe",
-                        verbose=False,  # 减少输出
-                        fp16=False,
-                        temperature=0,
-                        compression_ratio_threshold=2.4,
-                        logprob_threshold=-1.0,
-                        no_speech_threshold=0.6,
-                        beam_size=1,
-                        best_of=1,
-                        word_timestamps=False,
-                        condition_on_previous_text=False
-                    )
-                    
-                    # 调整时间戳并添加到总结果
-                    if 'segments' in chunk_result:
-                        for segment in chunk_result['segments']:
-                            segment['start'] += chunk_start
-                            segment['end'] += chunk_start
-                            # 转换繁体到简体
-                            if 'text' in segment:
-                                segment['text'] = self.cc.convert(segment['text'])
-                            all_segments.append(segment)
-                    
-                    # 添加文本部分
-                    if 'text' in chunk_result and chunk_result['text'].strip():
-                        text = self.cc.convert(chunk_result['text'])
-                        full_text_parts.append(text)
-                    
-                    progress = ((i + 1) / num_chunks) * 100
-                    elapsed = time.time() - start_time
-                    print(f"分段处理进度: {progress:.1f}%, 已用时: {elapsed:.1f}秒", file=sys.stderr)
-                    
-                except Exception as chunk_error:
-                    print(f"分段{i+1}处理失败: {chunk_error}, 跳过", file=sys.stderr)
-                    
-                finally:
-                    # 清理临时文件
-                    if os.path.exists(chunk_path):
-                        try:
-                            os.remove(chunk_path)
-                        except:
-                            pass
+                chunks, skipped_seconds = self.plan_chunks(job, audio, chunk_duration, vad)
+                if audio_hash:
+                    self.journal.put_plan(audio_hash, job.model_size, job.decode_options, chunks, skipped_seconds)
+            print(f"音频总时长: {total_duration:.1f}秒，跳过非语音{skipped_seconds:.1f}秒，将分{len(chunks)}段处理", file=sys.stderr)
+            
+            decoder = decoder_key(self.backend.model_key(job.model_size), job.decode_options, self.models.quantize)
+            finished = self.journal.finished_chunks(audio_hash, decoder) if plan is not None else {}
+            # 按分段顺序拼接结果（已完成的分段直接取日志中的结果），把分段内时间戳换算回原音频时间
+            results = {i: finished[(pieces[0][0], pieces[-1][1])] for i, pieces in enumerate(chunks)
+                       if (pieces[0][0], pieces[-1][1]) in finished}
+            todo = [i for i in range(len(chunks)) if i not in results]
+            if results:
+                print(f"从分段日志恢复{len(results)}/{len(chunks)}段，识别剩余{len(todo)}段", file=sys.stderr)
+                job.metrics.info['resumed_chunks'] = len(results)
+            all_segments = SegmentStore()
+            full_text_parts = []
+            stitcher = SegmentStitcher(chunks)
+            next_index = 0
+            failed_chunks = 0
+            
+            def flush():
+                nonlocal next_index, failed_chunks
+                while next_index in results:
+                    chunk_result = results.pop(next_index)
+                    if chunk_result is None:
+                        failed_chunks += 1
+                    self._append_chunk_result(job, all_segments, full_text_parts, chunks[next_index],
+                                              chunk_result, stitcher)
+                    next_index += 1
+                    if next_index == 1:
+                        job.metrics.info['first_chunk_seconds'] = round(time.time() - start_time, 3)
+            
+            def deliver(k, chunk_result):
+                i = todo[k]
+                if chunk_result is not None and audio_hash:
+                    # 先写日志再合并（合并时会原地换算时间戳）
+                    self.journal.put_chunk(audio_hash, chunks[i], decoder, chunk_result)
+                results[i] = chunk_result
+                flush()
+            
+            flush()
+            todo_chunks = [chunks[i] for i in todo]
+            speech_seconds = sum(end - start for pieces in todo_chunks for start, end in pieces) / SAMPLE_RATE
+            workers = min(workers, len(todo_chunks))
+            inference_start = time.perf_counter()
+            if todo_chunks:
+                with self.lease_pool(job, workers) if workers > 1 else contextlib.nullcontext() as pool:
+                    if pool is not None:
+                        self._transcribe_chunks_parallel(job, pool, pcm_path, todo_chunks, workers, start_time, deliver)
+                    elif self.batcher is not None and self.batcher.accepts(job.decode_options):
+                        workers = 1
+                        self._transcribe_chunks_batched(job, audio, todo_chunks, start_time, deliver)
+                    else:
+                        workers = 1
+                        self._transcribe_chunks_serial(job, audio, todo_chunks, start_time, deliver)
+                # 用实测耗时修正模型速度估计，供后续任务选择模型
+                self.models.observe(job.model_size, speech_seconds, time.perf_counter() - inference_start, workers,
+                                    job.policy['time_factor'] if job.policy else 1.0)
+            if failed_chunks:
+                # 有分段识别失败：保留分段日志，重新提交时只识别失败的分段
+                print(f"{failed_chunks}/{len(chunks)}个分段识别失败，结果不完整", file=sys.stderr)
+                job.metrics.info['failed_chunks'] = failed_chunks
+            elif audio_hash:
+                self.journal.finish(audio_hash)
             
             # 合并结果
             result = {
                 'text': ' '.join(full_text_parts),
                 'segments': all_segments,
-                'language': 'zh'
+                'language': 'zh',
+                'skipped_seconds': round(skipped_seconds, 1),
+                'partial': failed_chunks > 0,
+                'failed_chunks': failed_chunks
             }
             
             end_time = time.time()
@@ -295,10 +659,385 @@ class VideoTranscriber:
             
             return result
             
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"分段处理失败: {str(e)}, 回退到原始方法", file=sys.stderr)
             # 回退到原始方法
-            return self.transcribe_audio(video_path)
+            return self.transcribe_audio(video_path if video_path is not None else audio, job)
+    
+    def _append_chunk_result(self, job, all_segments, full_text_parts, pieces, chunk_result, stitcher=None):
+        """
+        把一个分段的Whisper结果换算为原音频时间并转为简体后追加到总结果（SegmentStore），同时输出分段事件；
+        分段有重叠时由stitcher与相邻分段合并，落在下一个重叠区内的分段等下一段到达后再追加
+        """
+        if chunk_result is None:
+            if stitcher is not None:
+                self._append_segments(job, all_segments, full_text_parts, stitcher.push(None))
+            return
+        
+        # 子进程中识别的分段附带了子进程的耗时统计
+        worker_metrics = chunk_result.pop('_metrics', None)
+        if worker_metrics:
+            job.metrics.record('chunk_decode', worker_metrics['chunk_decode_wall'], rss_mb=worker_metrics['rss_mb'])
+            job.metrics.record('inference', worker_metrics['inference_wall'], worker_metrics['inference_cpu'],
+                                rss_mb=worker_metrics['rss_mb'])
+        
+        segments = chunk_result.get('segments') or []
+        for segment in segments:
+            segment['start'] = chunk_time_to_source(pieces, segment['start'])
+            segment['end'] = chunk_time_to_source(pieces, segment['end'])
+        
+        # 转换繁体到简体：整段的分段一次性转换，文本部分由转换后的分段拼出
+        # （先转换再合并重叠部分，两侧文字按简体对齐）
+        with job.metrics.stage('opencc'):
+            if segments:
+                text = self.cc.convert_segments(segments)
+            else:
+                text = self.cc.convert(chunk_result.get('text', ''))
+        if stitcher is not None:
+            self._append_segments(job, all_segments, full_text_parts, stitcher.push(segments))
+            if not segments and text.strip():
+                # 只有文字、没有时间戳的结果无法与相邻分段对齐，直接追加
+                full_text_parts.append(text)
+            return
+        # 只保留起止时间和文字，Whisper分段中的token等数据随分段结果释放
+        all_segments.extend(segments)
+        
+        # 添加文本部分
+        if text.strip():
+            full_text_parts.append(text)
+        
+        if 'segments' in chunk_result:
+            job.events.segments(chunk_result['segments'])
+    
+    def _append_segments(self, job, all_segments, full_text_parts, segments):
+        """追加已合并的分段和由它们拼出的文本，并输出分段事件"""
+        all_segments.extend(segments)
+        text = ''.join(segment.get('text', '') for segment in segments)
+        if text.strip():
+            full_text_parts.append(text)
+        job.events.segments(segments)
+    
+    def transcribe_stream(self, source, chunk_duration=None, headers=None, workers=None, vad=None,
+                          expected_duration=None, job=None, journal_key=None):
+        """
+        流水线方式转换：边下载边解码边识别
+        
+        ffmpeg读取文件/直链并解码（下载和解码在ffmpeg进程中），读取线程把音频块放入有界队列，
+        当前线程（或进程池）识别已到达的分段，后面的音频仍在传输中。队列有界，内存占用保持平稳。
+        分段长度、模型和解码参数按识别策略选择，分段重叠和结果合并与 transcribe_audio_chunked 相同；
+        给出journal_key时每个分段完成后写入分段日志，同一链接上次被中断时只识别缺少的分段。
+        
+        Args:
+            source (str): 文件路径或媒体直链
+            chunk_duration (int): 没有截止时间时每段的时长（秒），默认使用初始化时的配置
+            headers (dict): 访问直链时附带的HTTP请求头
+            workers (int|str): 并行识别的进程数
+            vad (bool): 是否在每个分段内跳过非语音部分
+            expected_duration (float): 预计时长（秒），用于选择识别策略和计算进度，可为空
+            job (JobContext): 任务上下文，默认新建
+            journal_key (str): 分段日志的键（见transcriber_journal.stream_key），为空时不记录
+            
+        Returns:
+            dict: 转换结果，另含 'audio_hash'（整段音频的哈希）、'first_chunk_seconds'（首段识别完成耗时）
+                  和 'partial'/'failed_chunks'（识别失败的分段数）
+        """
+        import queue
+        import hashlib
+        from collections import deque
+        from concurrent.futures import Future
+        
+        start_time = time.time()
+        job = job or self.new_job()
+        workers = self.plan_workers(os.cpu_count() or 1, workers, job.model_size)
+        chunk_duration = chunk_duration or self.chunk_duration
+        journal_key = journal_key if self.journal.available else None
+        
+        plan = self.journal.get_plan(journal_key) if journal_key else None
+        if plan is not None and plan['layout']:
+            # 上次被中断：沿用当时的分段方式、模型和解码参数，分段范围与已完成的结果一一对应
+            layout = plan['layout']
+            job.decode_options = plan['decode_options']
+            self.use_model(job, plan['model'])
+        else:
+            plan = None
+            if expected_duration:
+                # 流式处理前只知道视频标注的时长，按它选择模型、分段长度和解码参数
+                chunk_duration = self.apply_policy(job, expected_duration, workers, chunk_duration)['chunk_duration']
+            # 重叠不超过分段的一半（与plan_chunks相同），每次读取的音频块是分段中新的部分
+            overlap_samples = int(min(self.chunk_overlap, chunk_duration / 2) * SAMPLE_RATE)
+            layout = {'step_samples': int(chunk_duration * SAMPLE_RATE) - overlap_samples,
+                      'overlap_samples': overlap_samples,
+                      'vad': self.vad if vad is None else bool(vad)}
+            if journal_key:
+                self.journal.put_plan(journal_key, job.model_size, job.decode_options, [], 0.0, layout)
+        step_samples, overlap_samples, vad = layout['step_samples'], layout['overlap_samples'], layout['vad']
+        decoder = decoder_key(self.backend.model_key(job.model_size), job.decode_options, self.models.quantize)
+        finished = self.journal.finished_chunks(journal_key, decoder) if plan is not None else {}
+        if finished:
+            print(f"从分段日志恢复{len(finished)}段，只识别其余分段", file=sys.stderr)
+            job.metrics.info['resumed_chunks'] = len(finished)
+        
+        # 有界队列：识别跟不上时读取线程阻塞，ffmpeg随之暂停读取
+        chunk_queue = queue.Queue(maxsize=max(2, workers))
+        stop_event = threading.Event()
+        
+        def put(item):
+            """放入队列；识别端已停止（取消或出错）时放弃，返回False"""
+            while not stop_event.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for block in stream_decode_audio(source, step_samples, headers=headers):
+                    # 放弃时退出循环，生成器关闭并结束ffmpeg进程
+                    if not put(block):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+        
+        producer = threading.Thread(target=produce, name='audio-stream', daemon=True)
+        producer.start()
+        
+        all_segments = SegmentStore()
+        full_text_parts = []
+        stitcher = SegmentStitcher()
+        digest = hashlib.sha256()
+        total_samples = 0
+        skipped_samples = 0
+        first_chunk_seconds = None
+        failed_chunks = 0
+        resumed_chunks = 0
+        # 已确定但还没合并的分段 (片段, Future)，按顺序合并
+        pending = deque()
+        # 有重叠时一个分段的结果要等下一个分段确定后才能合并（见SegmentStitcher.add）
+        hold = 1 if overlap_samples else 0
+        pool = None
+        
+        def done(result):
+            future = Future()
+            future.set_result(result)
+            return future
+        
+        def cancel_pending():
+            """取消或出错时，已提交到进程池但还没开始的分段不再识别"""
+            for _, future in pending:
+                future.cancel()
+        
+        def finish_oldest():
+            nonlocal first_chunk_seconds, failed_chunks
+            pieces, future = pending.popleft()
+            try:
+                chunk_result = future.result()
+            except Exception as chunk_error:
+                print(f"分段处理失败: {chunk_error}, 跳过", file=sys.stderr)
+                chunk_result = None
+            if chunk_result is None:
+                failed_chunks += 1
+            elif journal_key and (pieces[0][0], pieces[-1][1]) not in finished:
+                # 先写日志再合并（合并时会原地换算时间戳）
+                self.journal.put_chunk(journal_key, pieces, decoder, chunk_result)
+            self._append_chunk_result(job, all_segments, full_text_parts, pieces, chunk_result, stitcher)
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.time() - start_time
+            if expected_duration:
+                done_seconds = min(pieces[-1][1] / SAMPLE_RATE, expected_duration)
+                job.events.progress(done_seconds, expected_duration, time.time() - start_time)
+        
+        with contextlib.ExitStack() as stack:
+            stack.callback(stop_event.set)
+            if workers > 1:
+                pool = stack.enter_context(self.lease_pool(job, workers))
+                stack.callback(cancel_pending)
+            if pool is None:
+                self.use_model(job, job.model_size)
+            
+            # 前一个分段自身的片段（不含重叠部分）和所在的音频块，下一个分段从中补上重叠部分
+            previous, previous_block = None, None
+            while True:
+                job.check_cancelled()
+                block = chunk_queue.get()
+                if block is None:
+                    break
+                if isinstance(block, Exception):
+                    raise block
+                
+                digest.update(memoryview(block).cast('B'))
+                base = total_samples
+                total_samples += len(block)
+                
+                # 音频块内的语音区间，片段坐标换算为整段音频中的样本位置
+                if vad:
+                    with job.metrics.stage('vad'):
+                        regions = detect_speech_regions(block)
+                else:
+                    regions = [(0, len(block))]
+                skipped_samples += len(block) - sum(end - start for start, end in regions)
+                if not regions:
+                    # 没有语音的音频块不会切断字词，下一个分段不与更早的分段重叠
+                    previous, previous_block = None, None
+                    continue
+                own = [(base + start, base + end) for start, end in regions]
+                pieces = overlap_chunks([previous, own], overlap_samples)[1] if previous else own
+                if pieces[0][0] < base:
+                    # 重叠部分在前一个音频块中
+                    window_base = base - len(previous_block)
+                    window = np.concatenate([previous_block, block])
+                else:
+                    window_base, window = base, block
+                previous, previous_block = own, block
+                stitcher.add(pieces)
+                
+                span = (pieces[0][0], pieces[-1][1])
+                if span in finished:
+                    resumed_chunks += 1
+                    pending.append((pieces, done(finished[span])))
+                else:
+                    with job.metrics.stage('chunk_decode'):
+                        chunk_audio_data = chunk_audio(window, [(start - window_base, end - window_base)
+                                                                for start, end in pieces])
+                    print(f"处理流式分段 {span[0] / SAMPLE_RATE:.1f}s - {span[1] / SAMPLE_RATE:.1f}s", file=sys.stderr)
+                    if pool is not None:
+                        pending.append((pieces, pool.submit(_transcribe_array_worker, chunk_audio_data,
+                                                            job.decode_options)))
+                    else:
+                        try:
+                            pending.append((pieces, done(self.infer(job, chunk_audio_data))))
+                        except JobCancelled:
+                            raise
+                        except Exception as chunk_error:
+                            print(f"分段处理失败: {chunk_error}, 跳过", file=sys.stderr)
+                            pending.append((pieces, done(None)))
+                # 进行中的分段不超过进程数，按顺序回收结果
+                while len(pending) >= workers + hold:
+                    finish_oldest()
+            
+            while pending:
+                finish_oldest()
+        
+        job.metrics.audio_seconds = total_samples / SAMPLE_RATE
+        total_time = time.time() - start_time
+        print(f"流式处理完成，音频时长: {total_samples / SAMPLE_RATE:.1f}秒，总用时: {total_time:.1f}秒", file=sys.stderr)
+        if failed_chunks:
+            # 有分段识别失败：保留分段日志，重新提交时只识别失败的分段
+            print(f"{failed_chunks}个分段识别失败，结果不完整", file=sys.stderr)
+            job.metrics.info['failed_chunks'] = failed_chunks
+        elif journal_key:
+            self.journal.finish(journal_key)
+        
+        return {
+            'text': ' '.join(full_text_parts),
+            'segments': all_segments,
+            'language': 'zh',
+            'skipped_seconds': round(skipped_samples / SAMPLE_RATE, 1),
+            'audio_hash': digest.hexdigest(),
+            'duration': total_samples / SAMPLE_RATE,
+            'first_chunk_seconds': first_chunk_seconds,
+            'partial': failed_chunks > 0,
+            'failed_chunks': failed_chunks
+        }
+    
+    def _transcribe_chunks_serial(self, job, audio, chunks, start_time, deliver):
+        """在当前进程中逐段转换，每完成一段按顺序交给deliver（失败的分段为None）"""
+        
+        self.use_model(job, job.model_size)
+        num_chunks = len(chunks)
+        
+        for i, pieces in enumerate(chunks):
+            job.check_cancelled()
+            print(f"处理分段 {i+1}/{num_chunks} ({pieces[0][0] / SAMPLE_RATE:.1f}s - {pieces[-1][1] / SAMPLE_RATE:.1f}s)", file=sys.stderr)
+            
+            try:
+                # 转换当前分段，直接传入PCM切片
+                with job.metrics.stage('chunk_decode'):
+                    chunk_audio_data = chunk_audio(audio, pieces)
+                chunk_result = self.infer(job, chunk_audio_data)
+            except JobCancelled:
+                raise
+            except Exception as chunk_error:
+                print(f"分段{i+1}处理失败: {chunk_error}, 跳过", file=sys.stderr)
+                chunk_result = None
+            
+            deliver(i, chunk_result)
+            job.events.progress(i + 1, num_chunks, time.time() - start_time)
+    
+    def _transcribe_chunks_batched(self, job, audio, chunks, start_time, deliver):
+        """
+        把分段提交给批量推理（见transcriber_batching），在途分段数不超过两批，
+        完成的分段按顺序交给deliver（失败的分段为None）
+        """
+        
+        self.use_model(job, job.model_size)
+        num_chunks = len(chunks)
+        in_flight = 2 * self.batcher.max_batch
+        print(f"批量处理 {num_chunks} 个分段，每批最多{self.batcher.max_batch}个窗口", file=sys.stderr)
+        
+        pending = collections.deque()
+        submitted = 0
+        try:
+            for i in range(num_chunks):
+                while submitted < num_chunks and len(pending) < in_flight:
+                    job.check_cancelled()
+                    with job.metrics.stage('chunk_decode'):
+                        chunk_audio_data = chunk_audio(audio, chunks[submitted])
+                    pending.append(self.batcher.submit(job, chunk_audio_data))
+                    submitted += 1
+                
+                try:
+                    chunk_result = pending.popleft().result()
+                except JobCancelled:
+                    raise
+                except Exception as chunk_error:
+                    print(f"分段{i+1}处理失败: {chunk_error}, 跳过", file=sys.stderr)
+                    chunk_result = None
+                
+                job.check_cancelled()
+                deliver(i, chunk_result)
+                job.events.progress(i + 1, num_chunks, time.time() - start_time)
+        finally:
+            # 取消或出错时，还没开始的分段不再识别
+            for future in pending:
+                future.cancel()
+    
+    def _transcribe_chunks_parallel(self, job, pool, pcm_path, chunks, workers, start_time, deliver):
+        """把分段分发到进程池并行转换，已完成的连续前缀按顺序交给deliver（失败的分段为None）"""
+        
+        num_chunks = len(chunks)
+        print(f"并行处理 {num_chunks} 个分段，进程数: {workers}", file=sys.stderr)
+        
+        futures = {
+            pool.submit(_transcribe_chunk_worker, pcm_path, pieces, job.decode_options): i
+            for i, pieces in enumerate(chunks)
+        }
+        
+        finished = {}
+        next_index = 0
+        for done, future in enumerate(as_completed(futures), 1):
+            if job.cancelled:
+                # 还没开始的分段不再执行，已在子进程中运行的分段结果直接丢弃
+                for pending_future in futures:
+                    pending_future.cancel()
+                job.check_cancelled()
+            i = futures[future]
+            try:
+                finished[i] = future.result()
+            except Exception as chunk_error:
+                print(f"分段{i+1}处理失败: {chunk_error}, 跳过", file=sys.stderr)
+                finished[i] = None
+            
+            # 前面的分段都完成后才输出，保证分段事件按时间顺序
+            while next_index in finished:
+                deliver(next_index, finished.pop(next_index))
+                next_index += 1
+            
+            job.events.progress(done, num_chunks, time.time() - start_time)
     
     def format_transcript(self, result, title=""):
         """
@@ -314,124 +1053,484 @@ class VideoTranscriber:
         # 提取完整文本
         full_text = result.get('text', '').strip()
         
-        # 提取分段信息
-        segments = []
-        for segment in result.get('segments', []):
-            segments.append({
-                'start': segment.get('start', 0),
-                'end': segment.get('end', 0),
-                'text': segment.get('text', '').strip()
-            })
-        
-        # 生成带时间戳的文本
-        timestamped_text = ""
-        for segment in segments:
-            start_time = self.format_time(segment['start'])
-            end_time = self.format_time(segment['end'])
-            timestamped_text += f"[{start_time} - {end_time}] {segment['text']}\n"
+        # 提取分段信息（按列存储，只保留起止时间和文字）
+        segments = SegmentStore.from_segments(result.get('segments', []))
+        
+        # 生成带时间戳的文本（批量格式化时间，一次拼接）
+        timestamped_text = segments.render_timestamped()
         
         return {
             'title': title,
             'full_text': full_text,
-            'segments': segments,
+            'segments': segments.view(),
             'timestamped_text': timestamped_text,
             'word_count': len(full_text),
             'segment_count': len(segments)
         }
     
+    def cache_result(self, job, url, audio_hash, result, formatted_result):
+        """完整的结果写入缓存；有分段识别失败时在结果中标明，不写缓存（下次请求重新识别缺少的分段）"""
+        if result.get('partial'):
+            formatted_result['partial'] = True
+            formatted_result['failed_chunks'] = result.get('failed_chunks', 0)
+            print("结果不完整，不写入转写缓存", file=sys.stderr)
+            return
+        self.cache.put(url, audio_hash, formatted_result, self.job_decoder(job))
+    
     def format_time(self, seconds):
         """格式化时间为 MM:SS 格式"""
         minutes = int(seconds // 60)
         seconds = int(seconds % 60)
         return f"{minutes:02d}:{seconds:02d}"
     
-    def process_video_url(self, url):
+    def prepare_media(self, job, source):
         """
-        处理视频链接，返回文字稿
+        下载（仅链接）并解码音频，按链接和音频内容查找缓存；下载的文件和PCM放在任务的工作目录中
+        
+        Args:
+            job (JobContext): 任务上下文
+            source (str|MediaInput): 视频链接，或本地文件/字节流/PCM输入（不经过yt-dlp）
+            
+        Returns:
+            dict: 媒体信息；命中缓存时只包含 'result' 键（完整的处理结果）
+        """
+        if not isinstance(source, MediaInput):
+            source = MediaInput.from_url(source)
+        url = source.value if source.is_url else None
+        
+        if url:
+            # 同一链接处理过则直接返回缓存
+            cached = self.cache.get_by_url(url, self.cache_accept(job))
+            if cached is not None:
+                print("命中转写缓存（链接）", file=sys.stderr)
+                return {'result': {'success': True, 'data': dict(cached, url=url, cache='url')}}
+            
+            job.events.stage('download', "开始下载视频...")
+            # 下载视频
+            video_path, title, duration = self.download_video(job, url, job.open_workspace(), source.info)
+            print(f"视频下载完成: {title} ({duration}秒)", file=sys.stderr)
+            source = MediaInput('path', video_path)
+        else:
+            video_path = source.value if source.kind == 'path' else None
+            title, duration = source.title, source.duration
+            print(f"处理本地输入: {source.label}", file=sys.stderr)
+        
+        # 解码音频并按音频内容查找缓存（转载的同一视频）
+        job.check_cancelled()
+        job.events.stage('decode', "解码音频...")
+        audio, pcm_path, audio_hash = None, None, None
+        try:
+            audio, pcm_path = self.load_audio(job, source, pcm_dir=job.open_workspace())
+            audio_hash = audio_fingerprint(audio)
+        except Exception as decode_error:
+            if video_path is None:
+                # 字节流/PCM输入没有文件可供Whisper重新读取
+                raise
+            print(f"音频解码失败: {decode_error}", file=sys.stderr)
+        if duration is None and audio is not None:
+            duration = round(audio_duration(audio), 1)
+        
+        cached = self.cache.get_by_audio_hash(audio_hash, accept=self.cache_accept(job)) if audio_hash else None
+        if cached is not None:
+            print("命中转写缓存（音频）", file=sys.stderr)
+            self.cache.link(url, audio_hash)
+            data = dict(cached, title=title, url=url, duration=duration, cache='audio')
+            return {'result': {'success': True, 'data': data}}
+        
+        return {
+            'url': url,
+            'video_path': video_path,
+            'title': title,
+            'duration': duration,
+            'audio': audio,
+            'pcm_path': pcm_path,
+            'audio_hash': audio_hash
+        }
+    
+    def transcribe_media(self, job, url, media):
+        """
+        识别并格式化prepare_media准备好的媒体
+        
+        Args:
+            job (JobContext): 任务上下文
+            url (str): 视频链接，本地输入时为None
+            media (dict): prepare_media的返回值
+            
+        Returns:
+            dict: 处理结果
+        """
+        if 'result' in media:
+            return media['result']
+        
+        job.events.stage('transcribe', "开始语音识别...")
+        # 转换为文字 - 使用分段处理提高速度
+        result = self.transcribe_audio_chunked(media['video_path'], audio=media['audio'], pcm_path=media['pcm_path'],
+                                               job=job, audio_hash=media['audio_hash'])
+        print("语音识别完成", file=sys.stderr)
+        
+        job.events.stage('format', "格式化结果...")
+        # 格式化结果
+        with job.metrics.stage('format'):
+            formatted_result = self.format_transcript(result, media['title'])
+        formatted_result['url'] = url
+        formatted_result['duration'] = media['duration']
+        formatted_result['skipped_seconds'] = result.get('skipped_seconds', 0)
+        self.cache_result(job, url, media['audio_hash'], result, formatted_result)
+        
+        print("处理完成，准备输出结果", file=sys.stderr)
+        return {
+            'success': True,
+            'data': formatted_result
+        }
+    
+    def failure_result(self, error):
+        """把处理过程中的异常转换为失败结果"""
+        if isinstance(error, JobCancelled):
+            print("任务已取消", file=sys.stderr)
+            return {
+                'success': False,
+                'error': '任务已取消',
+                'cancelled': True
+            }
+        if isinstance(error, yt_dlp.utils.DownloadError):
+            error_msg = f"视频下载失败: {str(error)}"
+        else:
+            error_msg = f"处理失败: {str(error)}"
+        print(error_msg, file=sys.stderr)
+        logger.error(error_msg)
+        return {
+            'success': False,
+            'error': error_msg
+        }
+    
+    def process_video_url_streaming(self, job, url, info=None):
+        """
+        以流水线方式处理视频链接：不落盘下载，ffmpeg直接读取音频直链，边到达边识别
         
         Args:
+            job (JobContext): 任务上下文
             url (str): 视频链接
+            info (dict): 任务队列已解析的视频信息，给出时不再解析页面
             
         Returns:
             dict: 处理结果
         """
-        # 创建临时目录
-        self.temp_dir = tempfile.mkdtemp()
+        # 同一链接处理过则直接返回缓存
+        cached = self.cache.get_by_url(url, self.cache_accept(job))
+        if cached is not None:
+            print("命中转写缓存（链接）", file=sys.stderr)
+            return {'success': True, 'data': dict(cached, url=url, cache='url')}
         
         try:
-            print("开始下载视频...", file=sys.stderr)
-            # 下载视频
-            video_path, title, duration = self.download_video(url, self.temp_dir)
-            print(f"视频下载完成: {title} ({duration}秒)", file=sys.stderr)
+            job.events.stage('resolve', "解析视频信息...")
+            media_url, headers, title, duration = self.resolve_stream(job, url, info)
+            job.events.stage('transcribe', f"开始流式识别: {title} ({duration}秒)")
             
-            print("开始语音识别...", file=sys.stderr)
-            # 转换为文字 - 使用分段处理提高速度
-            result = self.transcribe_audio_chunked(video_path)
+            result = self.transcribe_stream(media_url, headers=headers, expected_duration=duration, job=job,
+                                            journal_key=stream_key(canonicalize_url(url)))
             print("语音识别完成", file=sys.stderr)
             
-            print("格式化结果...", file=sys.stderr)
-            # 格式化结果
-            formatted_result = self.format_transcript(result, title)
+            with job.metrics.stage('format'):
+                formatted_result = self.format_transcript(result, title)
             formatted_result['url'] = url
-            formatted_result['duration'] = duration
+            formatted_result['duration'] = duration or round(result['duration'], 1)
+            formatted_result['skipped_seconds'] = result.get('skipped_seconds', 0)
+            self.cache_result(job, url, result['audio_hash'], result, formatted_result)
             
-            print("处理完成，准备输出结果", file=sys.stderr)
             return {
                 'success': True,
                 'data': formatted_result
             }
+        except Exception as e:
+            return self.failure_result(e)
+    
+    def process_video_url(self, url, job=None):
+        """
+        处理视频链接，返回文字稿
+        
+        Args:
+            url (str): 视频链接
+            job (JobContext): 任务上下文，默认新建
             
-        except yt_dlp.utils.DownloadError as e:
-            error_msg = f"视频下载失败: {str(e)}"
-            print(error_msg, file=sys.stderr)
-            logger.error(error_msg)
-            return {
-                'success': False,
-                'error': error_msg
-            }
+        Returns:
+            dict: 处理结果
+        """
+        return self.process_input(MediaInput.from_url(url), job)
+    
+    def process_input(self, source, job=None):
+        """
+        处理任意输入，返回文字稿；本地文件、字节流和PCM不经过yt-dlp
+        
+        可在多个线程中同时调用：每个任务的状态都在自己的JobContext中，模型和进程池共用
+        
+        Args:
+            source (MediaInput): 输入，见transcriber_input
+            job (JobContext): 任务上下文（截止时间、事件输出、取消），默认新建
+            
+        Returns:
+            dict: 处理结果
+        """
+        job = job or self.new_job()
+        # 任务结束、失败或取消时删除工作目录
+        with job:
+            if self.stream and source.is_url:
+                return self.finish_job_metrics(job, self.process_video_url_streaming(job, source.value, source.info))
+            try:
+                media = self.prepare_media(job, source)
+                return self.finish_job_metrics(job, self.transcribe_media(job, media.get('url'), media))
+            except Exception as e:
+                return self.finish_job_metrics(job, self.failure_result(e))
+    
+    def process_batch(self, urls, emit, concurrency=None):
+        """
+        批量处理视频链接：并发下载，共用已加载的模型串行识别
+        
+        Args:
+            urls (list): 视频链接列表
+            emit (callable): 每完成一个链接调用一次，参数为处理结果
+            concurrency (int): 并发下载数
+            
+        Returns:
+            dict: 成功/失败计数
+        """
+        def prepare(url):
+            job = self.new_job()
+            try:
+                media = self.prepare_media(job, url)
+            except Exception as e:
+                media = {'result': self.failure_result(e)}
+            media['job'] = job
+            return media
+        
+        def finish(url, media):
+            job = media['job']
+            with job:
+                try:
+                    return self.transcribe_media(job, url, media)
+                except Exception as e:
+                    return self.failure_result(e)
+        
+        return run_batch(urls, prepare, finish, emit, concurrency)
+
+def serve_worker(transcriber, input_stream=None, output_stream=None, max_jobs=None):
+    """
+    常驻工作进程模式：模型只加载一次，逐行读取JSON任务并逐行返回结果
+    
+    任务在线程中执行，最多同时运行max_jobs个，共用已加载的模型（同一模型的推理串行，
+    下载、解码等步骤并行）；超出的任务按到达顺序等待。读取请求不会被运行中的任务阻塞，
+    运行或等待中的任务可以随时取消
+    
+    请求格式（每行一个JSON）:
+        {"id": "任务ID", "url": "视频链接", "events": false}
+        {"id": "任务ID", "path": "本地视频/音频文件路径"}
+        {"id": "任务ID", "url": "视频链接", "deadline": 540}   deadline为本任务的截止时间（秒），见transcriber_policy
+        {"id": "任务ID", "url": "视频链接", "info": {...}}   info为已解析的yt-dlp视频信息（任务队列入队时探测），不再解析页面
+        {"id": "任务ID", "op": "cancel"}   取消任务，被取消的任务返回 {"success": false, "cancelled": true}
+        {"id": "任务ID", "op": "ping"}
+        {"op": "shutdown"}   等运行和等待中的任务完成后退出
+    
+    响应格式（每行一个JSON，与请求通过id对应）:
+        {"id": "任务ID", "success": true, "data": {...}}
+        {"id": "任务ID", "success": false, "error": "缺少视频链接", "invalid": true}   请求本身无效（缺少链接、文件不存在）
+        请求中 events 为 true 时，结果之前还会输出带id的进度事件（见transcriber_events）
+    
+    Args:
+        transcriber (VideoTranscriber): 转换器实例，在所有任务间复用
+        input_stream: 任务输入流，默认stdin
+        output_stream: 结果输出流，默认stdout
+        max_jobs (int): 同时运行的任务数，默认读取TRANSCRIBER_WORKER_JOBS（默认1）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    if max_jobs is None:
+        max_jobs = int(os.getenv('TRANSCRIBER_WORKER_JOBS', '1'))
+    max_jobs = max(1, max_jobs)
+    output_lock = threading.Lock()
+    jobs = {}
+    
+    def reply(message):
+        line = json.dumps(message, ensure_ascii=False, default=json_default) + "\n"
+        with output_lock:
+            output_stream.write(line)
+            output_stream.flush()
+    
+    def run(job_id, source, job):
+        try:
+            job.check_cancelled()
+            print(f"工作进程开始处理任务 {job_id}: {source.label}", file=sys.stderr)
+            result = transcriber.process_input(source, job)
         except Exception as e:
-            error_msg = f"处理失败: {str(e)}"
-            print(error_msg, file=sys.stderr)
-            logger.error(error_msg)
-            return {
+            result = transcriber.failure_result(e) if isinstance(e, JobCancelled) else {
                 'success': False,
-                'error': error_msg
+                'error': f'未预期的错误: {str(e)}'
             }
-            
         finally:
-            # 清理临时文件
-            if self.temp_dir and os.path.exists(self.temp_dir):
+            jobs.pop(job_id, None)
+        result['id'] = job_id
+        reply(result)
+    
+    # 启动时预加载模型，后续任务不再重复加载
+    transcriber.load_model()
+    reply({'event': 'ready', 'model': transcriber.model_size, 'preloaded': list(transcriber.models.models),
+           'quantized': transcriber.models.quantize, 'jobs': max_jobs, 'pid': os.getpid()})
+    print(f"工作进程已就绪 (pid: {os.getpid()}，同时运行任务数: {max_jobs})", file=sys.stderr)
+    
+    executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='job')
+    shutdown_id = None
+    # Whisper的verbose输出会写stdout，运行期间重定向到stderr以免破坏协议（结果直接写入output_stream）
+    with contextlib.redirect_stdout(sys.stderr):
+        completed = False
+        try:
+            for line in input_stream:
+                line = line.strip()
+                if not line:
+                    continue
+                
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    reply({'success': False, 'error': f'无效的请求: {str(e)}'})
+                    continue
+                
+                job_id = request.get('id')
+                op = request.get('op', 'transcribe')
+                
+                if op == 'ping':
+                    reply({'id': job_id, 'event': 'pong', 'cache': transcriber.cache.get_stats(),
+                           'active_jobs': len(jobs)})
+                    continue
+                if op == 'cancel':
+                    job = jobs.get(job_id)
+                    if job is not None:
+                        job.cancel()
+                    reply({'id': job_id, 'event': 'cancelled', 'found': job is not None})
+                    continue
+                if op == 'shutdown':
+                    shutdown_id = job_id
+                    break
+                
                 try:
-                    shutil.rmtree(self.temp_dir)
-                    print("临时文件已清理", file=sys.stderr)
-                except Exception as cleanup_error:
-                    print(f"清理临时文件失败: {cleanup_error}", file=sys.stderr)
+                    if request.get('path'):
+                        source = MediaInput.from_path(request['path'])
+                    elif request.get('url'):
+                        source = MediaInput.from_url(request['url'], request.get('info'))
+                    else:
+                        reply({'id': job_id, 'success': False, 'error': '缺少视频链接', 'invalid': True})
+                        continue
+                except OSError as e:
+                    reply({'id': job_id, 'success': False, 'error': str(e), 'invalid': True})
+                    continue
+                
+                events = (EventReporter(stream=output_stream, ndjson=True, job_id=job_id, lock=output_lock)
+                          if request.get('events') else None)
+                job = transcriber.new_job(job_id, float(request['deadline']) if request.get('deadline') else None,
+                                          events)
+                jobs[job_id] = job
+                executor.submit(run, job_id, source, job)
+            completed = True
+        finally:
+            if not completed:
+                # 异常退出（如Ctrl+C）时取消所有任务，任务在下一个检查点停止并删除工作目录
+                for job in list(jobs.values()):
+                    job.cancel()
+            # 正常退出时等运行和等待中的任务完成
+            executor.shutdown(wait=True)
+    
+    reply({'id': shutdown_id, 'event': 'shutdown'})
+    print("工作进程退出", file=sys.stderr)
+
+def run_batch_cli(transcriber, source):
+    """批量模式命令行入口：每完成一个链接向stdout输出一行JSON，最后输出汇总"""
+    output_stream = sys.stdout
+    
+    def emit(result):
+        output_stream.write(json.dumps(result, ensure_ascii=False, default=json_default) + "\n")
+        output_stream.flush()
+    
+    try:
+        urls = read_url_list(source)
+        print(f"批量处理 {len(urls)} 个链接", file=sys.stderr)
+        # Whisper的verbose输出会写stdout，批量期间重定向到stderr以免混入结果
+        with contextlib.redirect_stdout(sys.stderr):
+            summary = transcriber.process_batch(urls, emit)
+    except Exception as e:
+        emit({'success': False, 'error': f'批量处理失败: {str(e)}'})
+        sys.exit(1)
+    finally:
+        transcriber.close()
+    
+    emit(dict(summary, event='summary'))
+    sys.exit(0 if summary['failed'] == 0 else 2)
 
 def main():
     """命令行入口"""
-    if len(sys.argv) != 2:
+    if len(sys.argv) >= 2 and sys.argv[1] == '--worker':
+        # 常驻模式: python video_transcriber.py --worker [模型大小]
+        model_size = sys.argv[2] if len(sys.argv) > 2 else os.getenv('WHISPER_MODEL_SIZE', 'tiny')
+        install_workspace_cleanup()
+        transcriber = VideoTranscriber(model_size=model_size)
+        try:
+            serve_worker(transcriber)
+        finally:
+            transcriber.close()
+        sys.exit(0)
+    
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch':
+        # 批量模式: python video_transcriber.py --batch <链接列表文件|->
+        install_workspace_cleanup()
+        run_batch_cli(VideoTranscriber(), sys.argv[2])
+    
+    # --ndjson: 以每行一个JSON事件的形式输出进度、分段文字和最终结果
+    args = sys.argv[1:]
+    ndjson = '--ndjson' in args
+    if ndjson:
+        args.remove('--ndjson')
+    # --pcm: 输入为16kHz单声道float32 PCM（文件或stdin）
+    pcm = '--pcm' in args
+    if pcm:
+        args.remove('--pcm')
+    # --deadline 秒数: 任务截止时间，据此选择模型和解码参数（调用方的超时时间）
+    deadline = None
+    if '--deadline' in args:
+        index = args.index('--deadline')
+        try:
+            deadline = float(args[index + 1])
+        except (IndexError, ValueError):
+            deadline = None
+        del args[index:index + 2]
+    events = EventReporter(stream=sys.stdout, ndjson=ndjson)
+    
+    if len(args) != 1:
         result = {
             'success': False,
-            'error': '使用方法: python video_transcriber.py <视频链接>'
+            'error': '使用方法: python video_transcriber.py [--ndjson] [--pcm] [--deadline 秒数] <视频链接|本地文件|-> 或 --worker [模型大小] 或 --batch <链接列表文件|->'
         }
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         sys.exit(1)
     
-    url = sys.argv[1]
-    
     try:
-        print(f"开始处理视频: {url}", file=sys.stderr)
+        # 链接走yt-dlp下载；本地文件、stdin（"-"）和PCM直接解码
+        source = MediaInput.from_argument(args[0], pcm=pcm)
+        print(f"开始处理视频: {source.label}", file=sys.stderr)
         
-        # 创建转换器 - 使用tiny模型提高速度
-        transcriber = VideoTranscriber(model_size="tiny")
+        # 创建转换器 - 默认使用tiny模型提高速度（WHISPER_MODEL_SIZE可覆盖）
+        install_workspace_cleanup()
+        transcriber = VideoTranscriber()
+        job = transcriber.new_job(deadline=deadline, events=events)
         print("VideoTranscriber初始化完成", file=sys.stderr)
         
-        # 处理视频
-        result = transcriber.process_video_url(url)
+        # 处理视频；NDJSON模式下Whisper的verbose输出重定向到stderr，stdout只保留事件
+        try:
+            with contextlib.redirect_stdout(sys.stderr) if ndjson else contextlib.nullcontext():
+                result = transcriber.process_input(source, job)
+        finally:
+            transcriber.close()
         print("视频处理完成", file=sys.stderr)
         
         # 输出JSON结果到stdout
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         
         # 如果处理成功，正常退出
         if result.get('success', False):
@@ -446,7 +1545,7 @@ def main():
             'success': False,
             'error': '用户中断处理'
         }
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         sys.exit(3)
         
     except Exception as e:
@@ -455,7 +1554,7 @@ def main():
             'success': False,
             'error': f'未预期的错误: {str(e)}'
         }
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -8,14 +8,30 @@
 import os
 import sys
 import json
-import tempfile
-import shutil
+import time
+
+# 统计依赖（requests/yt_dlp）的导入耗时
+_import_wall_start = time.perf_counter()
+_import_cpu_start = time.process_time()
+
+import threading
 import requests
-import base64
-from pathlib import Path
-import yt_dlp
 import logging
-from opencc import OpenCC
+from transcriber_audio import audio_duration, write_wav
+from transcriber_cache import TranscriptCache, audio_fingerprint
+from transcriber_batch import read_url_list, run_batch
+from transcriber_events import EventReporter
+from transcriber_job import JobContext
+from transcriber_metrics import JobMetrics, write_prometheus
+from transcriber_text import BatchConverter
+from transcriber_segments import SegmentStore, json_default
+from transcriber_input import MediaInput
+from transcriber_download import download_audio
+from transcriber_hedge import HedgedScheduler
+from transcriber_backends import BAIDU_CONCURRENCY, create_cloud_backends
+
+IMPORT_WALL_SECONDS = time.perf_counter() - _import_wall_start
+IMPORT_CPU_SECONDS = time.process_time() - _import_cpu_start
 
 # 设置日志
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
@@ -24,269 +40,268 @@ logger = logging.getLogger(__name__)
 class CloudVideoTranscriber:
     def __init__(self):
         """初始化云端语音识别"""
-        self.temp_dir = None
-        self.cc = OpenCC('t2s')  # 繁体转简体
+        self.cc = BatchConverter('t2s')  # 繁体转简体
+        # 转写结果缓存（与本地Whisper版共用同一目录）
+        self.cache = TranscriptCache()
+        # 新任务默认使用的进度事件输出（默认向stderr打印提示，NDJSON模式下输出结构化事件）
+        self.events = EventReporter()
+        # 依赖导入耗时，计入第一个任务的统计
+        self.startup_metrics = JobMetrics()
+        self.startup_metrics.record('import', IMPORT_WALL_SECONDS, IMPORT_CPU_SECONDS)
+        self._import_reported = False
+        self._job_lock = threading.Lock()
+        self.metrics_file = os.getenv('TRANSCRIBER_METRICS_FILE')
+        # 任务截止时间（秒，从任务开始算起），传给本地Whisper后端
+        deadline = os.getenv('TRANSCRIBER_DEADLINE')
+        self.deadline = float(deadline) if deadline else None
+        # 百度、OpenAI、本地Whisper之间的对冲调度
+        self.scheduler = HedgedScheduler()
         
-        # 配置API密钥 (需要在Railway环境变量中设置)
-        self.baidu_api_key = os.getenv('BAIDU_API_KEY')
-        self.baidu_secret_key = os.getenv('BAIDU_SECRET_KEY')
+        # 复用连接的HTTP会话，连接池大小与百度窗口并发数一致
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(4, BAIDU_CONCURRENCY))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # 识别后端，按TRANSCRIBER_CLOUD_BACKENDS的顺序对冲（API密钥在Railway环境变量中设置，见transcriber_backends）
+        self.backends = create_cloud_backends(self.session)
         
-    def get_baidu_access_token(self):
-        """获取百度API访问令牌"""
-        if not self.baidu_api_key or not self.baidu_secret_key:
-            print("百度API密钥未配置", file=sys.stderr)
-            return None
-            
-        url = "https://aip.baidubce.com/oauth/2.0/token"
-        params = {
-            "grant_type": "client_credentials",
-            "client_id": self.baidu_api_key,
-            "client_secret": self.baidu_secret_key
-        }
+    def new_job(self, events=None):
+        """
+        创建一个任务上下文，任务的工作目录、事件、统计和截止时间都放在其中（批量模式下多个任务同时准备）
         
-        try:
-            print("正在获取百度API访问令牌...", file=sys.stderr)
-            response = requests.post(url, params=params, timeout=30)
-            token = response.json().get("access_token")
-            if token:
-                print("百度API访问令牌获取成功", file=sys.stderr)
-            else:
-                print(f"百度API访问令牌获取失败: {response.json()}", file=sys.stderr)
-            return token
-        except Exception as e:
-            print(f"获取百度API访问令牌异常: {e}", file=sys.stderr)
-            return None
+        Args:
+            events (EventReporter): 进度事件输出，默认使用self.events
+            
+        Returns:
+            JobContext: 任务上下文
+        """
+        metrics = None
+        with self._job_lock:
+            if not self._import_reported:
+                # 构造时记录的依赖导入耗时归入第一个任务
+                self._import_reported = True
+                metrics = self.startup_metrics
+        return JobContext(deadline=self.deadline, events=events if events is not None else self.events,
+                          metrics=metrics)
     
-    def download_video(self, url, output_path):
-        """下载视频并提取音频"""
+    def finish_job_metrics(self, job, result):
+        """把统计写入结果的 metrics 字段，并按配置写出Prometheus文本文件"""
+        summary = job.metrics.summary()
+        result['metrics'] = summary
+        if self.metrics_file:
+            try:
+                write_prometheus(self.metrics_file, summary, {'backend': 'cloud'})
+            except OSError as e:
+                print(f"写入指标文件失败: {e}", file=sys.stderr)
+        return result
+    
+    def download_video(self, job, url, output_path):
+        """下载音频（yt-dlp只解析一次，下载原始音频流，由ffmpeg解码后再转为WAV）"""
         print("开始下载视频...", file=sys.stderr)
         
-        # 配置yt-dlp - 极致优化
-        ydl_opts = {
-            'format': 'worstaudio/worst',
-            'outtmpl': os.path.join(output_path, 'audio.%(ext)s'),
-            'extractaudio': True,
-            'audioformat': 'wav',
-            'quiet': True,
-            'no_warnings': True,
-            'no_check_certificate': True,
-            'socket_timeout': 60,   # 增加超时时间
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-                'preferredquality': '16',  # 16kbps，极小文件
-            }],
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', '未知标题')
-                duration = info.get('duration', 0)
-                
-                print(f"视频信息: {title} ({duration}秒)", file=sys.stderr)
-                
-                # 下载音频
-                ydl.download([url])
-                
-                # 查找下载的音频文件
-                audio_files = list(Path(output_path).glob('audio.*'))
-                if audio_files:
-                    audio_path = str(audio_files[0])
-                    print(f"音频下载完成: {audio_path}", file=sys.stderr)
-                    return audio_path, title, duration
-                else:
-                    raise Exception("音频文件下载失败")
-                    
+            with job.metrics.stage('download'):
+                media = download_audio(url, output_path, socket_timeout=60)
         except Exception as e:
             raise Exception(f"视频下载失败: {str(e)}")
+        
+        print(f"视频信息: {media['title']} ({media['duration']}秒)", file=sys.stderr)
+        print(f"音频下载完成: {media['path']}", file=sys.stderr)
+        job.metrics.info['media'] = {key: media[key] for key in ('ext', 'format_id', 'filesize', 'extractor')}
+        return media['path'], media['title'], media['duration']
     
-    def transcribe_with_baidu(self, audio_path):
-        """使用百度语音识别API"""
-        print("使用百度云语音识别...", file=sys.stderr)
+    def recognize(self, job, backend, media, cancel=None):
+        """
+        用一个识别后端识别prepare_media准备好的音频，文字转换为简体
         
-        access_token = self.get_baidu_access_token()
-        if not access_token:
-            raise Exception("百度API访问令牌获取失败")
+        Args:
+            job (JobContext): 任务上下文
+            backend (ASRBackend): 识别后端
+            media (dict): prepare_media的结果（已解码的音频和16kHz WAV）
+            cancel (threading.Event): 对冲调度的取消信号
+        """
+        # 本地后端按剩余的截止时间选择模型和解码参数
+        remaining = job.deadline - (time.perf_counter() - job.started) if job.deadline else None
+        result = backend.transcribe(media.get('audio'), cancel=cancel, audio_path=media['audio_path'],
+                                    deadline=remaining)
+        # 分段一次性批量转换，完整文本由转换后的分段拼出，不再整段转换一遍
+        with job.metrics.stage('opencc'):
+            if result.get('segments'):
+                result['text'] = self.cc.convert_segments(result['segments'])
+            else:
+                result['text'] = self.cc.convert(result.get('text', ''))
+        print(f"识别结果: {result['text'][:100]}...", file=sys.stderr)
+        return result
+    
+    def recognition_backends(self, job, media):
+        """按配置的顺序列出可用的识别后端：[(名称, 函数(取消信号))]"""
+        backends = []
+        for backend in self.backends:
+            if not backend.available():
+                print(f"识别后端 {backend.name} 未配置密钥或不可用，跳过", file=sys.stderr)
+                continue
+            backends.append((backend.name, lambda cancel, backend=backend: self.recognize(job, backend, media, cancel)))
+        return backends
+    
+    def prepare_media(self, job, source):
+        """
+        下载音频（仅链接）并按链接和音频内容查找缓存，命中缓存时只返回 'result' 键
         
-        # 检查音频文件大小 (百度API限制60秒或8MB)
-        file_size = os.path.getsize(audio_path)
-        max_size = 8 * 1024 * 1024  # 8MB
+        本地文件、字节流和PCM输入不经过yt-dlp，解码后写成云端接口要求的16kHz WAV，
+        下载和转换的文件放在任务的工作目录中
+        """
+        if not isinstance(source, MediaInput):
+            source = MediaInput.from_url(source)
+        url = source.value if source.is_url else None
         
-        print(f"音频文件大小: {file_size} bytes ({file_size/1024/1024:.2f} MB)", file=sys.stderr)
+        if url:
+            # 同一链接处理过则直接返回缓存
+            cached = self.cache.get_by_url(url)
+            if cached is not None:
+                print("命中转写缓存（链接）", file=sys.stderr)
+                return {'result': {'success': True, 'data': dict(cached, url=url, cache='url')}}
+            
+            job.events.stage('download', f"开始处理视频: {url}")
+            
+            # 下载音频
+            audio_path, title, duration = self.download_video(job, url, job.open_workspace())
+            print(f"视频下载完成: {title} ({duration}秒)", file=sys.stderr)
+            source = MediaInput('path', audio_path)
+        else:
+            audio_path, title, duration = None, source.title, source.duration
+            print(f"处理本地输入: {source.label}", file=sys.stderr)
         
-        if file_size > max_size:
-            print(f"音频文件过大 ({file_size} bytes > {max_size} bytes)，跳过百度API", file=sys.stderr)
-            raise Exception("音频文件超过百度API大小限制")
+        # 按解码后的音频内容查找缓存（转载的同一视频）
+        job.events.stage('decode', "解码音频...")
+        audio, audio_hash = None, None
+        try:
+            with job.metrics.stage('decode'):
+                audio = source.decode()
+            job.metrics.audio_seconds = audio_duration(audio)
+            audio_hash = audio_fingerprint(audio)
+        except Exception as e:
+            if audio_path is None:
+                raise
+            print(f"音频解码失败，跳过音频缓存: {e}", file=sys.stderr)
         
-        # 读取音频文件
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
+        if duration is None and audio is not None:
+            duration = round(audio_duration(audio), 1)
         
-        # 转换为base64
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        cached = self.cache.get_by_audio_hash(audio_hash) if audio_hash else None
+        if cached is not None:
+            print("命中转写缓存（音频）", file=sys.stderr)
+            self.cache.link(url, audio_hash)
+            data = dict(cached, title=title, url=url, duration=duration, cache='audio')
+            return {'result': {'success': True, 'data': data}}
         
-        url = "https://vop.baidu.com/server_api"
-        headers = {'Content-Type': 'application/json'}
+        if audio is not None:
+            # 下载的是原始音频流，云端接口要求16kHz单声道WAV，用已解码的PCM直接写出
+            audio_path = os.path.join(job.open_workspace(), 'speech-16k.wav')
+            write_wav(audio_path, audio)
         
-        payload = {
-            "format": "wav",
-            "rate": 16000,
-            "channel": 1,
-            "speech": audio_base64,
-            "len": len(audio_data),
-            "token": access_token,
-            "cuid": "xiaohongshu_app"
+        return {
+            'url': url,
+            'audio': audio,
+            'audio_path': audio_path,
+            'title': title,
+            'duration': duration,
+            'audio_hash': audio_hash
         }
+    
+    def transcribe_media(self, job, url, media):
+        """用云端API识别prepare_media准备好的音频并格式化"""
+        if 'result' in media:
+            return media['result']
+        
+        # 尝试云端识别
+        job.events.stage('transcribe', "开始云端语音识别...")
         
+        # 百度 → OpenAI → 本地Whisper：当前后端失败或超过历史延迟分位数时启动下一个，取最先完成的结果
+        backends = self.recognition_backends(job, media)
+        job.metrics.info['hedge'] = {'backends': [name for name, _ in backends]}
         try:
-            print(f"发送音频到百度API，大小: {len(audio_data)} bytes", file=sys.stderr)
-            response = requests.post(url, json=payload, headers=headers, timeout=60)
-            result = response.json()
-            
-            print(f"百度API响应: {result}", file=sys.stderr)
-            
-            if result.get('err_no') == 0:
-                text = result.get('result', [''])[0] if result.get('result') else ''
-                if text:
-                    # 转换为简体中文
-                    text = self.cc.convert(text)
-                    print(f"识别结果: {text[:100]}...", file=sys.stderr)
-                    
-                    return {
-                        'text': text,
-                        'segments': [{'start': 0, 'end': 0, 'text': text}],
-                        'language': 'zh'
-                    }
-                else:
-                    raise Exception("百度API返回空结果")
-            else:
-                error_msg = result.get('err_msg', '未知错误')
-                raise Exception(f"百度API错误 (code: {result.get('err_no')}): {error_msg}")
-                
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"网络请求失败: {str(e)}")
+            with job.metrics.stage('inference'):
+                audio_seconds = audio_duration(media['audio']) if media.get('audio') is not None else media['duration']
+                result, hedge = self.scheduler.run(backends, audio_seconds)
         except Exception as e:
-            raise Exception(f"语音识别失败: {str(e)}")
-    
-    def transcribe_with_openai_api(self, audio_path):
-        """使用OpenAI Whisper API (备用方案)"""
-        print("使用OpenAI Whisper API...", file=sys.stderr)
+            raise Exception(f"所有识别方案都失败了，请检查API配置或网络连接 ({e})")
+        finally:
+            self.scheduler.stats.save()
+        job.metrics.info['hedge'].update(hedge)
+        print(f"识别完成（{hedge['winner']}，{hedge['latency_seconds']}秒）", file=sys.stderr)
         
-        openai_key = os.getenv('OPENAI_API_KEY')
-        if not openai_key:
-            raise Exception("OpenAI API密钥未配置")
+        job.events.segments(result.get('segments', []))
         
-        url = "https://api.openai.com/v1/audio/transcriptions"
-        headers = {"Authorization": f"Bearer {openai_key}"}
+        # 格式化结果
+        job.events.stage('format', "格式化结果...")
+        with job.metrics.stage('format'):
+            formatted_result = self.format_transcript(result, media['title'])
+        formatted_result['url'] = url
+        formatted_result['duration'] = media['duration']
+        # 云端识别没有模型/解码档位，本地版不会直接使用这些条目（见transcriber_cache.decoder_satisfies）
+        self.cache.put(url, media['audio_hash'], formatted_result, {'backend': hedge['winner']})
         
-        with open(audio_path, 'rb') as f:
-            files = {"file": f}
-            data = {
-                "model": "whisper-1",
-                "language": "zh",
-                "response_format": "json"
-            }
-            
-            response = requests.post(url, headers=headers, files=files, data=data)
-            result = response.json()
-            
-            if 'text' in result:
-                text = self.cc.convert(result['text'])
-                return {
-                    'text': text,
-                    'segments': [{'start': 0, 'end': 0, 'text': text}],
-                    'language': 'zh'
-                }
-            else:
-                raise Exception(f"OpenAI API错误: {result}")
+        return {
+            'success': True,
+            'data': formatted_result
+        }
     
     def process_video_url(self, url):
         """处理视频URL"""
-        self.temp_dir = tempfile.mkdtemp()
-        
-        try:
-            print(f"开始处理视频: {url}", file=sys.stderr)
-            
-            # 下载音频
-            audio_path, title, duration = self.download_video(url, self.temp_dir)
-            print(f"视频下载完成: {title} ({duration}秒)", file=sys.stderr)
-            
-            # 尝试云端识别
-            result = None
-            
-            # 方案1: 百度云语音识别
+        return self.process_input(MediaInput.from_url(url))
+    
+    def process_input(self, source):
+        """处理任意输入（见transcriber_input），本地文件、字节流和PCM不经过yt-dlp"""
+        job = self.new_job()
+        # 任务结束或失败时删除工作目录
+        with job:
             try:
-                if self.baidu_api_key and self.baidu_secret_key:
-                    print(f"使用百度云API，音频文件大小: {os.path.getsize(audio_path)} bytes", file=sys.stderr)
-                    result = self.transcribe_with_baidu(audio_path)
-                    print("百度云识别完成", file=sys.stderr)
-                else:
-                    print("百度API密钥未配置，跳过百度云识别", file=sys.stderr)
+                media = self.prepare_media(job, source)
+                return self.finish_job_metrics(job, self.transcribe_media(job, media.get('url'), media))
+                
             except Exception as e:
-                print(f"百度云识别失败: {e}", file=sys.stderr)
-            
-            # 方案2: OpenAI Whisper API (备用)
-            if not result:
+                print(f"处理失败: {str(e)}", file=sys.stderr)
+                return self.finish_job_metrics(job, {
+                    'success': False,
+                    'error': str(e)
+                })
+    
+    def process_batch(self, urls, emit, concurrency=None):
+        """批量处理视频链接：并发下载，按下载完成顺序依次调用云端识别，每个链接有自己的任务上下文和统计"""
+        def prepare(url):
+            job = self.new_job()
+            try:
+                media = self.prepare_media(job, url)
+            except Exception as e:
+                print(f"处理失败: {str(e)}", file=sys.stderr)
+                media = {'result': {'success': False, 'error': str(e)}}
+            media['job'] = job
+            return media
+        
+        def finish(url, media):
+            job = media['job']
+            with job:
                 try:
-                    openai_key = os.getenv('OPENAI_API_KEY')
-                    if openai_key:
-                        result = self.transcribe_with_openai_api(audio_path)
-                        print("OpenAI识别完成", file=sys.stderr)
-                    else:
-                        print("OpenAI API密钥未配置，跳过OpenAI识别", file=sys.stderr)
+                    return self.finish_job_metrics(job, self.transcribe_media(job, url, media))
                 except Exception as e:
-                    print(f"OpenAI识别失败: {e}", file=sys.stderr)
-            
-            # 如果所有云端方案都失败，返回错误
-            if not result:
-                raise Exception("所有云端识别方案都失败了，请检查API配置或网络连接")
-            
-            # 格式化结果
-            formatted_result = self.format_transcript(result, title)
-            formatted_result['url'] = url
-            formatted_result['duration'] = duration
-            
-            return {
-                'success': True,
-                'data': formatted_result
-            }
-            
-        except Exception as e:
-            print(f"处理失败: {str(e)}", file=sys.stderr)
-            return {
-                'success': False,
-                'error': str(e)
-            }
-            
-        finally:
-            # 清理临时文件
-            if self.temp_dir and os.path.exists(self.temp_dir):
-                try:
-                    shutil.rmtree(self.temp_dir)
-                    print("临时文件已清理", file=sys.stderr)
-                except:
-                    pass
+                    print(f"处理失败: {str(e)}", file=sys.stderr)
+                    return self.finish_job_metrics(job, {'success': False, 'error': str(e)})
+        
+        return run_batch(urls, prepare, finish, emit, concurrency)
     
     def format_transcript(self, result, title=""):
         """格式化转换结果"""
         full_text = result.get('text', '').strip()
-        segments = result.get('segments', [])
+        segments = SegmentStore.from_segments(result.get('segments', []))
         
-        # 生成带时间戳的文本
-        timestamped_text = ""
-        for segment in segments:
-            start_time = self.format_time(segment.get('start', 0))
-            end_time = self.format_time(segment.get('end', 0))
-            text = segment.get('text', '').strip()
-            if text:
-                timestamped_text += f"[{start_time} - {end_time}] {text}\n"
+        # 生成带时间戳的文本（跳过空分段，批量格式化时间，一次拼接）
+        timestamped_text = segments.render_timestamped(skip_empty=True)
         
         return {
             'title': title,
             'full_text': full_text,
             'timestamped_text': timestamped_text.strip(),
-            'segments': segments,
+            'segments': segments.view(),
             'word_count': len(full_text.replace(' ', '')),
             'language': 'zh'
         }
@@ -297,29 +312,73 @@ class CloudVideoTranscriber:
         seconds = int(seconds % 60)
         return f"{minutes:02d}:{seconds:02d}"
 
+def run_batch_cli(transcriber, source):
+    """批量模式命令行入口：每完成一个链接向stdout输出一行JSON，最后输出汇总"""
+    def emit(result):
+        print(json.dumps(result, ensure_ascii=False, default=json_default), flush=True)
+    
+    try:
+        urls = read_url_list(source)
+        print(f"批量处理 {len(urls)} 个链接", file=sys.stderr)
+        summary = transcriber.process_batch(urls, emit)
+    except Exception as e:
+        emit({'success': False, 'error': f'批量处理失败: {str(e)}'})
+        sys.exit(1)
+    
+    emit(dict(summary, event='summary'))
+    sys.exit(0 if summary['failed'] == 0 else 2)
+
 def main():
     """命令行入口"""
-    if len(sys.argv) != 2:
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch':
+        # 批量模式: python video_transcriber_cloud.py --batch <链接列表文件|->
+        run_batch_cli(CloudVideoTranscriber(), sys.argv[2])
+    
+    # --ndjson: 以每行一个JSON事件的形式输出进度、分段文字和最终结果
+    args = sys.argv[1:]
+    ndjson = '--ndjson' in args
+    if ndjson:
+        args.remove('--ndjson')
+    # --pcm: 输入为16kHz单声道float32 PCM（文件或stdin）
+    pcm = '--pcm' in args
+    if pcm:
+        args.remove('--pcm')
+    # --deadline 秒数: 任务截止时间（调用方的超时时间），本地Whisper后端据此选择模型和解码参数
+    deadline = None
+    if '--deadline' in args:
+        index = args.index('--deadline')
+        try:
+            deadline = float(args[index + 1])
+        except (IndexError, ValueError):
+            deadline = None
+        del args[index:index + 2]
+    events = EventReporter(stream=sys.stdout, ndjson=ndjson)
+    
+    if len(args) != 1:
         result = {
             'success': False,
-            'error': '使用方法: python video_transcriber_cloud.py <视频链接>'
+            'error': '使用方法: python video_transcriber_cloud.py [--ndjson] [--pcm] [--deadline 秒数] <视频链接|本地文件|-> 或 --batch <链接列表文件|->'
         }
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         sys.exit(1)
     
-    url = sys.argv[1]
-    
     try:
+        # 链接走yt-dlp下载；本地文件、stdin（"-"）和PCM直接解码
+        source = MediaInput.from_argument(args[0], pcm=pcm)
+        
         # 创建云端转换器
         transcriber = CloudVideoTranscriber()
+        transcriber.events = events
+        if deadline:
+            transcriber.deadline = deadline
         print("云端VideoTranscriber初始化完成", file=sys.stderr)
         
         # 处理视频
-        result = transcriber.process_video_url(url)
+        result = transcriber.process_input(source)
         print("云端视频处理完成", file=sys.stderr)
         
         # 输出JSON结果
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         
         if result.get('success', False):
             sys.exit(0)
@@ -332,7 +391,7 @@ def main():
             'success': False,
             'error': f'未预期的错误: {str(e)}'
         }
-        print(json.dumps(result, ensure_ascii=False))
+        events.result(result)
         sys.exit(1)
 
 if __name__ == "__main__":